@@ -30,7 +30,11 @@ from dotenv import load_dotenv
 
 from utils import anonymize_faces
 from utils import reduce_fps
+from utils import frame_source
+from utils import stage_cache
+from utils import transcode
 
+from modules import inference_backend
 from modules import pose_estimation
 from modules import object_detection
 from modules import object_interaction
@@ -39,9 +43,12 @@ from modules import object_segmentation
 from analysis import extract_keypoints
 from analysis import extract_objects
 from analysis import extract_interactions
+from analysis import sweep
+from analysis import streaming
 
 from structures import timeline_structure
 from structures import keypoints_structure
+from structures import frame_archive
 
 # set up the environment variables
 load_dotenv()
@@ -52,15 +59,38 @@ def main(args):
     # SETUP THE TIMELINE STRUCTURE
     timeline = timeline_structure.auto_init_(args.video_in)
 
+    # all intermediate outputs of this run are kept in the runs and temp folder of the workspace
+    runs_dir = os.path.join(args.workspace, "runs")
+    temp_dir = os.path.join(args.workspace, "temp")
+
+    # the outputs of every stage are cached under the content hash of the source video, the preprocessing it went
+    # through (the lineage), the parameters of the stage and the version of its model
+    use_cache = not args.no_cache
+    lineage = {"video": stage_cache.hash_file(args.video_in)} if use_cache else {}
+    source_lineage = lineage
+
     # RUN PREPROCESSING MODULES
+    # in single pass mode the fps are reduced while decoding, unless the video has to be anonymized by deface first
+    stream_fps = None
     if args.reduce_fps:
         # update the frame rate of the timeline
         timeline.set_frame_rate(args.reduce_fps)
-        args.video_in = reduce_fps.reduce_fps(
-            args.video_in, args.reduce_fps, callback=True)
+        if args.single_pass and not args.anonymize:
+            stream_fps = args.reduce_fps
+        else:
+            reduced_video = reduce_fps.reduced_video_path(args.video_in, args.reduce_fps)
+            stage_cache.run_cached("reduce_fps", lineage, {"fps": args.reduce_fps}, {"video": reduced_video},
+                                   lambda: reduce_fps.reduce_fps(args.video_in, args.reduce_fps),
+                                   cache_dir=args.cache_dir, enabled=use_cache)
+            args.video_in = reduced_video
+        lineage = dict(lineage, reduce_fps=args.reduce_fps)
     if args.anonymize:
-        args.video_in = anonymize_faces.anon_video(
-            args.video_in, callback=True)
+        anonymized_video = os.path.splitext(args.video_in)[0] + "_anonymized.mp4"
+        stage_cache.run_cached("anonymize", lineage, {}, {"video": anonymized_video},
+                               lambda: anonymize_faces.anon_video(args.video_in),
+                               cache_dir=args.cache_dir, enabled=use_cache)
+        args.video_in = anonymized_video
+        lineage = dict(lineage, anonymize=True)
     
     #update the filename of the video_in in the timeline
     timeline.set_video_name(os.path.basename(args.video_in).split(".")[0])
@@ -70,11 +100,19 @@ def main(args):
     # SET UP FOLDERS AND PATHS FOR THE PROJECT
     # split the basename and discard the file extension
     video_name = os.path.splitext(os.path.basename(args.video_in))[0]
-
-    # set up temp folder
-    if not os.path.exists("temp"):
-        os.mkdir("temp")
-    path_to_assets = "temp"
+    # the reduced video is written by the frame source directly into the assets folder
+    src_video = args.video_in
+    if stream_fps:
+        video_name += "_%d_fps" % stream_fps
+        args.video_in = video_name + ".mp4"
+    # optionally the name of the output namespace is given, e.g. by the batch runner
+    if args.output_name:
+        video_name = args.output_name
+
+    # set up temp and runs folder
+    os.makedirs(temp_dir, exist_ok=True)
+    os.makedirs(runs_dir, exist_ok=True)
+    path_to_assets = temp_dir
 
     # destination folder for the assets for the visualisation tool
     path_to_vis_tool_assets = os.path.join("vis_tool", "assets", "video_assets")
@@ -86,7 +124,8 @@ def main(args):
         os.mkdir(os.path.join(path_to_assets, video_name))
         path_to_assets = os.path.join(path_to_assets, video_name)
         # copy the video to the output directory
-        shutil.copy2(args.video_in, path_to_assets)
+        if not stream_fps:
+            shutil.copy2(args.video_in, path_to_assets)
         # set the path to the video_in to the new path
         args.video_in = os.path.join(
             path_to_assets, video_name + os.path.splitext(args.video_in)[1])
@@ -99,82 +138,187 @@ def main(args):
             new_video_name = video_name + "_" + str(count)
         os.mkdir(os.path.join(path_to_assets, new_video_name))
         path_to_assets = os.path.join(path_to_assets, new_video_name)
-        shutil.copy2(args.video_in, os.path.join(path_to_assets,
-                     new_video_name + os.path.splitext(args.video_in)[1]))
+        if not stream_fps:
+            shutil.copy2(args.video_in, os.path.join(path_to_assets,
+                         new_video_name + os.path.splitext(args.video_in)[1]))
         args.video_in = os.path.join(
             path_to_assets, new_video_name + os.path.splitext(args.video_in)[1])
     
     # update the path to the video_in in the timeline
     timeline.set_video_name(os.path.basename(args.video_in).split(".")[0])
 
+    # we need to run all video files through ffmpeg due to a incompatible codec issue with opencv and dash player.
+    # the conversions run in the background as soon as their video is written, the sources are removed at the end
+    transcodes = transcode.TranscodeQueue()
+    if args.pose_estimation and not stream_fps:
+        # the input video is already in the workspace, its conversion overlaps with all models
+        transcodes.submit(args.video_in, os.path.splitext(args.video_in)[0] + "_original.mp4")
+
+    # in streaming mode the timeline and keypoints are built while the models run and checkpointed to the assets folder
+    analysis = None
+    if args.streaming:
+        analysis = streaming.StreamingAnalysis(timeline, path_to_assets, objects=args.object_detection,
+                                               interactions=args.object_interaction, keypoints=args.pose_estimation)
+    streamed = set()        # stages whose results were passed to the streaming analysis while they ran
     
 
     # RUN THE DIFFERENT PROCESSING MODULES
+    # the tools write one file per frame, after a tool ran its files are packed into one archive per tool and removed
+    labels_dir, labels_archive = os.path.join(runs_dir, "detect", "predict", "labels"), os.path.join(runs_dir, "detect", "labels.jsonl")
+    reltr_dir, reltr_archive = os.path.join(runs_dir, "RelTR"), os.path.join(runs_dir, "RelTR.jsonl")
+    openpose_dir, openpose_archive = os.path.join(runs_dir, "openpose"), os.path.join(runs_dir, "openpose.jsonl")
+    packs = {"detect": (labels_dir, labels_archive), "RelTR": (reltr_dir, reltr_archive), "openpose": (openpose_dir, openpose_archive)}
+
+    # raw outputs and parameters of the stages, the parameters that change the outputs are part of the cache key. The
+    # detections depend on the resolved backend (auto runs on cuda or the cpu backend), on the int8 quantization (only
+    # used by the exported models) and on whether the frames come from the frame source or from the video file
+    detect_backend = inference_backend.resolve_backend(args.backend) if args.object_detection else args.backend
+    detect_params = {"weights": object_detection.WEIGHTS, "model": stage_cache.model_version(object_detection.WEIGHTS),
+                     "backend": detect_backend, "int8": args.int8 and detect_backend in ["onnx", "openvino"],
+                     "input": "frames" if args.single_pass else "video", "format": frame_archive.FORMAT_VERSION}
+    detect_outputs = {"labels": labels_archive, "labels_index": frame_archive.index_path(labels_archive),
+                      "detections": os.path.join(runs_dir, "detect", "detections.npz")}
+    reltr_params = {"sample_rate": 1, "model": stage_cache.model_version(object_interaction.RELTR_CHECKPOINT),
+                    "topk": object_interaction.TOPK, "threshold": object_interaction.THRESHOLD, "format": frame_archive.FORMAT_VERSION}
+    reltr_outputs = {"RelTR": reltr_archive, "RelTR_index": frame_archive.index_path(reltr_archive)}
+
+    def run_and_pack(stage, run):
+        # returns a function that runs the stage and packs its per frame outputs
+        def run_stage():
+            run()
+            frame_archive.pack_directory(*packs[stage], remove=True)
+        return run_stage
+
+    if args.single_pass:
+        # decode the video once and feed the frames to all frame based modules at the same time
+        stages = []
+        if stream_fps:
+            stages.append(("reduce_fps", source_lineage, {"fps": stream_fps}, {"video": args.video_in},
+                           frame_source.VideoWriterStage(args.video_in)))
+        if args.object_detection:
+            stages.append(("detect", lineage, detect_params, detect_outputs,
+                           object_detection.ObjectDetectionStage(labels_dir=labels_dir, sink_path=detect_outputs["detections"],
+                                                                 backend=detect_backend, int8=args.int8, threads=args.threads,
+                                                                 on_result=analysis.on_detections if analysis else None)))
+        if args.object_interaction:
+            stages.append(("RelTR", lineage, reltr_params, reltr_outputs,
+                           object_interaction.InteractionSamplingStage(sample_rate=1, spill_to_disk=args.spill_frames,
+                                                                       runs_dir=runs_dir, temp_dir=temp_dir,
+                                                                       on_triplets=analysis.on_triplets if analysis else None)))
+
+        # only the stages that are not cached are fed with frames
+        source = frame_source.FrameSource(src_video if stream_fps else args.video_in, new_fps=stream_fps)
+        missing = []
+        for stage, stage_lineage, params, outputs, frame_stage in stages:
+            key = stage_cache.stage_key(stage_lineage, stage, params)
+            if use_cache and stage_cache.restore(key, outputs, args.cache_dir):
+                print(f"Restored stage {stage} from the cache ({key[:12]})")
+                continue
+            source.add_stage(frame_stage)
+            missing.append((key, stage, stage_lineage, params, outputs))
+        if source.stages:
+            source.run()
+        for key, stage, stage_lineage, params, outputs in missing:
+            streamed.add(stage)
+            if stage in packs:
+                frame_archive.pack_directory(*packs[stage], remove=True)
+            if use_cache:
+                stage_cache.store(key, stage, outputs, stage_lineage, params, args.cache_dir)
+    else:
+        if args.object_detection:
+            if not stage_cache.run_cached("detect", lineage, detect_params, detect_outputs,
+                                          run_and_pack("detect", lambda: object_detection.detect_objects(
+                                              args.video_in, sink_path=detect_outputs["detections"], backend=detect_backend, int8=args.int8, threads=args.threads, runs_dir=runs_dir,
+                                              on_result=analysis.on_detections if analysis else None)),
+                                          cache_dir=args.cache_dir, enabled=use_cache):
+                streamed.add("detect")
+        if args.object_interaction:
+            if not stage_cache.run_cached("RelTR", lineage, reltr_params, reltr_outputs,
+                                          run_and_pack("RelTR", lambda: object_interaction.extract_object_interactions(
+                                              args.video_in, sample_rate=1, spill_to_disk=args.spill_frames, runs_dir=runs_dir, temp_dir=temp_dir,
+                                              on_triplets=analysis.on_triplets if analysis else None)),
+                                          cache_dir=args.cache_dir, enabled=use_cache):
+                streamed.add("RelTR")
+    if args.pose_estimation and stream_fps:
+        # the reduced video is written by the frame source, it is converted while OpenPose runs
+        transcodes.submit(args.video_in, os.path.splitext(args.video_in)[0] + "_original.mp4")
+
+    # OpenPose can only read from a file, so it runs on the (written) video after the frame based modules
     if args.pose_estimation:
-        pose_estimation.extract_pose_openpose(args.video_in)
-    if args.object_detection:
-        object_detection.detect_objects(args.video_in)
-    if args.object_interaction:
-        object_interaction.extract_object_interactions(
-            args.video_in, sample_rate=1)
+        path_to_openpose = env.get("PATH_TO_OPENPOSE", "")
+        run_openpose = lambda: pose_estimation.extract_pose_openpose(args.video_in, out_dir=openpose_dir)
+        if analysis is not None:
+            # the openpose files are added to the streaming analysis while OpenPose writes them
+            run_openpose = analysis.follow_keypoints(openpose_dir, run_openpose)
+        superimposed = os.path.splitext(args.video_in)[0] + "_openpose.avi"
+        if not stage_cache.run_cached("openpose", lineage, {"model": stage_cache.model_version(path_to_openpose), "format": frame_archive.FORMAT_VERSION},
+                                      {"openpose": openpose_archive, "openpose_index": frame_archive.index_path(openpose_archive),
+                                       "superimposed": superimposed},
+                                      run_and_pack("openpose", run_openpose),
+                                      cache_dir=args.cache_dir, enabled=use_cache):
+            streamed.add("openpose")
+
+        # save the superimposed video to the superposition folder, converted while the analysis runs
+        os.makedirs(os.path.join(path_to_assets, "superposition"), exist_ok=True)
+        transcodes.submit(superimposed, os.path.join(path_to_assets, "superposition", os.path.splitext(os.path.basename(superimposed))[0] + ".mp4"))
     """ if args.object_segmentation:
         object_segmentation.segment_objects(args.video_in) """
 
     # RUN THE DIFFERENT ANALYSIS MODULES AND STORE THEM IN THE ASSETS FOLDER
-    # we need to run all video files through ffmpeg due to a incompatible codec issue with opencv and dash player then remove to old files
+    if analysis is not None:
+        # add the outputs of the stages that were restored from the cache, the other stages were added while they ran
+        if args.object_detection and "detect" not in streamed:
+            analysis.feed_objects(labels_archive)
+        if args.object_interaction and "RelTR" not in streamed:
+            analysis.feed_interactions(reltr_archive)
+        if args.pose_estimation and "openpose" not in streamed:
+            analysis.feed_keypoints(openpose_archive)
+        timeline = analysis.timeline_result()
 
-    # check if if pose estimation was run
     if args.pose_estimation:
-        subprocess.run(["ffmpeg", "-i", args.video_in,
-                       os.path.splitext(args.video_in)[0] + "_original.mp4"])
-        os.remove(args.video_in)
-
-        # save the superimposed video to the superposition folder
-        if not os.path.exists(os.path.join(path_to_assets, "superposition")):
-            os.mkdir(os.path.join(path_to_assets, "superposition"))
-
-        # get the path to the superimposed video from openpose
-        files = os.listdir(os.path.join(path_to_assets))
-        for file in files:
-            if file.endswith("_openpose.avi"):
-                # run the video through ffmpeg to convert it to mp4 and make it compatible with dash player
-                subprocess.run(["ffmpeg", "-i", os.path.join(path_to_assets, file), os.path.join(
-                    path_to_assets, "superposition", os.path.splitext(file)[0] + ".mp4")])
-                os.remove(os.path.join(path_to_assets, file))
-
         # save the keypoints and bounding boxes to the juxtaposition folder
         jux_path = os.path.join(path_to_assets, "juxtaposition")
-        os.mkdir(jux_path)
-        child, therapist, child_bbox, therapist_bbox = extract_keypoints.get_keypoints_openpose(os.path.join("runs", "openpose"))
-        keypoints_structure.save_numpy_keypoints_bbox(child, child_bbox, jux_path, "child")
-        keypoints_structure.save_numpy_keypoints_bbox(therapist, therapist_bbox, jux_path, "therapist")
+        os.makedirs(jux_path, exist_ok=True)
+        if analysis is not None:
+            child, therapist, child_bbox, therapist_bbox, child_conf, therapist_conf = analysis.keypoints_result()
+        else:
+            child, therapist, child_bbox, therapist_bbox, child_conf, therapist_conf = extract_keypoints.get_keypoints_openpose(
+                openpose_archive, return_confidence=True)
+        keypoints_structure.save_keypoints(child, child_conf, child_bbox, jux_path, "child", fps=float(timeline.Frame_Rate))
+        keypoints_structure.save_keypoints(therapist, therapist_conf, therapist_bbox, jux_path, "therapist", fps=float(timeline.Frame_Rate))
+
+    # keep the per frame detections and triplets with their scores in one file with the assets, so the objects and
+    # interactions can be aggregated again with other settings without a rerun (see analysis/sweep.py)
+    path_to_presence = os.path.join(path_to_assets, extract_objects.PRESENCE_FILE)
+    if args.object_detection or args.object_interaction:
+        os.makedirs(os.path.dirname(path_to_presence), exist_ok=True)
+        sweep.build_presence_cache(path_to_presence,
+                                   detections=detect_outputs["detections"] if args.object_detection else None,
+                                   labels=labels_archive if args.object_detection else None,
+                                   reltr=reltr_archive if args.object_interaction else None)
 
     # check if if object detection was run
-    if args.object_detection:
+    if args.object_detection and analysis is None:
+        # the presence of the objects is read from the file written above
         objects = extract_objects.extract_objects(
-            dir=os.path.join("runs", "detect", "predict", "labels"),
+            dir=labels_archive,
             fps=int(float(timeline.Frame_Rate)),
-            life_time_seconds=10)
+            life_time_seconds=10,
+            path_to_presence=path_to_presence)
         # insert objects into timeline
-        for objname, list_start_end in objects.items():
-            for start, end in list_start_end:
-                timeline.add_object(
-                    start_time=time.strftime("%H:%M:%S", time.gmtime(start / float(timeline.Frame_Rate))),
-                    end_time=time.strftime("%H:%M:%S", time.gmtime(end / float(timeline.Frame_Rate))),
-                    object_name=objname)
+        timeline_structure.insert_events(timeline, objects=objects)
     
     # check if if object interaction was run
-    if args.object_interaction:
+    if args.object_interaction and analysis is None:
         interactions = extract_interactions.extract_object_interactions_events(
-            dir=os.path.join("runs", "RelTR"), 
+            dir=reltr_archive, 
             fps=int(float(timeline.Frame_Rate)), 
             life_time_seconds=3)
-        for start, event in interactions.items():
-            timeline.add_object_interaction(
-                event_time=time.strftime("%H:%M:%S", time.gmtime(start / float(timeline.Frame_Rate))),
-                event_description="Is " + event[0] + " " + event[1] + ".")
-            
-    
+        timeline_structure.insert_events(timeline, interactions=interactions)
+
+    # wait for the conversions, a failed conversion raises here and keeps its source video
+    transcodes.wait(remove_sources=True)
+
     # SAVE THE TIMELINE TO THE ASSETS FOLDER
     # create the timeline folder
     if not os.path.exists(os.path.join(path_to_assets, "timeline")):
@@ -186,10 +330,10 @@ def main(args):
 
     # copy the generated assets to the vis_tool/assets/video_assets folder and then clean up everythin in runs and temp folder
     shutil.move(os.path.join(path_to_assets), path_to_vis_tool_assets)
-    shutil.rmtree("runs")
-    os.mkdir("runs")
-    shutil.rmtree("temp")
-    os.mkdir("temp")
+    shutil.rmtree(runs_dir)
+    os.mkdir(runs_dir)
+    shutil.rmtree(temp_dir)
+    os.mkdir(temp_dir)
 
 
 if __name__ == "__main__":
@@ -208,6 +352,25 @@ if __name__ == "__main__":
                         help="extract the objects of interest in the video")
     parser.add_argument("--object-interaction", action="store_true",
                         help="extract interactions object and people in the video")
+    parser.add_argument("--workspace", type=str, default=".",
+                        help="folder for the intermediate runs and temp folders, use a separate workspace for every parallel run")
+    parser.add_argument("--output-name", type=str, default=None,
+                        help="name of the output folder in vis_tool/assets/video_assets, defaults to the name of the video")
+    parser.add_argument("--backend", type=str, default="auto", choices=inference_backend.BACKENDS,
+                        help="inference backend of the YOLO models, auto uses cuda if available and an exported onnx model otherwise")
+    parser.add_argument("--int8", action="store_true", help="use an int8-quantized YOLO model on the onnx and openvino backends")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="number of cpu threads of the YOLO models, e.g. to share the cpu between parallel runs")
+    parser.add_argument("--spill-frames", action="store_true",
+                        help="store the frames sampled for the object interaction in the temp folder instead of keeping them in memory")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="decode the video only once and share the frames between fps reduction, object detection and object interaction")
+    parser.add_argument("--streaming", action="store_true",
+                        help="build the timeline and keypoints while the models run, the partial results are checkpointed to the temp folder")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="run all stages even if their outputs are cached for the same video and parameters")
+    parser.add_argument("--cache-dir", type=str, default=stage_cache.CACHE_DIR,
+                        help="folder of the stage cache, list and evict entries with python -m utils.stage_cache")
     # parser.add_argument("--object-segmentation", action="store_true", help="extract the pose infromation of people in the video")
     # parser.add_argument("--verbose", action="store_true", help="verbose")
 
@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def segment_events(frames, labels, gap, min_duration=0):
+    """
+    This function is used to segment a stream of per frame observations into events. Every observation is a label
+    (e.g. an object or a predicate index) seen in a frame, the observations can contain duplicates and do not have to
+    be sorted. An event of a label lasts while the label is seen again within gap frames, a longer gap starts a new
+    event. Every event lasts at least min_duration frames. gap and min_duration can also be given per observation,
+    e.g. to segment the streams of several settings (each with its own labels) in one call.
+
+    Returns a dictionary of arrays with one entry per event, sorted by label and start frame:
+        labels: the label of the event
+        starts: the first frame of the event
+        ends: the last frame of the event, at least start + min_duration
+        first: the index of the first observation of the event, ties in the start frame are resolved by the order of the observations
+    """
+    frames = np.asarray(frames, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64)
+    if len(frames) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return {"labels": empty, "starts": empty, "ends": empty, "first": empty}
+
+    # sort by label, frame and observation order, the events are then runs in the sorted stream
+    order = np.lexsort((np.arange(len(frames)), frames, labels))
+    sorted_frames = frames[order]
+    sorted_labels = labels[order]
+    gap = np.broadcast_to(gap, frames.shape)[order]
+    min_duration = np.broadcast_to(min_duration, frames.shape)[order]
+
+    # a new event starts at a new label or after a gap that is longer than allowed
+    new_event = np.ones(len(order), dtype=bool)
+    new_event[1:] = (sorted_labels[1:] != sorted_labels[:-1]) | (np.diff(sorted_frames) > gap[1:])
+    first_rows = np.flatnonzero(new_event)
+    last_rows = np.r_[first_rows[1:] - 1, len(order) - 1]
+
+    starts = sorted_frames[first_rows]
+    return {
+        "labels": sorted_labels[first_rows],
+        "starts": starts,
+        "ends": np.maximum(starts + min_duration[first_rows], sorted_frames[last_rows]),
+        "first": order[first_rows],
+    }
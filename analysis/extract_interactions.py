@@ -1,5 +1,9 @@
 import os
 import json
+import numpy as np
+
+from analysis import event_segmentation
+from structures import frame_archive
 
 
 FPS = 25    # frames per second
@@ -23,43 +27,27 @@ object_interactions = ['carrying', 'eating', 'holding', 'laying on',  'looking a
 
 
 def extract_object_interactions_events(dir, fps=FPS, life_time_seconds=LIFE_TIME_SECONDS):
+    """
+    Returns the start frames of the object interactions from the RelTR triplets, dir is either the RelTR output
+    directory or the packed RelTR archive (see structures/frame_archive.py).
+    """
+    # one observation per triplet with an interaction predicate, in the order of the frames and the triplets
+    frames, predicates, objects = [], [], []
+    for frame_number, triplets in frame_archive.iter_frames(dir):
+        for triplet in triplets:
+            predicate = triplet["predicate"]["id"]
+            if predicate in object_interactions:
+                frames.append(frame_number)
+                predicates.append(object_interactions.index(predicate))
+                objects.append(triplet["object"]["id"])
+
+    # the interactions are only keyed on the predicate, an interaction stays active for the lifetime after it was last seen
+    lifetime = life_time_seconds * fps
+    events = event_segmentation.segment_events(frames, predicates, gap=lifetime)
 
-    files = sorted(os.listdir(dir), key=lambda x: int(x.split(".")[0].split("_")[-1]))
-
-    interactions_all_frames = {}
-
-    for file in files:
-        frame_number = int(file.split(".")[0].split("_")[-1])
-        interactions_all_frames[frame_number] = []
-        with open(os.path.join(dir, file), "r") as f:
-            triplets = json.load(f)
-
-            for triplet in triplets:
-                subject = triplet["subject"]["id"]
-                predicate = triplet["predicate"]["id"]
-                object = triplet["object"]["id"]
-
-                if predicate in object_interactions:
-                    interactions_all_frames[frame_number].append([subject, predicate, object])
-    
-    # track previous interactions
-    active_interactions = {}
-    # track the start frame of new interactions
+    # an event is described by the object of its first triplet, if several interactions start in the same frame the
+    # one that appears last in the frame is kept
     start_frame_interaction = {}
-    # max duration of an interaction before it is considered a new interaction
-    lifetime = life_time_seconds * fps
-    for key in sorted(interactions_all_frames.keys()):
-        for interaction in interactions_all_frames[key]:
-            # new interaction
-            if interaction[1] not in active_interactions.keys():
-                start_frame_interaction[key] = interaction[1:]   # save the start frame of the interaction
-                active_interactions[interaction[1]] = key  # save the current frame of the interaction
-            # interaction already active
-            elif key - active_interactions[interaction[1]] <= lifetime:
-                active_interactions[interaction[1]] = key   # update the current frame of the interaction
-            # interaction too old, start new interaction
-            else:
-                start_frame_interaction[key] = interaction[1:]   # save the start frame of the interaction
-                active_interactions[interaction[1]] = key   # save the current frame of the interaction
+    for first in np.sort(events["first"]).tolist():
+        start_frame_interaction[frames[first]] = [object_interactions[predicates[first]], objects[first]]
     return start_frame_interaction
-
@@ -1,171 +1,111 @@
 import os
 import sys
 import json
+import warnings
 import numpy as np
 import matplotlib.pyplot as plt
 
+from concurrent.futures import ProcessPoolExecutor
 from matplotlib.animation import FuncAnimation
 
+from analysis import tracker
+from structures import frame_archive
 
+# orjson parses the openpose files several times faster than the json module, it is optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+NUM_KEYPOINTS = 25      # BODY_25 model of openpose
+CHUNK_SIZE = 256        # number of files parsed by a worker at once
 
-def calculate_iou(bbox1, bbox2):
-    # get the coordinates of the bounding boxes
-    x_min_1, y_min_1, x_max_1, y_max_1 = bbox1
-    x_min_2, y_min_2, x_max_2, y_max_2 = bbox2
 
-    # get the coordinates of the intersection rectangle
-    x_left = max(x_min_1, x_min_2)
-    y_top = max(y_min_1, y_min_2)
-    x_right = min(x_max_1, x_max_2)
-    y_bottom = min(y_max_1, y_max_2)
+def people_keypoints(json_object):
+    """
+    Returns the keypoints of all people of one openpose frame as a float32 array of shape (people, 25, 3) with x, y and confidence.
+    """
+    people = [person["pose_keypoints_2d"] for person in json_object["people"]]
+    return np.array(people, dtype=np.float32).reshape(len(people), NUM_KEYPOINTS, 3)
 
-    # Intersection area ( + 1 to account for touching edges)
-    intersection_area = max(0, x_right - x_left + 1) * max(0, y_bottom - y_top + 1)
 
-    # Union Area ( + 1 to account for touching edges)
-    bb1_area = (x_max_1 - x_min_1 + 1) * (y_max_1 - y_min_1 + 1)
-    bb2_area = (x_max_2 - x_min_2 + 1) * (y_max_2 - y_min_2 + 1)
-    union_area = (bb1_area + bb2_area) - intersection_area
+def parse_openpose_file(path_to_file):
+    # parse one openpose json file in a worker process
+    with open(path_to_file, "rb") as f:
+        json_object = orjson.loads(f.read()) if orjson is not None else json.load(f)
+    return people_keypoints(json_object)
 
-    return intersection_area / union_area
 
+def read_openpose_frames(directory, workers=None):
+    """
+    This function is used to read all openpose json files of a video in frame order. The files are parsed in a pool of
+    worker processes and written into one preallocated array. The directory can also be a packed openpose archive
+    (see structures/frame_archive.py). Returns the keypoints of shape (frames, max_people, 25, 3), filled with nan
+    where there is no person, and the number of people per frame.
+    """
+    if frame_archive.is_archive(directory):
+        # the archive is read sequentially, there are no small files left to spread over workers
+        frames = [people_keypoints(json_object) for _, json_object in frame_archive.FrameArchive(directory)]
+    else:
+        # sort the files by their frame number, os.listdir returns them in arbitrary order
+        files = frame_archive.list_frame_files(directory, (".json",))
+        paths = [os.path.join(directory, file) for file in files]
+        if workers == 1 or len(paths) < CHUNK_SIZE:
+            frames = [parse_openpose_file(path) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                frames = list(pool.map(parse_openpose_file, paths, chunksize=CHUNK_SIZE))
+
+    # the workers only return the small per frame arrays, the result is assembled here
+    counts = np.zeros(len(frames), dtype=np.int32)
+    for frame_index, people in enumerate(frames):
+        counts[frame_index] = len(people)
+
+    keypoints = np.full((len(frames), max(counts.max(initial=0), 1), NUM_KEYPOINTS, 3), np.nan, dtype=np.float32)
+    for frame_index, people in enumerate(frames):
+        keypoints[frame_index, :len(people)] = people
+    return keypoints, counts
+
+
+def select_child_therapist(tracks, tracks_bbox, return_confidence=False):
+    """
+    Returns the keypoints (keypoints, 2, frames) and bounding boxes (4, frames) of the child and the therapist from
+    the tracks (tracks, frames, keypoints, 3) and their bounding boxes (tracks, frames, 4), optionally also the
+    confidence of the keypoints (keypoints, frames).
+    """
+    # differentiate between child and therapist by the average size of the bounding box, with more than two tracks
+    # the smallest is the child and the biggest the therapist
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        bbox_avg = np.nanmean((tracks_bbox[:, :, 2] - tracks_bbox[:, :, 0]) * (tracks_bbox[:, :, 3] - tracks_bbox[:, :, 1]), axis=1)
+    order = sorted(range(len(tracks)), key=lambda track: np.nan_to_num(bbox_avg[track], nan=np.inf))
+    present = [track for track in order if not np.isnan(bbox_avg[track])]
+    child_index = order[0]
+    therapist_index = present[-1] if len(present) > 1 else order[min(1, len(tracks) - 1)]
+
+    # convert to the (keypoints, xy, frames) and (4, frames) layout of the saved keypoints
+    child, therapist = tracks[child_index, :, :, :2].transpose(1, 2, 0), tracks[therapist_index, :, :, :2].transpose(1, 2, 0)
+    child_bbox, therapist_bbox = tracks_bbox[child_index].T, tracks_bbox[therapist_index].T
+
+    # optionally also return the confidence of the keypoints in the (keypoints, frames) layout
+    if return_confidence:
+        return child, therapist, child_bbox, therapist_bbox, tracks[child_index, :, :, 2].T, tracks[therapist_index, :, :, 2].T
 
-def get_keypoints_openpose(directory):
+    # return the keypoints of the child and therapist and their bounding boxes
+    return child, therapist, child_bbox, therapist_bbox
+
+
+def get_keypoints_openpose(directory, num_tracks=tracker.NUM_TRACKS, max_age=tracker.MAX_AGE, return_confidence=False):
     
     # Construct the path to the openpose_output directory
     openpose_output_dir = directory
 
-    # List the files in the directory
-    files = os.listdir(openpose_output_dir)
+    # read all the json-files in frame order
+    keypoints, counts = read_openpose_frames(openpose_output_dir)
 
-    # check if there are any files other then json files
-    for file in files:
-        if not file.endswith(".json"):
-            files.remove(file)
-            print(f"Removed {file} from the list of files processed.")    
-    
-    # total number of json-files/frames
-    total_frames = len(files)
-    
-    # List of people in the video
-    person_1 = np.empty((25, 2, total_frames))
-    person_1.fill(np.nan)
-    person_1_bbox = np.empty((4, total_frames))
-    person_1_bbox.fill(np.nan)
-    person_1_bbox_last = [0, 0, 0, 0]
-
-    person_2 = np.empty((25, 2, total_frames))
-    person_2.fill(np.nan)
-    person_2_bbox = np.empty((4, total_frames))
-    person_2_bbox.fill(np.nan)
-    person_2_bbox_last = [0, 0, 0, 0]
-
-
-    for file, frame_index in zip(files, range(len(files))):
-        # Construct the path to the file
-        file_path = os.path.join(openpose_output_dir, file)
-
-        # collect all the detected people in the frame
-        person_in_frame = []
-        
-        # Open the json file and read the json object
-        with open(file_path, 'r') as f:
-            json_object = json.load(f)
-
-            # Get the people array from the json object
-            people = json_object['people']
-
-            # read the keypoints for each person in the frame and store in a person list of current frame
-            for person in people:
-                # Get the pose_keypoints_2d array from the person object
-                pose_keypoints_2d = person['pose_keypoints_2d']
-
-                x = pose_keypoints_2d[0::3]
-                y = pose_keypoints_2d[1::3]
-
-                # calculate the bounding box from the person object. Important: discard all 0.0 values as they represent missing keypoints
-                bbox = [min(filter(lambda val: val >= 0.0, x)), min(filter(lambda val: val >= 0.0, y)), max(x), max(y)]
-                #bbox = [min(x), min(y), max(x), max(y)]
-
-                # add the bounding box and keypoints to the person in the frame
-                person_in_frame.append([x, y, bbox])
-
-        # compare the bounding box of the person_1 and person_2 with the bounding box of the people in the frame
-        # if the bounding box of the person in the frame is within the bounding box of the person_1 or person_2, add the keypoints to the person_1 or person_2
-
-        best_iou = np.zeros((len(person_in_frame), 2))
-        for person, person_index in zip(person_in_frame, range(len(person_in_frame))):
-            # get the bounding box of the person in the frame
-            bbox = person[2]
-
-            # calculate the iou with the person_1
-            iou_person_1 = calculate_iou(bbox, person_1_bbox_last)
-
-            # calculate the iou with the person_2
-            iou_person_2 = calculate_iou(bbox, person_2_bbox_last)
-
-            # store the iou values in best_iou
-            best_iou[person_index, 0] = iou_person_1
-            best_iou[person_index, 1] = iou_person_2
-        
-        # choose the best iou in the best_iou array and add the keypoints to the person_1 or person_2 then set all values to zero for that row.
-        if len(person_in_frame) == 0:
-            continue
-        elif len(person_in_frame) == 1:
-            if best_iou[0, 0] > best_iou[0, 1]:
-                person_1[:, :, frame_index] = np.array([person_in_frame[0][0], person_in_frame[0][1]]).T
-                person_1_bbox[:, frame_index] = np.array(person_in_frame[0][2])
-                person_1_bbox_last = person_in_frame[0][2]
-            else:
-                person_2[:, :, frame_index] = np.array([person_in_frame[0][0], person_in_frame[0][1]]).T
-                person_2_bbox[:, frame_index] = np.array(person_in_frame[0][2])
-                person_2_bbox_last = person_in_frame[0][2]
-        else:
-            # get the index absolute best iou in best_iou array
-            best_iou_index = np.unravel_index(np.argmax(best_iou, axis=None), best_iou.shape)
-            if best_iou_index[1] == 0:
-                # add the keypoints to the person_1
-                person_1[:, :, frame_index] = np.array([person_in_frame[best_iou_index[0]][0], person_in_frame[best_iou_index[0]][1]]).T
-                person_1_bbox[:, frame_index] = np.array(person_in_frame[best_iou_index[0]][2])
-                person_1_bbox_last = person_in_frame[best_iou_index[0]][2]
-                
-                # set the best iou to zero for the column of person_1 and row of person_in_frame
-                best_iou[best_iou_index[0], :] = 0
-                best_iou[:, best_iou_index[1]] = 0
-
-                # get the best iou index again  and add the keypoints to the person_2
-                best_iou_index = np.unravel_index(np.argmax(best_iou, axis=None), best_iou.shape)
-                person_2[:, :, frame_index] = np.array([person_in_frame[best_iou_index[0]][0], person_in_frame[best_iou_index[0]][1]]).T
-                person_2_bbox[:, frame_index] = np.array(person_in_frame[best_iou_index[0]][2])
-                person_2_bbox_last = person_in_frame[best_iou_index[0]][2]
-            else:
-                # add the keypoints to the person_2
-                person_2[:, :, frame_index] = np.array([person_in_frame[best_iou_index[0]][0], person_in_frame[best_iou_index[0]][1]]).T
-                person_2_bbox[:, frame_index] = np.array(person_in_frame[best_iou_index[0]][2])
-                person_2_bbox_last = person_in_frame[best_iou_index[0]][2]
-
-                # set the best iou to zero for the column of person_2 and row of person_in_frame
-                best_iou[best_iou_index[0], :] = 0
-                best_iou[:, best_iou_index[1]] = 0
-
-                # get the best iou index again  and add the keypoints to the person_1
-                best_iou_index = np.unravel_index(np.argmax(best_iou, axis=None), best_iou.shape)
-                person_1[:, :, frame_index] = np.array([person_in_frame[best_iou_index[0]][0], person_in_frame[best_iou_index[0]][1]]).T
-                person_1_bbox[:, frame_index] = np.array(person_in_frame[best_iou_index[0]][2])
-                person_1_bbox_last = person_in_frame[best_iou_index[0]][2]
-
-    # differentiate between child and therapist by the average size of the bounding box
-    person_1_bbox_avg = np.nanmean((person_1_bbox[2, :] - person_1_bbox[0, :]) * (person_1_bbox[3, :] - person_1_bbox[1, :]))
-    person_2_bbox_avg = np.nanmean((person_2_bbox[2, :] - person_2_bbox[0, :]) * (person_2_bbox[3, :] - person_2_bbox[1, :]))
-
-    if person_1_bbox_avg > person_2_bbox_avg:
-        child, therapist, child_bbox, therapist_bbox = person_2, person_1, person_2_bbox, person_1_bbox
-    else:
-        child, therapist, child_bbox, therapist_bbox = person_1, person_2, person_1_bbox, person_2_bbox
-    
-    # return the keypoints of the child and therapist and their bounding boxes
-    return child, therapist, child_bbox, therapist_bbox
+    # assign the people of every frame to the tracks
+    tracks, tracks_bbox = tracker.track_people(keypoints, counts, num_tracks=num_tracks, max_age=max_age)
+    return select_child_therapist(tracks, tracks_bbox, return_confidence)
 
 
 def animation(p1, p2):
@@ -1,7 +1,12 @@
+import io
 import os
 import json
+import functools
+import numpy as np
 
-from ultralytics import YOLO
+from analysis import event_segmentation
+from structures import frame_archive
+from structures import detections_structure
 
 FPS = 25    # frames per second
 
@@ -9,66 +14,132 @@ LIFE_TIME_SECONDS = 3   # seconds
 
 LIFE_TIME_SECONDS = 3   # seconds
 
-# get the object names from the yolo model
-model = YOLO('./models/yolov8l.pt')
-objects_dict = dict(model.names)
+YOLO_WEIGHTS = './models/yolov8l.pt'    # weights of the object detection model in modules/object_detection.py
 
-objects_dict = {str(key): value for key, value in objects_dict.items()}
+PRESENCE_FILE = os.path.join("objects", "presence.npz")     # per frame results of a video in its assets folder (see analysis/sweep.py)
 
 # key are objects of interest and values are common mismatches ##TODO: add further objects of interest
 objects_of_interest = {"cup": ["glass", "wine glass"], "bottle":[], "bowl": ["toilet", "sink"], "teddy bear": []}
 
 
 
-def extract_objects(dir, fps=FPS, life_time_seconds=LIFE_TIME_SECONDS):
+@functools.lru_cache(maxsize=None)
+def get_objects_dict(weights=YOLO_WEIGHTS):
+    """
+    Returns the class names of the yolo model with the class index as string key. The names are read from the
+    checkpoint only once and then cached next to it in "<weights>_names.json", so the model is not loaded on import.
+    """
+    path_to_names = os.path.splitext(weights)[0] + "_names.json"
+    if os.path.exists(path_to_names):
+        with open(path_to_names, "r") as f:
+            return json.load(f)
+
+    # get the object names from the yolo model
+    from ultralytics import YOLO
+    objects_dict = {str(key): value for key, value in YOLO(weights).names.items()}
+    # parallel jobs (batch_process_dir.py) may build the table at the same time, every job writes its own temporary
+    # file and replaces the table at once, so a job never reads a partially written table
+    path_to_tmp = path_to_names + ".%d.tmp" % os.getpid()
+    with open(path_to_tmp, "w") as f:
+        json.dump(objects_dict, f, indent=4)
+    os.replace(path_to_tmp, path_to_names)
+    return objects_dict
+
+
+def parse_labels(source):
+    """
+    Returns the frame numbers and class indices of all detections in the YOLO labels as two int arrays, source is
+    either the labels directory or the packed labels archive. The class column of all frames is parsed at once.
+    """
+    frames, texts = [], []
+    for frame_number, labels in frame_archive.iter_frames(source):
+        frames.append(frame_number)
+        texts.append(labels if labels.endswith("\n") or not labels else labels + "\n")
+    if not texts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # every label line of a frame belongs to its frame number
+    counts = np.array([text.count("\n") for text in texts])
+    classes = np.loadtxt(io.StringIO("".join(texts)), usecols=0, dtype=np.int64, ndmin=1)
+    return np.repeat(np.array(frames, dtype=np.int64), counts), classes
+
+
+def build_presence_matrix(source, num_classes=None):
+    """
+    Returns a dense boolean (frames, classes) matrix that is True where a class was detected in a frame, the rows are
+    the (1-based) frame numbers of the labels. source is the detections file of a DetectionSink (.npz) or the labels
+    directory or archive.
+    """
+    if source.endswith(".npz"):
+        detections = detections_structure.load_detections(source)
+        frames, classes = detections["frames"].astype(np.int64), detections["classes"].astype(np.int64)
+        total_frames = detections["frame_count"] + 1
+    else:
+        frames, classes = parse_labels(source)
+        total_frames = frames.max(initial=0) + 1
+
+    num_classes = max(num_classes or len(get_objects_dict()), classes.max(initial=-1) + 1)
+    presence = np.zeros((total_frames, num_classes), dtype=bool)
+    presence[frames, classes] = True
+    return presence
+
+
+def load_presence_matrix(source, path_to_presence=None):
+    """
+    Returns the presence matrix of the labels, the matrix is stored in path_to_presence (.npz) and only rebuilt if
+    the labels changed, so tuning the aggregation does not parse the labels again. Once the labels are removed (alva.py
+    cleans up the runs folder) the stored matrix is used. The file has the layout of the presence cache of
+    analysis/sweep.py, the presence is stored as the per frame confidence of the classes.
+    """
+    arrays = {}
+    if path_to_presence is not None and os.path.exists(path_to_presence):
+        with np.load(path_to_presence) as data:
+            arrays = {name: data[name] for name in data.files}
+        if "object_confidence" in arrays and (not os.path.exists(source) or os.path.getmtime(path_to_presence) >= os.path.getmtime(source)):
+            return arrays["object_confidence"] > 0
+    presence = build_presence_matrix(source)
+    if path_to_presence is not None:
+        # the other arrays of the cache (the RelTR triplets) are kept
+        arrays.update(object_confidence=presence.astype(np.float16), object_names=np.array(json.dumps(get_objects_dict())))
+        np.savez_compressed(path_to_presence, **arrays)
+    return presence
+
+
+def aggregate_objects(presence, fps=FPS, life_time_seconds=LIFE_TIME_SECONDS, objects=objects_of_interest):
+    """
+    Returns the start and end frames of the objects of interest from a presence matrix. The common mismatches of an
+    object are counted as the object.
+    """
+    ids = {name: int(key) for key, name in get_objects_dict().items()}
 
-    files = sorted(os.listdir(dir), key=lambda x: int(x.split(".")[0].split("_")[-1]))
-
-    # dictionary with the frame number as key and a list of objects in that frame as value
-    objects_all_frames = {}
-
-    obj_mismatch = list(objects_of_interest.keys()) + [item for value in objects_of_interest.values() for item in value]
-
-    for file in files:
-        frame_number = int(file.split(".")[0].split("_")[-1])
-        with open(os.path.join(dir, file), "r") as f:
-            lines = f.readlines()
-            objects_in_frame = set()
-            for line in lines:
-                name = objects_dict[line.split(" ")[0]]  # convert class index to class name
-                # skip if object is not in common mismatch list
-                if name not in obj_mismatch:
-                    continue
-                # if object is in common mismatch list, convert to correct name
-                for key, value in objects_of_interest.items():
-                    if name in value:
-                        name = key
-                        break
-                # add object to list of objects in frame
-                objects_in_frame.add(name)
-            if len(list(objects_in_frame)) > 0:
-                objects_all_frames[frame_number] = list(objects_in_frame)
-
-    # track previous objects
-    active_objects = {}
-    # track the start frame of new objects
-    start_end_frame_objects = {}        # {"name_of_object": [[start_frame, end_frame]]"}
     # max duration of an object before it is considered a new object
     lifetime = life_time_seconds * fps *4
-    for key in sorted(objects_all_frames.keys()):
-        for object in objects_all_frames[key]:
-            # new object
-            if object not in active_objects.keys():
-                start_end_frame_objects[object] = [[key, key + lifetime]]  # save the start frame of the object
-                active_objects[object] = key  # save the current frame of the object
-            # object already active
-            elif key - active_objects[object] <= lifetime:
-                if start_end_frame_objects[object][-1][1] < key:
-                    start_end_frame_objects[object][-1][1] = key   # update the end frame of the last object
-                active_objects[object] = key   # update the current frame of the object
-            # object too old, start new object
-            else:
-                start_end_frame_objects[object].append([key, key + lifetime])  # save the start frame of the object
-                active_objects[object] = key  # save the current frame of the object
+
+    # one observation per frame an object (or one of its mismatches) was seen in
+    names = list(objects.keys())
+    frames, labels = [], []
+    for label, name in enumerate(names):
+        columns = [ids[item] for item in [name] + objects[name] if item in ids and ids[item] < presence.shape[1]]
+        if columns:
+            object_frames = np.flatnonzero(presence[:, columns].any(axis=1))
+            frames.append(object_frames)
+            labels.append(np.full(len(object_frames), label))
+    if not frames:
+        return {}
+
+    # an object stays active for the lifetime after it was last seen and every object is shown for at least the lifetime
+    events = event_segmentation.segment_events(np.concatenate(frames), np.concatenate(labels), gap=lifetime, min_duration=lifetime)
+    start_end_frame_objects = {}        # {"name_of_object": [[start_frame, end_frame]]"}
+    for label, start, end in zip(events["labels"].tolist(), events["starts"].tolist(), events["ends"].tolist()):
+        start_end_frame_objects.setdefault(names[label], []).append([start, end])
     return start_end_frame_objects
 
+
+def extract_objects(dir, fps=FPS, life_time_seconds=LIFE_TIME_SECONDS, path_to_presence=None):
+    """
+    Returns the start and end frames of the objects of interest from the YOLO labels, dir is either the labels
+    directory or the packed labels archive (see structures/frame_archive.py). If path_to_presence is given the
+    presence matrix is stored there and reused.
+    """
+    presence = load_presence_matrix(dir, path_to_presence)
+    return aggregate_objects(presence, fps, life_time_seconds)
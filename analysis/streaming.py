@@ -0,0 +1,213 @@
+import os
+import copy
+import time
+import threading
+import numpy as np
+
+from analysis import tracker
+from analysis import extract_keypoints
+from analysis import extract_objects
+from analysis import extract_interactions
+from structures import frame_archive
+from structures import keypoints_structure
+from structures import timeline_structure
+
+CHECKPOINT_SECONDS = 60     # seconds between two checkpoints of the partial results
+OBJECT_LIFE_TIME_SECONDS = 10       # same life times as the analysis of alva.py
+INTERACTION_LIFE_TIME_SECONDS = 3
+
+
+class ObjectEventBuilder:
+    """
+    Incremental version of extract_objects.extract_objects. The detected classes are added frame by frame in frame
+    order, the events are the same as extract_objects returns for all frames at once.
+    """
+
+    def __init__(self, fps=extract_objects.FPS, life_time_seconds=OBJECT_LIFE_TIME_SECONDS, objects=extract_objects.objects_of_interest):
+        # the common mismatches of an object are counted as the object
+        ids = {name: int(key) for key, name in extract_objects.get_objects_dict().items()}
+        self.names = list(objects.keys())
+        self.labels = {}        # {class_index: [names of the objects]}
+        for name in self.names:
+            for item in [name] + objects[name]:
+                if item in ids and name not in self.labels.setdefault(ids[item], []):
+                    self.labels[ids[item]].append(name)
+
+        # max duration of an object before it is considered a new object, every object is shown at least this long
+        self.lifetime = life_time_seconds * fps *4
+        self.closed = {name: [] for name in self.names}
+        self.active = {}        # {name: [start_frame, last_frame]}
+
+    def update(self, frame, classes):
+        for name in {name for cls in set(np.asarray(classes).tolist()) for name in self.labels.get(int(cls), [])}:
+            event = self.active.get(name)
+            if event is not None and frame - event[1] <= self.lifetime:
+                event[1] = frame
+                continue
+            if event is not None:
+                self.closed[name].append(self._interval(event))
+            self.active[name] = [frame, frame]
+
+    def _interval(self, event):
+        return [event[0], max(event[0] + self.lifetime, event[1])]
+
+    def events(self):
+        """
+        Returns the objects seen so far as {name: [[start_frame, end_frame]]}, the active objects end at their last frame.
+        """
+        start_end_frame_objects = {}
+        for name in self.names:
+            intervals = self.closed[name] + ([self._interval(self.active[name])] if name in self.active else [])
+            if intervals:
+                start_end_frame_objects[name] = intervals
+        return start_end_frame_objects
+
+
+class InteractionEventBuilder:
+    """
+    Incremental version of extract_interactions.extract_object_interactions_events. The RelTR triplets are added frame
+    by frame in frame order, the events are the same as extract_object_interactions_events returns for all frames.
+    """
+
+    def __init__(self, fps=extract_interactions.FPS, life_time_seconds=INTERACTION_LIFE_TIME_SECONDS):
+        self.lifetime = life_time_seconds * fps
+        self.last_frame = {}        # {predicate: frame the predicate was last seen}
+        self.interactions = {}      # {start_frame: [predicate, object]}
+
+    def update(self, frame, triplets):
+        for triplet in triplets:
+            predicate = triplet["predicate"]["id"]
+            if predicate not in extract_interactions.object_interactions:
+                continue
+            # a new event starts after the lifetime, the last interaction that starts in a frame is kept
+            if predicate not in self.last_frame or frame - self.last_frame[predicate] > self.lifetime:
+                self.interactions[frame] = [predicate, triplet["object"]["id"]]
+            self.last_frame[predicate] = frame
+
+    def events(self):
+        return dict(self.interactions)
+
+
+class StreamingAnalysis:
+    """
+    This class is used to build the timeline and the keypoints of the child and therapist while the models are still
+    running, instead of parsing all outputs afterwards. The stages call on_detections, on_triplets and on_keypoints
+    with the results of every frame (from their own threads). Every checkpoint_seconds the partial timeline and
+    keypoints are written to the assets folder, so the results of a long run survive a crash.
+    """
+
+    def __init__(self, timeline, path_to_assets, objects=False, interactions=False, keypoints=False,
+                 object_life_time_seconds=OBJECT_LIFE_TIME_SECONDS, interaction_life_time_seconds=INTERACTION_LIFE_TIME_SECONDS,
+                 checkpoint_seconds=CHECKPOINT_SECONDS):
+        # the timeline only has to contain the general information, the events are inserted into a copy
+        self.timeline = timeline
+        self.path_to_assets = path_to_assets
+        self.path_to_timeline = os.path.join(path_to_assets, "timeline", os.path.basename(os.path.normpath(path_to_assets)) + "_timeline.txt")
+        self.path_to_keypoints = os.path.join(path_to_assets, "juxtaposition")
+        self.checkpoint_seconds = checkpoint_seconds
+
+        fps = int(float(timeline.Frame_Rate))
+        self.objects = ObjectEventBuilder(fps, object_life_time_seconds) if objects else None
+        self.interactions = InteractionEventBuilder(fps, interaction_life_time_seconds) if interactions else None
+        self.tracker = tracker.OnlineTracker(num_keypoints=extract_keypoints.NUM_KEYPOINTS) if keypoints else None
+
+        self.lock = threading.Lock()
+        self.last_checkpoint = time.monotonic()
+
+    def on_detections(self, frame, classes):
+        with self.lock:
+            self.objects.update(frame, classes)
+        self.maybe_checkpoint()
+
+    def on_triplets(self, frame, triplets):
+        with self.lock:
+            self.interactions.update(frame, triplets)
+        self.maybe_checkpoint()
+
+    def on_keypoints(self, frame, json_object):
+        # the openpose files have no gaps, the frames are added in order
+        with self.lock:
+            self.tracker.update(extract_keypoints.people_keypoints(json_object))
+        self.maybe_checkpoint()
+
+    def feed_objects(self, labels):
+        """
+        This function is used to add the objects of a stage that did not run in this process, e.g. restored from the cache.
+        """
+        frames, classes = extract_objects.parse_labels(labels)
+        bounds = np.flatnonzero(np.diff(frames)) + 1
+        for frame_classes, frame in zip(np.split(classes, bounds), frames[np.r_[0, bounds]] if len(frames) else []):
+            self.on_detections(int(frame), frame_classes)
+
+    def feed_interactions(self, reltr):
+        for frame, triplets in frame_archive.iter_frames(reltr):
+            self.on_triplets(frame, triplets)
+
+    def feed_keypoints(self, openpose):
+        for frame, json_object in frame_archive.iter_frames(openpose):
+            self.on_keypoints(frame, json_object)
+
+    def follow_keypoints(self, directory, run):
+        """
+        Returns a function that calls run (e.g. OpenPose) and meanwhile adds the openpose files that run writes to
+        directory. It returns once run returned and all files have been added.
+        """
+        def run_and_follow():
+            finished = threading.Event()
+            errors = []
+
+            def follow():
+                try:
+                    for frame, json_object in frame_archive.follow_frames(directory, finished):
+                        self.on_keypoints(frame, json_object)
+                except Exception as e:
+                    errors.append(e)
+
+            follower = threading.Thread(target=follow, daemon=True)
+            follower.start()
+            try:
+                run()
+            finally:
+                finished.set()
+                follower.join()
+            if errors:
+                raise errors[0]
+        return run_and_follow
+
+    def timeline_result(self):
+        """
+        Returns a copy of the timeline with the objects and object interactions seen so far.
+        """
+        timeline = copy.deepcopy(self.timeline)
+        return timeline_structure.insert_events(timeline,
+                                                objects=self.objects.events() if self.objects is not None else None,
+                                                interactions=self.interactions.events() if self.interactions is not None else None)
+
+    def keypoints_result(self):
+        """
+        Returns the keypoints, bounding boxes and confidences of the child and therapist seen so far, see
+        extract_keypoints.get_keypoints_openpose.
+        """
+        tracks, tracks_bbox = self.tracker.result()
+        return extract_keypoints.select_child_therapist(tracks, tracks_bbox, return_confidence=True)
+
+    def maybe_checkpoint(self):
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_seconds:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        This function is used to write the partial timeline and keypoints to the assets folder.
+        """
+        with self.lock:
+            self.last_checkpoint = time.monotonic()
+            # the export replaces the file atomically, a crash while writing keeps the previous checkpoint
+            os.makedirs(os.path.dirname(self.path_to_timeline), exist_ok=True)
+            self.timeline_result().export_to_file(self.path_to_timeline)
+
+            if self.tracker is not None and self.tracker.frame_count:
+                os.makedirs(self.path_to_keypoints, exist_ok=True)
+                child, therapist, child_bbox, therapist_bbox, child_conf, therapist_conf = self.keypoints_result()
+                fps = float(self.timeline.Frame_Rate)
+                keypoints_structure.save_keypoints(child, child_conf, child_bbox, self.path_to_keypoints, "child", fps=fps)
+                keypoints_structure.save_keypoints(therapist, therapist_conf, therapist_bbox, self.path_to_keypoints, "therapist", fps=fps)
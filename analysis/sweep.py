@@ -0,0 +1,209 @@
+import os
+import json
+import argparse
+import itertools
+import numpy as np
+
+from analysis import event_segmentation
+from analysis import extract_objects
+from analysis import extract_interactions
+from structures import frame_archive
+from structures import detections_structure
+from structures import timeline_structure
+
+VIS_TOOL_ASSETS_PATH = os.path.join("vis_tool", "assets", "video_assets")
+
+OBJECT_LIFE_TIME_SECONDS = 10       # defaults of alva.py
+OBJECT_CONFIDENCE = 0.0
+INTERACTION_LIFE_TIME_SECONDS = 3
+INTERACTION_CONFIDENCE = 0.0
+
+
+def build_presence_cache(path_to_cache, detections=None, labels=None, reltr=None):
+    """
+    This function is used to save the per frame results of the models in one compressed file, so the aggregation can
+    be repeated with other settings without rerunning or reparsing anything. alva.py writes it to the
+    extract_objects.PRESENCE_FILE of the assets, extract_objects.load_presence_matrix reads the presence from it:
+        object_confidence: (frames, classes) max confidence of every class per frame, from the DetectionSink file
+                           (detections) or the YOLO labels (labels, confidence 1 as they have no scores)
+        triplet_*: one row per RelTR triplet (reltr directory or archive) with the frame, the subject, predicate and
+                   object indices and their scores, in the order of the frames and the triplets
+    """
+    arrays = {}
+    if detections is not None and os.path.exists(detections):
+        data = detections_structure.load_detections(detections)
+        object_names = data["names"] or extract_objects.get_objects_dict()
+        num_classes = max(len(object_names), int(data["classes"].max(initial=-1)) + 1)
+        confidence = np.zeros((data["frame_count"] + 1, num_classes), dtype=np.float32)
+        np.maximum.at(confidence, (data["frames"].astype(np.int64), data["classes"].astype(np.int64)), data["confidences"])
+        arrays["object_confidence"] = confidence.astype(np.float16)
+        arrays["object_names"] = np.array(json.dumps(object_names))
+    elif labels is not None:
+        arrays["object_confidence"] = extract_objects.build_presence_matrix(labels).astype(np.float16)
+        arrays["object_names"] = np.array(json.dumps(extract_objects.get_objects_dict()))
+
+    if reltr is not None:
+        vocabulary = {}
+        rows = []
+        for frame_number, triplets in frame_archive.iter_frames(reltr):
+            for triplet in triplets:
+                rows.append((frame_number,
+                             vocabulary.setdefault(triplet["subject"]["id"], len(vocabulary)),
+                             vocabulary.setdefault(triplet["predicate"]["id"], len(vocabulary)),
+                             vocabulary.setdefault(triplet["object"]["id"], len(vocabulary)),
+                             triplet["subject"].get("score", 1.0), triplet["predicate"].get("score", 1.0), triplet["object"].get("score", 1.0)))
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 7)
+        arrays["triplet_frames"] = rows[:, 0].astype(np.int32)
+        arrays["triplet_ids"] = rows[:, 1:4].astype(np.int32)
+        arrays["triplet_scores"] = rows[:, 4:7].astype(np.float32)
+        arrays["triplet_names"] = np.array(json.dumps(list(vocabulary.keys())))
+
+    np.savez_compressed(path_to_cache, **arrays)
+    return path_to_cache
+
+
+def load_presence_cache(path_to_cache):
+    """
+    Returns a dictionary with the arrays of a presence cache, the names are decoded.
+    """
+    with np.load(path_to_cache) as data:
+        cache = {name: data[name] for name in data.files}
+    for name in ["object_names", "triplet_names"]:
+        if name in cache:
+            cache[name] = json.loads(str(cache[name]))
+    return cache
+
+
+def sweep_objects(cache, fps, settings, objects=extract_objects.objects_of_interest):
+    """
+    Returns the objects ({name: [[start_frame, end_frame]]}) for every (life_time_seconds, confidence) setting. The
+    objects of all settings are segmented in one pass, every setting has its own labels.
+    """
+    if "object_confidence" not in cache:
+        return [{} for _ in settings]
+    confidence = cache["object_confidence"]
+    ids = {name: int(key) for key, name in cache["object_names"].items()}
+    names = list(objects.keys())
+
+    frames, labels, lifetimes = [], [], []
+    for setting, (life_time_seconds, min_confidence) in enumerate(settings):
+        lifetime = life_time_seconds * fps *4
+        for label, name in enumerate(names):
+            columns = [ids[item] for item in [name] + objects[name] if item in ids and ids[item] < confidence.shape[1]]
+            if not columns:
+                continue
+            scores = confidence[:, columns]
+            object_frames = np.flatnonzero(((scores > 0) & (scores >= min_confidence)).any(axis=1))
+            frames.append(object_frames)
+            labels.append(np.full(len(object_frames), setting * len(names) + label))
+            lifetimes.append(np.full(len(object_frames), lifetime))
+
+    results = [{} for _ in settings]
+    if not sum(map(len, frames)):
+        return results
+    lifetimes = np.concatenate(lifetimes)
+    events = event_segmentation.segment_events(np.concatenate(frames), np.concatenate(labels), gap=lifetimes, min_duration=lifetimes)
+    for label, start, end in zip(events["labels"].tolist(), events["starts"].tolist(), events["ends"].tolist()):
+        results[label // len(names)].setdefault(names[label % len(names)], []).append([start, end])
+    return results
+
+
+def sweep_interactions(cache, fps, settings):
+    """
+    Returns the object interactions ({start_frame: [predicate, object]}) for every (life_time_seconds, confidence)
+    setting, the confidence is compared to the score of the triplet (product of the subject, predicate and object
+    scores). Same rules as extract_interactions.extract_object_interactions_events.
+    """
+    if "triplet_frames" not in cache:
+        return [{} for _ in settings]
+    vocabulary = cache["triplet_names"]
+    predicates = np.array([extract_interactions.object_interactions.index(name) if name in extract_interactions.object_interactions else -1
+                           for name in vocabulary], dtype=np.int64)
+    triplet_predicates = predicates[cache["triplet_ids"][:, 1]] if len(vocabulary) else np.empty(0, dtype=np.int64)
+    triplet_scores = cache["triplet_scores"].prod(axis=1)
+    num_predicates = len(extract_interactions.object_interactions)
+
+    rows, labels, lifetimes = [], [], []
+    for setting, (life_time_seconds, min_confidence) in enumerate(settings):
+        setting_rows = np.flatnonzero((triplet_predicates >= 0) & (triplet_scores >= min_confidence))
+        rows.append(setting_rows)
+        labels.append(setting * num_predicates + triplet_predicates[setting_rows])
+        lifetimes.append(np.full(len(setting_rows), life_time_seconds * fps))
+
+    results = [{} for _ in settings]
+    if not sum(map(len, rows)):
+        return results
+    rows = np.concatenate(rows)
+    events = event_segmentation.segment_events(cache["triplet_frames"][rows], np.concatenate(labels), gap=np.concatenate(lifetimes))
+
+    # the events are resolved per setting in the order of their first triplet, the last interaction of a frame is kept
+    for label, first in sorted(zip(events["labels"].tolist(), events["first"].tolist()), key=lambda event: event[1]):
+        row = rows[first]
+        results[label // num_predicates][int(cache["triplet_frames"][row])] = [vocabulary[cache["triplet_ids"][row, 1]],
+                                                                               vocabulary[cache["triplet_ids"][row, 2]]]
+    return results
+
+
+def sweep(path_to_cache, fps, object_settings, interaction_settings):
+    """
+    Returns a list of (setting, objects, interactions) for every combination of the object and interaction settings,
+    both are lists of (life_time_seconds, confidence).
+    """
+    cache = load_presence_cache(path_to_cache)
+    objects = sweep_objects(cache, fps, object_settings)
+    interactions = sweep_interactions(cache, fps, interaction_settings)
+    results = []
+    for (object_index, object_setting), (interaction_index, interaction_setting) in itertools.product(enumerate(object_settings), enumerate(interaction_settings)):
+        setting = {"object_life_time_seconds": object_setting[0], "object_confidence": object_setting[1],
+                   "interaction_life_time_seconds": interaction_setting[0], "interaction_confidence": interaction_setting[1]}
+        results.append((setting, objects[object_index], interactions[interaction_index]))
+    return results
+
+
+def sweep_asset(asset_folder, object_settings, interaction_settings, out_dir=None):
+    """
+    This function is used to write one timeline per setting for a video of the visualisation tool. The general
+    information and the ABCS coding are taken from the timeline of the video. Returns the paths of the timelines.
+    """
+    name = os.path.basename(os.path.normpath(asset_folder))
+    base = timeline_structure.Timeline()
+    base.import_from_file(os.path.join(asset_folder, "timeline", name + "_timeline.txt"))
+    out_dir = out_dir or os.path.join(asset_folder, "timeline", "sweep")
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    results = sweep(os.path.join(asset_folder, extract_objects.PRESENCE_FILE), int(float(base.Frame_Rate)), object_settings, interaction_settings)
+    for setting, objects, interactions in results:
+        timeline = timeline_structure.Timeline(video_name=base.Video_Name, duration=base.Duration, frame_width=base.Frame_Width,
+                                               frame_height=base.Frame_Height, frame_rate=base.Frame_Rate, total_frames=base.Total_Frames,
+                                               date_recorded=base.Date_Recorded, author=base.Author, date_coding=base.Date_Coding)
+        timeline.add_abcs_codings(base.get_abcs_coding().itertuples(index=False, name=None))
+        timeline_structure.insert_events(timeline, objects=objects, interactions=interactions)
+
+        tag = "obj_%gs_%g_int_%gs_%g" % (setting["object_life_time_seconds"], setting["object_confidence"],
+                                         setting["interaction_life_time_seconds"], setting["interaction_confidence"])
+        path_to_file = os.path.join(out_dir, name + "_" + tag + "_timeline.txt")
+        timeline.export_to_file(path_to_file)
+        paths.append(path_to_file)
+        print(f"{tag}: {sum(len(intervals) for intervals in objects.values())} objects, {len(interactions)} interactions -> {path_to_file}")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="sweep",
+        description="Aggregates the objects and object interactions of a video with many settings at once from its presence cache "
+                    "and writes one timeline per combination of the settings to <asset>/timeline/sweep.",)
+    parser.add_argument("asset", type=str, help="name of the video in vis_tool/assets/video_assets or path to its asset folder")
+    parser.add_argument("--object-life", type=float, nargs="+", default=[OBJECT_LIFE_TIME_SECONDS], help="life times of the objects in seconds")
+    parser.add_argument("--object-conf", type=float, nargs="+", default=[OBJECT_CONFIDENCE], help="min confidences of the object detections")
+    parser.add_argument("--interaction-life", type=float, nargs="+", default=[INTERACTION_LIFE_TIME_SECONDS], help="life times of the interactions in seconds")
+    parser.add_argument("--interaction-conf", type=float, nargs="+", default=[INTERACTION_CONFIDENCE], help="min scores of the RelTR triplets")
+    parser.add_argument("--out-dir", type=str, default=None, help="folder for the timelines, defaults to <asset>/timeline/sweep")
+    args = parser.parse_args()
+
+    asset_folder = args.asset if os.path.isdir(args.asset) else os.path.join(VIS_TOOL_ASSETS_PATH, args.asset)
+    sweep_asset(asset_folder,
+                list(itertools.product(args.object_life, args.object_conf)),
+                list(itertools.product(args.interaction_life, args.interaction_conf)),
+                args.out_dir)
@@ -0,0 +1,148 @@
+import numpy as np
+
+from scipy.optimize import linear_sum_assignment
+
+NUM_TRACKS = 2      # number of people tracked, e.g. child and therapist
+MAX_AGE = 25        # number of frames a track is kept alive without a matching person
+MIN_IOU = 0.1       # minimum iou of a person with the last bounding box of a track to continue the track
+
+
+def people_bboxes(keypoints):
+    """
+    Returns the bounding boxes [x_min, y_min, x_max, y_max] of all people of shape (frames, people, 4) from keypoints of
+    shape (frames, people, keypoints, 3). Keypoints with zero confidence are missing and are ignored, people without
+    any keypoint get a nan bounding box.
+    """
+    x, y, confidence = keypoints[..., 0], keypoints[..., 1], keypoints[..., 2]
+    valid = confidence > 0
+    with np.errstate(invalid="ignore"):
+        bboxes = np.stack([np.where(valid, x, np.inf).min(axis=-1),
+                           np.where(valid, y, np.inf).min(axis=-1),
+                           np.where(valid, x, -np.inf).max(axis=-1),
+                           np.where(valid, y, -np.inf).max(axis=-1)], axis=-1)
+    bboxes[~valid.any(axis=-1)] = np.nan
+    return bboxes
+
+
+def iou_matrix(bboxes_1, bboxes_2):
+    """
+    Returns the iou of every pair of bounding boxes of shape (n, 4) and (m, 4) as an (n, m) matrix, the widths and
+    heights are + 1 to account for touching edges.
+    """
+    a = bboxes_1[:, None, :]
+    b = bboxes_2[None, :, :]
+    width = np.maximum(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]) + 1, 0)
+    height = np.maximum(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]) + 1, 0)
+    intersection = width * height
+    area_1 = (a[..., 2] - a[..., 0] + 1) * (a[..., 3] - a[..., 1] + 1)
+    area_2 = (b[..., 2] - b[..., 0] + 1) * (b[..., 3] - b[..., 1] + 1)
+    return intersection / (area_1 + area_2 - intersection)
+
+
+def center_distance_matrix(bboxes_1, bboxes_2):
+    # distance of the centers of every pair of bounding boxes
+    centers_1 = (bboxes_1[:, :2] + bboxes_1[:, 2:]) / 2
+    centers_2 = (bboxes_2[:, :2] + bboxes_2[:, 2:]) / 2
+    return np.linalg.norm(centers_1[:, None, :] - centers_2[None, :, :], axis=-1)
+
+
+class OnlineTracker:
+    """
+    This class is used to assign the people of every frame to a fixed number of tracks while the frames arrive. The
+    people are matched to the live tracks by the optimal (hungarian) assignment on the iou of their bounding boxes. A
+    person without a match starts a new track in a free slot, a track without a match for more than max_age frames
+    dies and frees its slot. If there is no free slot, the remaining people take over the lost tracks with the closest
+    bounding box.
+    """
+
+    def __init__(self, num_tracks=NUM_TRACKS, max_age=MAX_AGE, min_iou=MIN_IOU, num_keypoints=25, capacity=1024, dtype=np.float32):
+        self.num_tracks = num_tracks
+        self.max_age = max_age
+        self.min_iou = min_iou
+        self.frame_count = 0
+
+        self.tracks = np.full((num_tracks, capacity, num_keypoints, 3), np.nan, dtype=dtype)
+        self.tracks_bbox = np.full((num_tracks, capacity, 4), np.nan)
+
+        self.last_bbox = np.full((num_tracks, 4), np.nan)
+        self.age = np.zeros(num_tracks, dtype=np.int64)
+        self.alive = np.zeros(num_tracks, dtype=bool)
+
+    def _grow(self):
+        # double the capacity, this keeps the updates amortized O(1)
+        self.tracks = np.concatenate([self.tracks, np.full_like(self.tracks, np.nan)], axis=1)
+        self.tracks_bbox = np.concatenate([self.tracks_bbox, np.full_like(self.tracks_bbox, np.nan)], axis=1)
+
+    def update(self, keypoints, bboxes=None):
+        """
+        This function is used to add the next frame, keypoints are the people of the frame of shape (people, keypoints, 3)
+        and bboxes their bounding boxes if they are already known.
+        """
+        if self.frame_count >= self.tracks.shape[1]:
+            self._grow()
+        frame_index = self.frame_count
+        self.frame_count += 1
+
+        bboxes = people_bboxes(keypoints) if bboxes is None else bboxes
+        people = np.flatnonzero(~np.isnan(bboxes[:, 0]))
+        alive, age, last_bbox = self.alive, self.age, self.last_bbox
+        age[alive] += 1
+        assignment = {}
+
+        live = np.flatnonzero(alive)
+        if len(people) and len(live):
+            # optimal assignment of the people to the live tracks
+            iou = iou_matrix(bboxes[people], last_bbox[live])
+            rows, cols = linear_sum_assignment(iou, maximize=True)
+            for row, col in zip(rows, cols):
+                if iou[row, col] >= self.min_iou:
+                    assignment[people[row]] = live[col]
+
+        unmatched = [person for person in people if person not in assignment]
+        if unmatched:
+            # birth of new tracks in the free slots, the people are born in the order of their size
+            free = list(np.flatnonzero(~alive))
+            unmatched.sort(key=lambda person: -np.prod(bboxes[person, 2:] - bboxes[person, :2]))
+            while unmatched and free:
+                assignment[unmatched.pop(0)] = free.pop(0)
+
+        lost = np.array([track for track in np.flatnonzero(alive) if track not in assignment.values()], dtype=np.int64) if unmatched else []
+        if len(lost):
+            # no free slot, the remaining people continue the lost tracks with the closest bounding box
+            distance = center_distance_matrix(bboxes[unmatched], last_bbox[lost])
+            rows, cols = linear_sum_assignment(distance)
+            for row, col in zip(rows, cols):
+                assignment[unmatched[row]] = lost[col]
+
+        for person, track in assignment.items():
+            self.tracks[track, frame_index] = keypoints[person]
+            self.tracks_bbox[track, frame_index] = bboxes[person]
+            last_bbox[track] = bboxes[person]
+            age[track] = 0
+            alive[track] = True
+
+        # death of the tracks that have not been matched for too long
+        alive &= age <= self.max_age
+
+    def result(self):
+        """
+        Returns the keypoints of shape (num_tracks, frames, keypoints, 3) and the bounding boxes of shape (num_tracks, frames, 4)
+        of the tracks so far, nan in frames where a track has no person.
+        """
+        return self.tracks[:, :self.frame_count], self.tracks_bbox[:, :self.frame_count]
+
+
+def track_people(keypoints, counts, num_tracks=NUM_TRACKS, max_age=MAX_AGE, min_iou=MIN_IOU):
+    """
+    This function is used to assign the people of every frame to a fixed number of tracks, see OnlineTracker.
+
+    Returns the keypoints of shape (num_tracks, frames, keypoints, 3) and the bounding boxes of shape (num_tracks, frames, 4)
+    of the tracks, nan in frames where a track has no person.
+    """
+    total_frames, _, num_keypoints, _ = keypoints.shape
+    bboxes = people_bboxes(keypoints)
+
+    people_tracker = OnlineTracker(num_tracks, max_age, min_iou, num_keypoints, capacity=max(total_frames, 1), dtype=keypoints.dtype)
+    for frame_index in range(total_frames):
+        people_tracker.update(keypoints[frame_index, :counts[frame_index]], bboxes[frame_index, :counts[frame_index]])
+    return people_tracker.result()
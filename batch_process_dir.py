@@ -1,30 +1,107 @@
 import os
+import sys
+import time
+import shutil
+import argparse
 import subprocess
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 # INPUT_DIR must cointain only videos
 INPUT_DIR = os.path.join("test_data", "ALVA_PostProcessed_Data")    # path to the directory containing the videos
 SUPPORTED_FORMATS = [".mp4", ".avi", ".mov", ".mkv", ".webm"]
 
-def main():
-    # run the video through alva.py to generate the assets and store everything in ./vis_tool/assets
-    for video in os.listdir(INPUT_DIR):
+WORKSPACE_DIR = "batch_workspace"   # every job gets its own runs and temp folder and log file in here
+NUM_WORKERS = 2                     # number of videos processed at the same time
+VIS_TOOL_ASSETS_PATH = os.path.join("vis_tool", "assets", "video_assets")
+
+ALVA_ARGS = [
+    "--pose-estimation",
+    "--object-detection",
+    "--object-interaction"
+    ]
+
+
+def assign_output_names(videos):
+    # reserve a unique output namespace for every video up front, so parallel jobs never race for the same folder
+    names = {}
+    taken = set(os.listdir(VIS_TOOL_ASSETS_PATH)) if os.path.exists(VIS_TOOL_ASSETS_PATH) else set()
+    for video in videos:
+        video_name = os.path.splitext(video)[0]
+        name = video_name
+        count = 2
+        while name in taken:
+            name = video_name + "_" + str(count)
+            count += 1
+        taken.add(name)
+        names[video] = name
+    return names
+
+
+def run_job(video, name, input_dir, workspace_dir):
+    # every job runs alva.py in its own workspace and writes its output to its own log file
+    workspace = os.path.join(workspace_dir, name)
+    os.makedirs(workspace, exist_ok=True)
+    path_to_log = os.path.join(workspace, "alva.log")
+
+    start = time.time()
+    with open(path_to_log, "w") as log:
+        result = subprocess.run([
+            sys.executable,
+            os.path.join(".", "alva.py"),
+            "--video-in", os.path.join(input_dir, video),
+            "--workspace", workspace,
+            "--output-name", name,
+            ] + ALVA_ARGS,
+            stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.time() - start, path_to_log
+
+
+def main(args):
+    videos = []
+    for video in sorted(os.listdir(args.input_dir)):
         if os.path.splitext(video)[1] in SUPPORTED_FORMATS:
-            print(f"Processing {video}")
-            subprocess.run([
-                "python", 
-                os.path.join(".", "alva.py"),
-                "--video-in", os.path.join(INPUT_DIR, video),
-                "--pose-estimation",
-                "--object-detection",
-                "--object-interaction"
-                ])
-            print(f"Finished processing {video}")
+            videos.append(video)
         else:
             print(f"Unsupported format for {video}")
-    print("Finished processing all videos")
+    names = assign_output_names(videos)
+
+    # run the videos through alva.py to generate the assets and store everything in ./vis_tool/assets
+    summary = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        jobs = {}
+        for video in videos:
+            print(f"Processing {video} as {names[video]}")
+            jobs[pool.submit(run_job, video, names[video], args.input_dir, args.workspace_dir)] = video
+        for job in as_completed(jobs):
+            video = jobs[job]
+            returncode, duration, path_to_log = job.result()
+            status = "done" if returncode == 0 else f"failed ({returncode})"
+            print(f"Finished processing {video}: {status} after {duration / 60:.1f} min, log in {path_to_log}")
+            summary.append((video, names[video], status, duration, path_to_log))
+            # the intermediate outputs are only kept for failed jobs to debug them, the logs are always kept
+            if returncode == 0 and not args.keep_workspaces:
+                shutil.rmtree(os.path.join(args.workspace_dir, names[video], "runs"), ignore_errors=True)
+                shutil.rmtree(os.path.join(args.workspace_dir, names[video], "temp"), ignore_errors=True)
+
+    # print the summary of all jobs
+    print("\nSummary:")
+    print(f"{'video':<40}{'output':<40}{'status':<14}{'minutes':>8}")
+    for video, name, status, duration, _ in sorted(summary):
+        print(f"{video:<40}{name:<40}{status:<14}{duration / 60:>8.1f}")
+    failed = [entry for entry in summary if entry[2] != "done"]
+    print(f"Finished processing all videos, {len(summary) - len(failed)} done, {len(failed)} failed")
     print("Starting visualisation tool by running oc_tool.py")
 
 
 if __name__ == "__main__":
-    main() 
+    parser = argparse.ArgumentParser(
+        prog="batch_process_dir.py",
+        description="Runs alva.py on all videos of a directory in parallel, every video with its own workspace and log file.",)
+
+    parser.add_argument("--input-dir", type=str, default=INPUT_DIR, help="directory containing the videos")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="number of videos processed at the same time")
+    parser.add_argument("--workspace-dir", type=str, default=WORKSPACE_DIR, help="directory for the per job workspaces and logs")
+    parser.add_argument("--keep-workspaces", action="store_true", help="keep the runs and temp folders of successful jobs")
 
+    main(parser.parse_args())
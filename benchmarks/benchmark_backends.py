@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import inference_backend
+
+WEIGHTS = ["./models/yolov8n.pt", "./models/yolov8l.pt", "./models/yolov8x-pose.pt"]   # weights referenced in modules/
+
+
+def read_frames(path_to_video, num_frames):
+    # decode the frames up front so only the inference is timed
+    cap = cv2.VideoCapture(path_to_video)
+    frames = []
+    while len(frames) < num_frames:
+        is_read, frame = cap.read()
+        if not is_read:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def benchmark(weights, backend, frames, batch_size, int8=False, threads=None):
+    model = inference_backend.load_yolo(weights, backend=backend, int8=int8, threads=threads)
+
+    # warm up, the first call initializes the runtime
+    model(frames[:batch_size], verbose=False)
+
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch_size):
+        model(frames[i:i + batch_size], verbose=False)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main(args):
+    if args.video_in:
+        frames = read_frames(args.video_in, args.frames)
+    else:
+        # random frames in full hd if no video is given
+        frames = [np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8) for _ in range(args.frames)]
+
+    print(f"{'weights':<24}{'backend':<12}{'frames/s':>10}")
+    for weights in args.weights:
+        for backend in args.backends:
+            if backend == "cuda" and not inference_backend.cuda_available():
+                continue
+            fps = benchmark(weights, backend, frames, args.batch, int8=args.int8, threads=args.threads)
+            print(f"{os.path.basename(weights):<24}{backend:<12}{fps:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="benchmark_backends.py",
+        description="Reports the inference throughput in frames/s of the YOLO weights on every inference backend.",)
+
+    parser.add_argument("--video-in", type=str, default=None, help="path to the video to read the frames from, random frames if not given")
+    parser.add_argument("--frames", type=int, default=256, help="number of frames to run through every model")
+    parser.add_argument("--weights", type=str, nargs="+", default=WEIGHTS, help="weights to benchmark")
+    parser.add_argument("--backends", type=str, nargs="+", default=["cuda", "torch", "onnx", "openvino"],
+                        choices=inference_backend.BACKENDS, help="backends to benchmark")
+    parser.add_argument("--batch", type=int, default=8, help="number of frames per inference call")
+    parser.add_argument("--threads", type=int, default=None, help="number of cpu threads used for inference")
+    parser.add_argument("--int8", action="store_true", help="use int8-quantized models on the onnx and openvino backends")
+
+    main(parser.parse_args())
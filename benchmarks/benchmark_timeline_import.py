@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from structures import timeline_structure
+
+ROWS = 50000        # rows of the synthetic timeline
+REPEAT = 5          # the best of the runs is reported
+FPS = 25
+OBJECT_NAMES = ["cup", "bottle", "bowl", "teddy bear"]
+ABCS_VARIABLES = ["EW", "UN", "OT", "RB", "FP"]
+
+
+def synthetic_timeline(rows=ROWS, fps=FPS, seed=0):
+    """
+    Returns a timeline of a two hour video with rows events, half of them objects, 40% object interactions and 10%
+    abcs codings.
+    """
+    rng = np.random.default_rng(seed)
+    total_frames = 2 * 3600 * fps
+    timeline = timeline_structure.Timeline(video_name="synthetic", duration=total_frames / fps, frame_width=1920, frame_height=1080,
+                                           frame_rate=fps, total_frames=total_frames, date_recorded="2024-01-01", author="benchmark",
+                                           date_coding="2024-01-01")
+
+    num_objects, num_interactions = rows // 2, rows * 2 // 5
+    starts = np.sort(rng.integers(0, total_frames, num_objects))
+    timeline.add_objects(zip(starts.tolist(), (starts + rng.integers(fps, 60 * fps, num_objects)).tolist(),
+                             rng.choice(OBJECT_NAMES, num_objects).tolist()))
+    timeline.add_object_interactions((int(frame), "Is holding " + name + ".") for frame, name in
+                                     zip(np.sort(rng.integers(0, total_frames, num_interactions)), rng.choice(OBJECT_NAMES, num_interactions)))
+    num_codings = rows - num_objects - num_interactions
+    starts = np.sort(rng.integers(0, total_frames, num_codings))
+    timeline.add_abcs_codings(zip(starts.tolist(), (starts + rng.integers(1, 10 * fps, num_codings)).tolist(),
+                                  rng.choice(ABCS_VARIABLES, num_codings).tolist(), ["comment"] * num_codings))
+    return timeline
+
+
+def benchmark(rows=ROWS, repeat=REPEAT, use_sidecar=False):
+    """
+    This function is used to measure the import of a synthetic timeline file with the given number of rows, from the
+    text file or from its binary sidecar. Returns the best time of the runs in seconds.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path_to_file = os.path.join(directory, "synthetic_timeline.txt")
+        reference = synthetic_timeline(rows)
+        reference.export_to_file(path_to_file)
+        print(f"Timeline with {rows} rows, {os.path.getsize(path_to_file) / 1e6:.1f} MB")
+
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            timeline = timeline_structure.Timeline()
+            timeline.import_from_file(path_to_file, use_sidecar=use_sidecar)
+            # the tables are only built when they are read
+            timeline.get_objects(), timeline.get_object_interactions(), timeline.get_abcs_coding()
+            times.append(time.perf_counter() - start)
+
+        # the imported timeline has to be the same as the exported one
+        for imported, exported in [(timeline.get_objects(), reference.get_objects()),
+                                   (timeline.get_object_interactions(), reference.get_object_interactions()),
+                                   (timeline.get_abcs_coding(), reference.get_abcs_coding())]:
+            assert imported.values.tolist() == exported.values.tolist(), "The imported timeline differs from the exported one"
+
+    print(f"Import ({'sidecar' if use_sidecar else 'text'}): best {min(times) * 1000:.1f} ms, mean {np.mean(times) * 1000:.1f} ms over {repeat} runs ({rows / min(times):,.0f} rows/s)")
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="benchmark_timeline_import",
+        description="Measures the import of a synthetic timeline file.",)
+    parser.add_argument("--rows", type=int, default=ROWS, help="number of rows of the synthetic timeline")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="number of runs")
+    parser.add_argument("--sidecar", action="store_true", help="import from the binary sidecar (needs pyarrow) instead of the text file")
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.repeat, args.sidecar)
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import socket
+import shutil
+import tempfile
+import contextlib
+
+BACKENDS = ["auto", "cuda", "torch", "onnx", "openvino"]     # torch runs the .pt weights on the cpu
+
+CPU_BACKEND = "onnx"    # backend used by "auto" if no gpu is available
+
+EXPORT_LOCK_MAX_AGE = 3600      # seconds after which the lock of an export is stale, even if its job still runs
+EXPORT_LOCK_POLL_INTERVAL = 1.0
+
+
+def cuda_available():
+    import torch
+    return torch.cuda.is_available()
+
+
+def guess_task(weights):
+    """
+    Returns the Ultralytics task of a weights file from its name, exported models do not always carry it.
+    """
+    name = os.path.basename(weights)
+    if "-pose" in name:
+        return "pose"
+    if "-seg" in name:
+        return "segment"
+    return "detect"
+
+
+def set_threads(threads):
+    """
+    Limits the number of cpu threads torch uses for inference (the .pt weights on the cpu and the pre- and
+    postprocessing). torch only reads OMP_NUM_THREADS when it is imported, so the pool is resized directly. The
+    exported models get their number of threads with set_runtime_threads.
+    """
+    import torch
+    torch.set_num_threads(threads)
+
+
+def set_runtime_threads(model, exported, backend, threads):
+    """
+    This function is used to limit the number of intra-op threads of an exported YOLO model. ONNX Runtime and OpenVINO
+    do not read OMP_NUM_THREADS, the number of threads is an option of the session or compiled model. Ultralytics
+    creates them when the predictor is set up, so the predictor is set up with one warm-up frame and the session or
+    compiled model is created again with the number of threads.
+    """
+    import numpy as np
+
+    model.predict(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+    runtime = model.predictor.model
+    if backend == "onnx":
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        runtime.session = onnxruntime.InferenceSession(exported, options, providers=runtime.session.get_providers())
+    else:
+        import openvino
+        path_to_xml = [os.path.join(exported, file) for file in os.listdir(exported) if file.endswith(".xml")][0]
+        runtime.ov_compiled_model = openvino.Core().compile_model(path_to_xml, "CPU", {"INFERENCE_NUM_THREADS": threads})
+
+
+def read_lock(path_to_lock):
+    # the holder of a lock (pid, host and time it was taken), the time of the file if it has no holder yet
+    try:
+        with open(path_to_lock, "r") as f:
+            return json.load(f)
+    except ValueError:
+        return {"pid": None, "host": None, "time": os.path.getmtime(path_to_lock)}
+
+
+def is_stale(holder):
+    """
+    Returns True if the job that holds a lock is not running anymore or the lock is older than EXPORT_LOCK_MAX_AGE.
+    """
+    if time.time() - holder["time"] > EXPORT_LOCK_MAX_AGE:
+        return True
+    if holder["pid"] is None or holder["host"] != socket.gethostname() or os.name == "nt":
+        # a job on another machine (shared models folder) can not be checked, and os.kill stops the process on windows
+        return False
+    try:
+        os.kill(holder["pid"], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def break_lock(path_to_lock, holder):
+    # the lock is moved away before it is removed, a lock that another job took in the meantime is given back
+    path_to_stale = path_to_lock + ".%d.stale" % os.getpid()
+    try:
+        os.rename(path_to_lock, path_to_stale)
+    except FileNotFoundError:
+        return
+    if read_lock(path_to_stale) != holder:
+        os.rename(path_to_stale, path_to_lock)
+    else:
+        os.remove(path_to_stale)
+
+
+@contextlib.contextmanager
+def export_lock(weights):
+    """
+    Holds the lock file "<weights>.export.lock" while the model is exported or an existing export is looked up.
+    Parallel jobs (batch_process_dir.py) on the same weights wait until the first job finished the export, instead
+    of exporting to the same path at once. The lock file is created exclusively, which works on every platform, and
+    holds the pid, host and time of the job. The lock of a job that was killed during the export is broken.
+    """
+    path_to_lock = weights + ".export.lock"
+    while True:
+        try:
+            fd = os.open(path_to_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                holder = read_lock(path_to_lock)
+            except FileNotFoundError:
+                # released in the meantime
+                continue
+            if is_stale(holder):
+                print(f"Breaking the stale export lock {path_to_lock} of pid {holder['pid']}.")
+                break_lock(path_to_lock, holder)
+            else:
+                time.sleep(EXPORT_LOCK_POLL_INTERVAL)
+            continue
+        with os.fdopen(fd, "w") as f:
+            json.dump({"pid": os.getpid(), "host": socket.gethostname(), "time": time.time()}, f)
+        break
+    try:
+        yield
+    finally:
+        os.remove(path_to_lock)
+
+
+def export_to(weights, exported, **export_args):
+    """
+    This function is used to export the weights to the path exported at once. Ultralytics writes the export next to
+    the weights, so a copy of the weights in a temporary folder is exported and the export is moved to its path when
+    it is complete. A job that is killed during the export leaves no partial model that later jobs would load.
+    """
+    from ultralytics import YOLO
+
+    directory = tempfile.mkdtemp(prefix=".export.", dir=os.path.dirname(weights) or ".")
+    try:
+        weights_copy = os.path.join(directory, os.path.basename(weights))
+        try:
+            os.link(weights, weights_copy)
+        except OSError:
+            shutil.copy2(weights, weights_copy)
+        os.replace(str(YOLO(weights_copy).export(**export_args)).rstrip("/\\"), exported)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return exported
+
+
+def export_model(weights, backend, int8=False):
+    """
+    Exports the .pt weights to ONNX or OpenVINO next to the weights and returns the path of the exported model.
+    An existing export is reused, so the export only runs the first time.
+    """
+    if backend not in ["onnx", "openvino"]:
+        raise ValueError(f"Can not export to backend {backend}, choose one of 'onnx' or 'openvino'.")
+    root, _ = os.path.splitext(weights)
+    with export_lock(weights):
+        if backend == "onnx":
+            exported = root + ".onnx"
+            if not os.path.exists(exported):
+                export_to(weights, exported, format="onnx", dynamic=True, simplify=True)
+            if not int8:
+                return exported
+            # ultralytics does not quantize onnx models, use onnxruntime's dynamic int8 quantization instead
+            quantized = root + "_int8.onnx"
+            if not os.path.exists(quantized):
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                try:
+                    quantize_dynamic(exported, root + "_int8.tmp.onnx", weight_type=QuantType.QUInt8)
+                    os.replace(root + "_int8.tmp.onnx", quantized)
+                finally:
+                    if os.path.exists(root + "_int8.tmp.onnx"):
+                        os.remove(root + "_int8.tmp.onnx")
+            return quantized
+
+        exported = root + ("_int8" if int8 else "") + "_openvino_model"
+        if not os.path.exists(exported):
+            export_to(weights, exported, format="openvino", dynamic=True, int8=int8)
+        return exported
+
+
+def resolve_backend(backend):
+    """
+    Returns the backend the models run on, "auto" is resolved to cuda if a gpu is available and to the cpu backend
+    otherwise.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, choose one of {BACKENDS}.")
+    if backend == "auto":
+        return "cuda" if cuda_available() else CPU_BACKEND
+    return backend
+
+
+def load_yolo(weights, backend="auto", int8=False, threads=None):
+    """
+    Returns a YOLO model for the given weights on the requested backend. With "auto" the model runs on the gpu if
+    cuda is available and otherwise as an exported (optionally int8-quantized) model on the cpu.
+    """
+    from ultralytics import YOLO
+
+    backend = resolve_backend(backend)
+    if threads is not None:
+        set_threads(threads)
+
+    if backend in ["cuda", "torch"]:
+        model = YOLO(weights)
+        # run the model on the gpu
+        model.to("cuda" if backend == "cuda" else "cpu")
+        return model
+
+    exported = export_model(weights, backend, int8)
+    model = YOLO(exported, task=guess_task(weights))
+    if threads is not None:
+        set_runtime_threads(model, exported, backend, threads)
+    return model
@@ -1,27 +1,92 @@
+import os
 import sys
 import argparse
 import subprocess
 
-from ultralytics import YOLO
+from modules import inference_backend
+from structures import detections_structure
 
+BATCH_SIZE = 16     # number of frames per inference call when fed by a FrameSource
+WEIGHTS = './models/yolov8l.pt'
 
-def detect_objects(src, show_bool=False, save_bool=True, save_txt_bool=True, save_conf_bool=False):
+
+def detect_objects(src, show_bool=False, save_bool=True, save_txt_bool=True, save_conf_bool=False, sink_path=None,
+                   backend="auto", int8=False, threads=None, batch_size=1, runs_dir="runs", on_result=None):
 
     # configure the model
-    #model = YOLO('./models/yolov8n.pt')
-    model = YOLO('./models/yolov8l.pt')
+    #model = load_yolo('./models/yolov8n.pt', ...)
+    model = inference_backend.load_yolo(WEIGHTS, backend=backend, int8=int8, threads=threads)
+
+    # execute the prediciton on the video, the results are streamed so only the current frame is kept in memory
+    # the results are always stored in <runs_dir>/detect/predict, so parallel runs can use separate runs folders
+    results = model(source=src, stream=True, batch=batch_size, project=os.path.join(runs_dir, "detect"), name="predict", exist_ok=True, show=show_bool, save=save_bool, save_txt=save_txt_bool, save_conf=save_conf_bool)
+
+    # consume the results and optionally store the detections of the whole video in one columnar file
+    return detections_structure.stream_to_sink(results, sink_path, on_result=on_result)
+
+
+class ObjectDetectionStage:
+    """
+    Runs the object detection on frames decoded by a FrameSource (see utils/frame_source.py) and writes the same label
+    files as detect_objects ("<video_name>_<frame>.txt" with 1-based frame numbers) so the analysis modules can stay unchanged.
+    on_result is called with the frame number and the detected class indices of every frame, e.g. by the streaming analysis.
+    """
+
+    def __init__(self, labels_dir=os.path.join("runs", "detect", "predict", "labels"), save_conf_bool=False, batch_size=BATCH_SIZE, sink_path=None,
+                 backend="auto", int8=False, threads=None, on_result=None):
+        self.labels_dir = labels_dir
+        self.backend = backend
+        self.int8 = int8
+        self.threads = threads
+        self.save_conf_bool = save_conf_bool
+        self.batch_size = batch_size
+        self.sink_path = sink_path
+        self.on_result = on_result
+        self.sink = detections_structure.DetectionSink()
+        self.batch = []
+
+    def start(self, source):
+        self.video_name = source.video_name
+        os.makedirs(self.labels_dir, exist_ok=True)
+
+        # configure the model on the gpu or the cpu backend
+        self.model = inference_backend.load_yolo(WEIGHTS, backend=self.backend, int8=self.int8, threads=self.threads)
+
+    def process(self, frame_index, frame):
+        self.batch.append((frame_index, frame))
+        if len(self.batch) >= self.batch_size:
+            self._predict_batch()
 
-    # run the model on the gpu
-    model.to('cuda')
+    def close(self):
+        if self.batch:
+            self._predict_batch()
+        if self.sink_path is not None:
+            self.sink.save(self.sink_path)
 
-    # execute the prediciton on the video
-    results = model(source=src, show=show_bool, save=save_bool, save_txt=save_txt_bool, save_conf=save_conf_bool)
+    def _predict_batch(self):
+        indices = [frame_index for frame_index, _ in self.batch]
+        results = self.model([frame for _, frame in self.batch], verbose=False)
+        for frame_index, result in zip(indices, results):
+            self.sink.add(frame_index + 1, result)
+            boxes = result.boxes
+            if self.on_result is not None:
+                self.on_result(frame_index + 1, boxes.cls.cpu().numpy().astype(int))
+            lines = []
+            for cls, xywhn, conf in zip(boxes.cls.tolist(), boxes.xywhn.tolist(), boxes.conf.tolist()):
+                line = (cls, *xywhn, conf) if self.save_conf_bool else (cls, *xywhn)
+                lines.append(("%g " * len(line)).rstrip() % line)
+            # same as ultralytics, frames without detections get no label file
+            if lines:
+                with open(os.path.join(self.labels_dir, f"{self.video_name}_{frame_index + 1}.txt"), "w") as f:
+                    f.write("\n".join(lines) + "\n")
+        self.batch = []
 
 
 def main(args):
     # run the pose estimation
     if args.video_in:
-        detect_objects(args.video_in, show_bool=args.show, save_bool=args.save, save_txt_bool=args.save_text, save_conf_bool=args.save_conf)
+        detect_objects(args.video_in, show_bool=args.show, save_bool=args.save, save_txt_bool=args.save_text, save_conf_bool=args.save_conf, sink_path=args.sink,
+                       backend=args.backend, int8=args.int8, threads=args.threads, batch_size=args.batch)
     
 
 
@@ -37,6 +102,11 @@ if __name__ == "__main__":
     parser.add_argument("--save", action="store_true", help="save the output video")
     parser.add_argument("--save_text", action="store_true", help="save the output of the pose estimation in a text file")
     parser.add_argument("--save_conf", action="store_true", help="save the confidence of the pose estimation in the results object for further processing")
+    parser.add_argument("--backend", type=str, default="auto", choices=inference_backend.BACKENDS, help="inference backend, auto uses cuda if available and onnx otherwise")
+    parser.add_argument("--int8", action="store_true", help="use an int8-quantized model on the onnx and openvino backends")
+    parser.add_argument("--threads", type=int, default=None, help="number of cpu threads used for inference")
+    parser.add_argument("--batch", type=int, default=1, help="number of frames per inference call")
+    parser.add_argument("--sink", type=str, default=None, help="path to a .npz file to store the boxes, classes, confidences (and keypoints) of all frames")
 
     # catch no arguments
     if len(sys.argv)==1:
@@ -1,61 +1,269 @@
 import os
 import sys
+import json
 import cv2
-import subprocess
+
+from PIL import Image
 
 SAMPLE_RATE = 1     # how many frames per second to sample
 
+RELTR_PATH = "./RelTR"                                      # path to the RelTR repository
+RELTR_CHECKPOINT = "./RelTR/ckpt/checkpoint0149.pth"        # path to the RelTR checkpoint
+BATCH_SIZE = 8      # number of frames per forward pass of RelTR
+TOPK = 30           # max number of triplets per frame
+THRESHOLD = 0.3     # min confidence of the relation, subject and object of a triplet
+
+# visual genome classes and predicates of the RelTR model
+CLASSES = ['N/A', 'airplane', 'animal', 'arm', 'bag', 'banana', 'basket', 'beach', 'bear', 'bed', 'bench', 'bike',
+           'bird', 'board', 'boat', 'book', 'boot', 'bottle', 'bowl', 'box', 'boy', 'branch', 'building',
+           'bus', 'cabinet', 'cap', 'car', 'cat', 'chair', 'child', 'clock', 'coat', 'counter', 'cow', 'cup',
+           'curtain', 'desk', 'dog', 'door', 'drawer', 'ear', 'elephant', 'engine', 'eye', 'face', 'fence',
+           'finger', 'flag', 'flower', 'food', 'fork', 'fruit', 'giraffe', 'girl', 'glass', 'glove', 'guy',
+           'hair', 'hand', 'handle', 'hat', 'head', 'helmet', 'hill', 'horse', 'house', 'jacket', 'jean',
+           'kid', 'kite', 'lady', 'lamp', 'laptop', 'leaf', 'leg', 'letter', 'light', 'logo', 'man', 'men',
+           'motorcycle', 'mountain', 'mouth', 'neck', 'nose', 'number', 'orange', 'pant', 'paper', 'paw',
+           'people', 'person', 'phone', 'pillow', 'pizza', 'plane', 'plant', 'plate', 'player', 'pole', 'post',
+           'pot', 'racket', 'railing', 'rock', 'roof', 'room', 'screen', 'seat', 'sheep', 'shelf', 'shirt',
+           'shoe', 'short', 'sidewalk', 'sign', 'sink', 'skateboard', 'ski', 'skier', 'sneaker', 'snow',
+           'sock', 'stand', 'street', 'surfboard', 'table', 'tail', 'tie', 'tile', 'tire', 'toilet', 'towel',
+           'tower', 'track', 'train', 'tree', 'truck', 'trunk', 'umbrella', 'vase', 'vegetable', 'vehicle',
+           'wave', 'wheel', 'window', 'windshield', 'wing', 'wire', 'woman', 'zebra']
+
+REL_CLASSES = ['__background__', 'above', 'across', 'against', 'along', 'and', 'at', 'attached to', 'behind',
+               'belonging to', 'between', 'carrying', 'covered in', 'covering', 'eating', 'flying in', 'for',
+               'from', 'growing on', 'hanging from', 'has', 'holding', 'in', 'in front of', 'laying on',
+               'looking at', 'lying on', 'made of', 'mounted on', 'near', 'of', 'on', 'on back of', 'over',
+               'painted on', 'parked on', 'part of', 'playing', 'riding', 'says', 'sitting on', 'standing on',
+               'to', 'under', 'using', 'walking in', 'walking on', 'watching', 'wearing', 'wears', 'with']
+
+
+def extract_object_interactions(video_path, sample_rate=SAMPLE_RATE, spill_to_disk=False, runs_dir="runs", temp_dir="temp", on_triplets=None):
 
-def extract_object_interactions(video_path, sample_rate=SAMPLE_RATE):
+    video_name = os.path.basename(video_path).split(".")[0]
 
-    # temp folder for the frames
-    tmp_folder = os.path.join("temp", "RelTR_tmp_img_" + os.path.basename(video_path).split(".")[0])
+    # optionally spill the sampled frames to the temp folder and run RelTR on the images afterwards
+    if spill_to_disk:
+        save_dir = os.path.join(temp_dir, "RelTR_tmp_img_" + video_name)
+        if not os.path.exists(save_dir):
+            os.mkdir(save_dir)
+        for frame_index, frame in sample_frames(video_path, sample_rate):
+            # save the frames with the correct indices
+            cv2.imwrite(os.path.join(save_dir, video_name + "_%d.jpg"%(frame_index)), frame)
+        # now run the RelTR model on the frames and output to runs folder
+        run_reltr(save_dir, runs_dir=runs_dir, on_triplets=on_triplets)
+        return
+
+    # pass the decoded frames straight to RelTR in mini-batches
+    out_path = os.path.join(runs_dir, "RelTR")
+    if not os.path.exists(out_path):
+        os.makedirs(out_path)
+    runner = RelTRRunner()
+    batch = []
+    for frame_index, frame in sample_frames(video_path, sample_rate):
+        batch.append((frame_index, frame))
+        if len(batch) >= runner.batch_size:
+            predict_and_export(runner, batch, video_name, out_path, on_triplets)
+            batch = []
+    if batch:
+        predict_and_export(runner, batch, video_name, out_path, on_triplets)
 
-    if not os.path.exists(tmp_folder):
-        os.mkdir(tmp_folder)
-    
-    save_dir = tmp_folder
 
-    
+def sample_frames(video_path, sample_rate=SAMPLE_RATE):
+    """
+    Yields the (frame_index, frame) pairs of the sampled frames in order. Skipped frames are only grabbed, not decoded.
+    """
     cap = cv2.VideoCapture(video_path)
     fps = cap.get(cv2.CAP_PROP_FPS)
 
     frame_count = 0
-    sample_frame = 1 if int(fps / SAMPLE_RATE) < 1 else int(fps / SAMPLE_RATE)
-    
+    sample_frame = 1 if int(fps / sample_rate) < 1 else int(fps / sample_rate)
 
     while True:
-        is_read, frame = cap.read()
-        if not is_read:
-            # no further frames to read
-            break
         if frame_count % sample_frame == 0:
-            # save the frames with the correct indices 
-            cv2.imwrite(os.path.join(save_dir, os.path.basename(video_path).split(".")[0] + "_%d.jpg"%(frame_count)), frame)
+            is_read, frame = cap.read()
+            if not is_read:
+                # no further frames to read
+                break
+            yield frame_count, frame
+        elif not cap.grab():
+            break
         frame_count += 1
 
-    # release input and output video objects
+    # release input video object
     cap.release()
 
-    # now run the RelTR model on the frames and output to runs folder
-    out_path = os.path.join("runs", "RelTR")
+
+def predict_and_export(runner, batch, video_name, out_path, on_triplets=None):
+    # on_triplets is called with the frame index and the triplets of every frame, e.g. by the streaming analysis
+    for (frame_index, _), triplets in zip(batch, runner.predict([frame for _, frame in batch])):
+        export_triplets(triplets, os.path.join(out_path, video_name + "_%d.json"%(frame_index)))
+        if on_triplets is not None:
+            on_triplets(frame_index, triplets)
+
+
+def run_reltr(save_dir, batch_size=BATCH_SIZE, runs_dir="runs", on_triplets=None):
+    out_path = os.path.join(runs_dir, "RelTR")
     if not os.path.exists(out_path):
-        os.mkdir(out_path)
-
-    images = os.listdir(save_dir)
-
-    for image in images:
-        frame = image.split("_")[-1].split(".")[0]
-        print(image)
-        print(frame)
-        subprocess.check_output([f'python',
-                             f"./RelTR/mkgraph.py",
-                             "--img_path", os.path.join(save_dir, image),
-                             "--device", "cuda",
-                             "--resume", "./RelTR/ckpt/checkpoint0149.pth",
-                             "--export_path", os.path.join(out_path, f"{image.split('.')[0]}.json"),
-                             "--topk", "30"])
+        os.makedirs(out_path)
+
+    # sort the images by their frame index, os.listdir returns them in arbitrary order
+    images = sorted(os.listdir(save_dir), key=lambda x: int(x.split(".")[0].split("_")[-1]))
+
+    # load the model once and run the frames through it in mini-batches
+    runner = RelTRRunner(batch_size=batch_size)
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        frames = [cv2.imread(os.path.join(save_dir, image)) for image in batch]
+        for image, triplets in zip(batch, runner.predict(frames)):
+            export_triplets(triplets, os.path.join(out_path, f"{image.split('.')[0]}.json"))
+            if on_triplets is not None:
+                on_triplets(int(image.split(".")[0].split("_")[-1]), triplets)
+
+
+def export_triplets(triplets, path_to_file):
+    # same triplet format as RelTR/mkgraph.py, read by analysis/extract_interactions.py
+    with open(path_to_file, "w") as f:
+        json.dump(triplets, f)
+
+
+class RelTRRunner:
+    """
+    Keeps the RelTR model and its checkpoint loaded for the lifetime of the process and predicts the
+    <subject, predicate, object> triplets for mini-batches of frames.
+    """
+
+    def __init__(self, checkpoint=RELTR_CHECKPOINT, device=None, batch_size=BATCH_SIZE, topk=TOPK, threshold=THRESHOLD):
+        # the RelTR repository is not a package, make its modules importable
+        if RELTR_PATH not in sys.path:
+            sys.path.insert(0, RELTR_PATH)
+        from inference import get_args_parser
+        from models import build_model
+        # torch is imported here and not on module level to keep importing this module (and alva.py) cheap
+        import torch
+        import torchvision.transforms as T
+
+        self.device = device if device is not None else ("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_size = batch_size
+        self.topk = topk
+        self.threshold = threshold
+
+        # build the model with the same arguments as RelTR/mkgraph.py and load the checkpoint once
+        args = get_args_parser().parse_args(["--device", self.device, "--resume", checkpoint])
+        self.model, _, _ = build_model(args)
+        ckpt = torch.load(checkpoint, map_location="cpu")
+        self.model.load_state_dict(ckpt["model"])
+        self.model.to(self.device)
+        self.model.eval()
+
+        self.transform = T.Compose([
+            T.Resize(800),
+            T.ToTensor(),
+            T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        ])
+
+    def predict(self, frames):
+        """
+        Returns a list of triplets for every frame. The frames are BGR images as read by OpenCV.
+        """
+        triplets = []
+        for start in range(0, len(frames), self.batch_size):
+            triplets += self._predict_batch(frames[start:start + self.batch_size])
+        return triplets
+
+    def _predict_batch(self, frames):
+        import torch
+
+        images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+        # the model pads the images of different sizes to one batch
+        with torch.no_grad():
+            outputs = self.model([self.transform(im).to(self.device) for im in images])
+
+        triplets = []
+        for i, im in enumerate(images):
+            probas = outputs["rel_logits"][i].softmax(-1)[:, :-1]
+            probas_sub = outputs["sub_logits"][i].softmax(-1)[:, :-1]
+            probas_obj = outputs["obj_logits"][i].softmax(-1)[:, :-1]
+
+            # keep only the queries where the relation, subject and object are confident enough
+            keep = torch.logical_and(probas.max(-1).values > self.threshold,
+                                     torch.logical_and(probas_sub.max(-1).values > self.threshold, probas_obj.max(-1).values > self.threshold))
+            keep_queries = torch.nonzero(keep, as_tuple=True)[0]
+            scores = probas[keep_queries].max(-1)[0] * probas_sub[keep_queries].max(-1)[0] * probas_obj[keep_queries].max(-1)[0]
+            keep_queries = keep_queries[torch.argsort(-scores)[:self.topk]]
+
+            sub_bboxes = rescale_bboxes(outputs["sub_boxes"][i, keep_queries], im.size)
+            obj_bboxes = rescale_bboxes(outputs["obj_boxes"][i, keep_queries], im.size)
+
+            frame_triplets = []
+            for query, sub_bbox, obj_bbox in zip(keep_queries.tolist(), sub_bboxes.tolist(), obj_bboxes.tolist()):
+                frame_triplets.append({
+                    "subject": {"id": CLASSES[probas_sub[query].argmax().item()], "score": probas_sub[query].max().item(), "bbox": sub_bbox},
+                    "predicate": {"id": REL_CLASSES[probas[query].argmax().item()], "score": probas[query].max().item()},
+                    "object": {"id": CLASSES[probas_obj[query].argmax().item()], "score": probas_obj[query].max().item(), "bbox": obj_bbox},
+                })
+            triplets.append(frame_triplets)
+        return triplets
+
+
+def rescale_bboxes(boxes, size):
+    import torch
+
+    # convert the boxes from normalized (center x, center y, width, height) to pixel (x min, y min, x max, y max)
+    img_w, img_h = size
+    x_c, y_c, w, h = boxes.unbind(-1)
+    boxes = torch.stack([(x_c - 0.5 * w), (y_c - 0.5 * h), (x_c + 0.5 * w), (y_c + 0.5 * h)], dim=-1)
+    return boxes.cpu() * torch.tensor([img_w, img_h, img_w, img_h], dtype=torch.float32)
+
+
+class InteractionSamplingStage:
+    """
+    Samples frames for the interaction model from a FrameSource (see utils/frame_source.py) instead of decoding the
+    video again. The sampled frames are passed to RelTR in mini-batches while the video is decoded, with spill_to_disk
+    they are stored as images like in extract_object_interactions and RelTR is run once all frames have been seen.
+    on_triplets is called with the frame index and the triplets of every sampled frame.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, spill_to_disk=False, runs_dir="runs", temp_dir="temp", on_triplets=None):
+        self.sample_rate = sample_rate
+        self.on_triplets = on_triplets
+        self.spill_to_disk = spill_to_disk
+        self.runs_dir = runs_dir
+        self.temp_dir = temp_dir
+        self.batch = []
+
+    def start(self, source):
+        self.video_name = source.video_name
+        self.sample_frame = 1 if int(source.fps / self.sample_rate) < 1 else int(source.fps / self.sample_rate)
+
+        if self.spill_to_disk:
+            # temp folder for the frames
+            self.save_dir = os.path.join(self.temp_dir, "RelTR_tmp_img_" + self.video_name)
+            if not os.path.exists(self.save_dir):
+                os.mkdir(self.save_dir)
+        else:
+            self.out_path = os.path.join(self.runs_dir, "RelTR")
+            if not os.path.exists(self.out_path):
+                os.makedirs(self.out_path)
+            self.runner = RelTRRunner()
+
+    def process(self, frame_index, frame):
+        if frame_index % self.sample_frame != 0:
+            return
+        if self.spill_to_disk:
+            # save the frames with the correct indices
+            cv2.imwrite(os.path.join(self.save_dir, self.video_name + "_%d.jpg"%(frame_index)), frame)
+            return
+        self.batch.append((frame_index, frame))
+        if len(self.batch) >= self.runner.batch_size:
+            predict_and_export(self.runner, self.batch, self.video_name, self.out_path, self.on_triplets)
+            self.batch = []
 
+    def close(self):
+        if self.spill_to_disk:
+            run_reltr(self.save_dir, runs_dir=self.runs_dir, on_triplets=self.on_triplets)
+        elif self.batch:
+            predict_and_export(self.runner, self.batch, self.video_name, self.out_path, self.on_triplets)
+            self.batch = []
 
 
 if __name__ == "__main__":
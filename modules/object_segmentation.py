@@ -2,26 +2,29 @@ import sys
 import argparse
 import subprocess
 
-from ultralytics import YOLO
+from modules import inference_backend
+from structures import detections_structure
 
 
-def segment_objects(src, show_bool=False, save_bool=True, save_txt_bool=True, save_conf_bool=False):
+def segment_objects(src, show_bool=False, save_bool=True, save_txt_bool=True, save_conf_bool=False, sink_path=None,
+                    backend="auto", int8=False, threads=None, batch_size=1):
 
     # configure the model
-    #model = YOLO('./models/yolov8n-seg.pt')
-    model = YOLO('./models/yolov8l-seg.pt')
+    #model = load_yolo('./models/yolov8n-seg.pt', ...)
+    model = inference_backend.load_yolo('./models/yolov8l-seg.pt', backend=backend, int8=int8, threads=threads)
 
-    # run the model on the gpu
-    model.to('cuda')
+    # execute the prediciton on the video, the results are streamed so only the current frame is kept in memory
+    results = model(source=src, stream=True, batch=batch_size, show=show_bool, save=save_bool, save_txt=save_txt_bool, save_conf=save_conf_bool)
 
-    # execute the prediciton on the video
-    results = model(source=src, show=show_bool, save=save_bool, save_txt=save_txt_bool, save_conf=save_conf_bool)
+    # consume the results and optionally store the detections of the whole video in one columnar file
+    return detections_structure.stream_to_sink(results, sink_path)
 
 
 def main(args):
     # run the pose estimation
     if args.video_in:
-        segment_objects(args.video_in, show_bool=args.show, save_bool=args.save, save_txt_bool=args.save_text, save_conf_bool=args.save_conf)
+        segment_objects(args.video_in, show_bool=args.show, save_bool=args.save, save_txt_bool=args.save_text, save_conf_bool=args.save_conf, sink_path=args.sink,
+                        backend=args.backend, int8=args.int8, threads=args.threads, batch_size=args.batch)
     
 
 
@@ -37,6 +40,11 @@ if __name__ == "__main__":
     parser.add_argument("--save", action="store_true", help="save the output video")
     parser.add_argument("--save_text", action="store_true", help="save the output of the pose estimation in a text file")
     parser.add_argument("--save_conf", action="store_true", help="save the confidence of the pose estimation in the results object for further processing")
+    parser.add_argument("--backend", type=str, default="auto", choices=inference_backend.BACKENDS, help="inference backend, auto uses cuda if available and onnx otherwise")
+    parser.add_argument("--int8", action="store_true", help="use an int8-quantized model on the onnx and openvino backends")
+    parser.add_argument("--threads", type=int, default=None, help="number of cpu threads used for inference")
+    parser.add_argument("--batch", type=int, default=1, help="number of frames per inference call")
+    parser.add_argument("--sink", type=str, default=None, help="path to a .npz file to store the boxes, classes, confidences (and keypoints) of all frames")
 
     # catch no arguments
     if len(sys.argv)==1:
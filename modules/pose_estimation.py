@@ -3,7 +3,8 @@ import os
 import argparse
 import subprocess
 
-from ultralytics import YOLO
+from modules import inference_backend
+from structures import detections_structure
 
 from dotenv import load_dotenv
 
@@ -12,32 +13,33 @@ load_dotenv()
 env = os.environ
 
 
-def extract_pose(src, show_bool=False, save_bool=True, save_txt_bool=True, save_conf_bool=False):
+def extract_pose(src, show_bool=False, save_bool=True, save_txt_bool=True, save_conf_bool=False, sink_path=None,
+                 backend="auto", int8=False, threads=None, batch_size=1):
 
     # configure the model
-    #model = YOLO('./models/yolov8n-pose.pt')
-    model = YOLO('./models/yolov8x-pose.pt')
-    #model = YOLO('./models/yolov8x-pose-p6.pt')
+    #model = load_yolo('./models/yolov8n-pose.pt', ...)
+    model = inference_backend.load_yolo('./models/yolov8x-pose.pt', backend=backend, int8=int8, threads=threads)
+    #model = load_yolo('./models/yolov8x-pose-p6.pt', ...)
 
-    # run the model on the gpu
-    model.to('cuda')
+    # execute the prediciton on the video, the results are streamed so only the current frame is kept in memory
+    results = model(source=src, stream=True, batch=batch_size, show=show_bool, save=save_bool, save_txt=save_txt_bool, save_conf=save_conf_bool)
 
-    # execute the prediciton on the video
-    results = model(source=src, show=show_bool, save=save_bool, save_txt=save_txt_bool, save_conf=save_conf_bool)
+    # consume the results and optionally store the detections of the whole video in one columnar file
+    return detections_structure.stream_to_sink(results, sink_path)
 
-def extract_pose_openpose(src):
+def extract_pose_openpose(src, out_dir=os.path.join("runs", "openpose")):
     try:
         print(
             [env["PATH_TO_OPENPOSE"] + "bin\OpenPoseDemo.exe", 
                         "--video", src, 
-                        "--write_json", "./runs/openpose/", 
+                        "--write_json", out_dir, 
                         "--write_video", os.path.splitext(src)[0] + "_openpose.avi",
                         "--display", "0", ]
         )
         # execute the prediciton on the video
         subprocess.run([env["PATH_TO_OPENPOSE"] + "bin\OpenPoseDemo.exe", 
                         "--video", src, 
-                        "--write_json", "./runs/openpose/", 
+                        "--write_json", out_dir, 
                         "--write_video", os.path.splitext(src)[0] + "_openpose.avi",
                         "--display", "0", ])
         #subprocess.run(["./openpose/build/examples/openpose/openpose.bin", "--video", src, "--write_json", "./runs/openpose/", "--display", "0", "--render_pose", "0", "--number_people_max", "1"])
@@ -51,7 +53,8 @@ def extract_pose_openpose(src):
 def main(args):
     # run the pose estimation
     if args.video_in:
-        extract_pose(args.video_in, show_bool=args.show, save_bool=args.save, save_txt_bool=args.save_text, save_conf_bool=args.save_conf)
+        extract_pose(args.video_in, show_bool=args.show, save_bool=args.save, save_txt_bool=args.save_text, save_conf_bool=args.save_conf, sink_path=args.sink,
+                     backend=args.backend, int8=args.int8, threads=args.threads, batch_size=args.batch)
     
 
 
@@ -67,6 +70,11 @@ if __name__ == "__main__":
     parser.add_argument("--save", action="store_true", help="save the output video")
     parser.add_argument("--save_text", action="store_true", help="save the output of the pose estimation in a text file")
     parser.add_argument("--save_conf", action="store_true", help="save the confidence of the pose estimation in the results object for further processing")
+    parser.add_argument("--backend", type=str, default="auto", choices=inference_backend.BACKENDS, help="inference backend, auto uses cuda if available and onnx otherwise")
+    parser.add_argument("--int8", action="store_true", help="use an int8-quantized model on the onnx and openvino backends")
+    parser.add_argument("--threads", type=int, default=None, help="number of cpu threads used for inference")
+    parser.add_argument("--batch", type=int, default=1, help="number of frames per inference call")
+    parser.add_argument("--sink", type=str, default=None, help="path to a .npz file to store the boxes, classes, confidences (and keypoints) of all frames")
 
     # catch no arguments
     if len(sys.argv)==1:
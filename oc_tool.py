@@ -6,15 +6,17 @@ import plotly.express as px
 import plotly.graph_objects as go
 import dash_player as player
 import os
+import atexit
 import datetime
 
 from vis_tool.vis_app import app
 from vis_tool.components.video_player import video_player
-from vis_tool.components.juxtaposition_components import render_keypoints, convert_keypoints_to_skeleton
+from vis_tool.components.juxtaposition_components import render_keypoints
 from vis_tool.components.explicit_representation_components import render_tracked_keypoints
 from vis_tool.components.timeline_components import render_timeline, update_abcs_coding, DURATION_IN_SECONDS
 from structures.timeline_structure import Timeline
-from structures.keypoints_structure import load_numpy_keypoints_bbox
+from structures.coding_journal import CodingJournal
+from structures.keypoints_structure import load_keypoints_frames
 
 from vis_tool.config.settings import VIS_TOOL_ASSETS_PATH, SCREEN_HEIGHT, abcs_code_colors, hf_color
 
@@ -25,66 +27,42 @@ from vis_tool.config.settings import VIS_TOOL_ASSETS_PATH, SCREEN_HEIGHT, abcs_c
 assets_folders = [f for f in os.listdir(VIS_TOOL_ASSETS_PATH)]
 
 
-# load all dataframes and video info from all timelines in all assets
-objects = {}
-interactions = {}
-abcs = {}
+# load the video info of all timelines in all assets, the tables (frame numbers) are loaded from the sidecars of the
+# timelines when a video is first shown. The abcs codings of the last session that are not yet in the timeline file
+# are replayed from the coding journals
+timelines = {}
+journals = {}
 fps = {}
 dur = {}
 width = {}
 height = {}
 dur_sec = {}
 for folder in assets_folders:
+    path_to_timeline = os.path.join(VIS_TOOL_ASSETS_PATH, folder, "timeline", folder + "_timeline.txt")
     timeline = Timeline()
-    timeline.import_from_file(os.path.join(
-        VIS_TOOL_ASSETS_PATH, folder, "timeline", folder + "_timeline.txt"))
-    objects[folder] = timeline.get_objects()
-    interactions[folder] = timeline.get_object_interactions()
-    abcs[folder] = timeline.get_abcs_coding()
+    timeline.import_from_file(path_to_timeline)
+    timelines[folder] = timeline
+    journals[folder] = CodingJournal(timeline, path_to_timeline)
+    journals[folder].replay()
     fps[folder] = float(timeline.get_frame_rate())
     dur[folder] = float(timeline.get_duration())
     width[folder] = float(timeline.get_frame_width())
     height[folder] = float(timeline.get_frame_height())
     dur_sec[folder] = float(timeline.get_duration())
 
+# fsync the codings that were recorded since the last sync when the server stops
+atexit.register(lambda: [journal.close() for journal in journals.values()])
 
-# convert start and end times to frames
-for folder in assets_folders:
-    objects[folder]["Start_Time"] = objects[folder]["Start_Time"].apply(
-        lambda t: fps[folder] * sum(x * int(t) for x, t in zip([3600, 60, 1], t.split(":"))))
-    objects[folder]["End_Time"] = objects[folder]["End_Time"].apply(
-        lambda t: fps[folder] * sum(x * int(t) for x, t in zip([3600, 60, 1], t.split(":"))))
-
-    interactions[folder]["Event_Time"] = interactions[folder]["Event_Time"].apply(
-        lambda t: fps[folder] * sum(x * int(t) for x, t in zip([3600, 60, 1], t.split(":"))))
-
-    abcs[folder]["Start_Time"] = abcs[folder]["Start_Time"].apply(
-        lambda t: fps[folder] * sum(x * int(t) for x, t in zip([3600, 60, 1], t.split(":"))))
-    abcs[folder]["End_Time"] = abcs[folder]["End_Time"].apply(
-        lambda t: fps[folder] * sum(x * int(t) for x, t in zip([3600, 60, 1], t.split(":"))))
 
-
-# load all the keypoints and bounding boxes from all assets
+# open the frame-major keypoints of all assets as read-only memory maps, the frames are only read when they are shown
+# and the skeleton is built per frame while rendering
 child = {}
 therapist = {}
-skeletal_child = {}
-skeletal_therapist = {}
 for folder in assets_folders:
-    child_tmp, _ = load_numpy_keypoints_bbox(os.path.join(
+    child[folder] = load_keypoints_frames(os.path.join(
         VIS_TOOL_ASSETS_PATH, folder, "juxtaposition"), "child")
-    child_tmp[child_tmp == 0] = np.nan
-    child_tmp[:, 1, :] = -child_tmp[:, 1, :]
-    child[folder] = child_tmp
-
-    therapist_tmp, _ = load_numpy_keypoints_bbox(os.path.join(
+    therapist[folder] = load_keypoints_frames(os.path.join(
         VIS_TOOL_ASSETS_PATH, folder, "juxtaposition"), "therapist")
-    therapist_tmp[therapist_tmp == 0] = np.nan
-    therapist_tmp[:, 1, :] = -therapist_tmp[:, 1, :]
-    therapist[folder] = therapist_tmp
-
-for child_key, therapist_key in zip(child.keys(), therapist.keys()):
-    skeletal_child[child_key] = convert_keypoints_to_skeleton(child[child_key])
-    skeletal_therapist[therapist_key] = convert_keypoints_to_skeleton(therapist[therapist_key])
 
 # because dash is a stateless framework, we need to account for all possible states of the app
 # it is possible that the video-dorpdown value prop is None, dealing with this in the callbacks is costly.
@@ -481,7 +459,7 @@ def update_vis_view_isolated(current_time, val_list, value_folder, fig, hidden):
         return no_update
     #print(fig['data'])
     current_time = 0 if current_time is None else current_time
-    return render_keypoints(skeletal_child[value_folder], 
+    return render_keypoints(child[value_folder], 
                             "right hand" in val_list, 
                             "left hand" in val_list, 
                             "right foot" in val_list, 
@@ -502,7 +480,7 @@ def update_vis_view_isolated(current_time, val_list, value_folder, hidden):
     if hidden:
         return no_update
     current_time = 0 if current_time is None else current_time
-    return render_keypoints(skeletal_therapist[value_folder], 
+    return render_keypoints(therapist[value_folder], 
                             "right hand" in val_list, 
                             "left hand" in val_list, 
                             "right foot" in val_list, 
@@ -543,7 +521,8 @@ def update_vis_view_isolated(current_time, val_list, value_folder, hidden):
 def update_timeline(current_time, value_folder):
     if current_time is None or value_folder is None:
         return no_update
-    return render_timeline(objects[value_folder], interactions[value_folder], abcs[value_folder], dur_sec[value_folder], fps[value_folder], int(current_time * fps[value_folder]))
+    timeline = timelines[value_folder]
+    return render_timeline(timeline.get_objects(), timeline.get_object_interactions(), timeline.get_abcs_coding(), dur_sec[value_folder], fps[value_folder], int(current_time * fps[value_folder]))
 """
 
 @app.callback(
@@ -647,20 +626,21 @@ def update_coding(_ew, _un, _ot, _rb, _fp, value_folder, current_time, fig):
     ctx = callback_context
     button_id = ctx.triggered[0]["prop_id"].split(".")[0]
     if button_id == "ew-button":
-        update_abcs_coding(abcs[value_folder], int(current_time * fps[value_folder]) - 1, "EW")
+        update_abcs_coding(timelines[value_folder], int(current_time * fps[value_folder]) - 1, "EW", journals[value_folder])
     elif button_id == "un-button":
-        update_abcs_coding(abcs[value_folder], int(current_time * fps[value_folder]) - 1, "UN")
+        update_abcs_coding(timelines[value_folder], int(current_time * fps[value_folder]) - 1, "UN", journals[value_folder])
     elif button_id == "ot-button":
-        update_abcs_coding(abcs[value_folder], int(current_time * fps[value_folder]) - 1, "OT")
+        update_abcs_coding(timelines[value_folder], int(current_time * fps[value_folder]) - 1, "OT", journals[value_folder])
     elif button_id == "rb-button":
-        update_abcs_coding(abcs[value_folder], int(current_time * fps[value_folder]) - 1, "RB")
+        update_abcs_coding(timelines[value_folder], int(current_time * fps[value_folder]) - 1, "RB", journals[value_folder])
     elif button_id == "fp-button":
-        update_abcs_coding(abcs[value_folder], int(current_time * fps[value_folder]) - 1, "FP")
+        update_abcs_coding(timelines[value_folder], int(current_time * fps[value_folder]) - 1, "FP", journals[value_folder])
     elif button_id == "video-dropdown":
         pass
     else:
         return no_update
-    return render_timeline(objects[value_folder], interactions[value_folder], abcs[value_folder], dur_sec[value_folder], fps[value_folder], (current_time) * fps[value_folder])
+    timeline = timelines[value_folder]
+    return render_timeline(timeline.get_objects(), timeline.get_object_interactions(), timeline.get_abcs_coding(), dur_sec[value_folder], fps[value_folder], (current_time) * fps[value_folder])
 
 
 @app.callback(
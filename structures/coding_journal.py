@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import threading
+
+from structures import timeline_structure
+
+JOURNAL_VERSION = 1
+JOURNAL_EXTENSION = ".journal.jsonl"        # "<name>_timeline.journal.jsonl" next to "<name>_timeline.txt"
+SYNC_EDITS = 16         # edits between two fsyncs of the journal
+SYNC_INTERVAL = 2.0     # max seconds between two fsyncs while edits are recorded
+COMPACT_EDITS = 256     # edits after which the journal is compacted into the timeline file
+COMPACT_IDLE = 30.0     # seconds without edits after which the journal is compacted into the timeline file
+
+
+def journal_path(path_to_timeline):
+    """
+    Returns the path of the coding journal of a timeline file.
+    """
+    return os.path.splitext(path_to_timeline)[0] + JOURNAL_EXTENSION
+
+
+class CodingJournal:
+    """
+    This class is used to keep the ABCS coding edits of a video on disk without rewriting the timeline file on every
+    edit. Every edit is appended as one json line to the journal next to the timeline file and flushed to the OS, so
+    it survives a restart of the server. The journal is fsynced every sync_edits edits or sync_interval seconds and
+    compacted into the timeline file every compact_edits edits or after compact_idle seconds without edits. A background
+    thread does the fsync and the compaction when no further edit is recorded. The first line of the journal holds the hash of the
+    timeline file it belongs to, a journal that was already compacted into the timeline file is not replayed again.
+    """
+
+    def __init__(self, timeline, path_to_timeline, sync_edits=SYNC_EDITS, sync_interval=SYNC_INTERVAL, compact_edits=COMPACT_EDITS,
+                 compact_idle=COMPACT_IDLE):
+        self.timeline = timeline
+        self.path_to_timeline = path_to_timeline
+        self.path_to_journal = journal_path(path_to_timeline)
+        self.sync_edits = sync_edits
+        self.sync_interval = sync_interval
+        self.compact_edits = compact_edits
+        self.compact_idle = compact_idle
+
+        self.file = None            # opened with the first edit
+        self.edits = 0              # edits in the journal
+        self.unsynced = 0           # edits written since the last fsync
+        self.last_sync = time.monotonic()
+        self.last_edit = time.monotonic()
+        # reentrant, so update_abcs_coding can hold it while the edit is added to the timeline and recorded
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.thread = None          # background sync and compaction, started with the first edit
+
+    def replay(self):
+        """
+        This function is used to apply the edits of the journal to the timeline, e.g. after the server was restarted.
+        A partially written last line (crash while writing) is ignored. Returns the number of replayed edits.
+        """
+        if not os.path.exists(self.path_to_journal):
+            return 0
+        with self.lock:
+            with open(self.path_to_journal, "r") as f:
+                lines = f.read().split("\n")
+            try:
+                header = json.loads(lines[0]) if len(lines) > 1 else {}
+            except ValueError:
+                header = {}
+            if header.get("version") != JOURNAL_VERSION or header.get("timeline_hash") != self._timeline_hash():
+                # the edits are already part of the timeline file (crash during the compaction) or unreadable
+                os.remove(self.path_to_journal)
+                return 0
+
+            # every complete edit ends with a newline, the last part is empty or a partially written edit
+            edits = []
+            for line in lines[1:-1]:
+                try:
+                    edits.append(json.loads(line))
+                except ValueError:
+                    break
+            self.timeline.add_abcs_codings([(edit["start"], edit["end"], edit["variable"], edit["comment"]) for edit in edits])
+            self.edits = len(edits)
+
+            # drop everything after the last complete edit, the next edit starts on a new line
+            self.file = open(self.path_to_journal, "a")
+            self.file.truncate(len("\n".join(lines[:len(edits) + 1]) + "\n"))
+            self.last_edit = time.monotonic()
+            self._start_thread()
+            return len(edits)
+
+    def record(self, start_frame, end_frame, abcs_variable, abcs_comment=""):
+        """
+        This function is used to append an ABCS coding that was added to the timeline to the journal.
+        """
+        with self.lock:
+            if self.file is None:
+                self._start()
+            self.file.write(json.dumps({"start": int(start_frame), "end": int(end_frame), "variable": str(abcs_variable),
+                                        "comment": str(abcs_comment or "")}) + "\n")
+            self.file.flush()
+            self.edits += 1
+            self.unsynced += 1
+            self.last_edit = time.monotonic()
+            if self.unsynced >= self.sync_edits or time.monotonic() - self.last_sync >= self.sync_interval:
+                self._sync()
+            if self.edits >= self.compact_edits:
+                self._compact()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def compact(self):
+        """
+        This function is used to write the timeline with all edits to the timeline file and to start a new journal.
+        """
+        with self.lock:
+            self._compact()
+
+    def close(self):
+        # stop the background thread first, it takes the lock
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+                self.file.close()
+                self.file = None
+
+    def _timeline_hash(self):
+        return timeline_structure.file_hash(self.path_to_timeline) if os.path.exists(self.path_to_timeline) else None
+
+    def _start(self):
+        # start an empty journal for the current timeline file
+        if self.file is not None:
+            self.file.close()
+        with timeline_structure.atomic_write(self.path_to_journal) as f:
+            f.write(json.dumps({"version": JOURNAL_VERSION, "timeline_hash": self._timeline_hash()}) + "\n")
+        self.file = open(self.path_to_journal, "a")
+        self.edits = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self._start_thread()
+
+    def _start_thread(self):
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        # fsync the last edits and compact the journal while the coder pauses, record only does it on the next edit
+        while not self.stopped.wait(min(self.sync_interval, self.compact_idle)):
+            with self.lock:
+                if self.file is None:
+                    continue
+                now = time.monotonic()
+                if self.unsynced and now - self.last_sync >= self.sync_interval:
+                    self._sync()
+                if self.edits and now - self.last_edit >= self.compact_idle:
+                    self._compact()
+
+    def _compact(self):
+        if self.file is None and not os.path.exists(self.path_to_journal):
+            return
+        # the export replaces the timeline file atomically, a crash while writing keeps the previous timeline
+        # file and journal
+        self.timeline.export_to_file(self.path_to_timeline)
+        self._start()
+
+    def _sync(self):
+        if self.file is not None and self.unsynced:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
@@ -0,0 +1,91 @@
+import os
+import json
+import numpy as np
+
+
+class DetectionSink:
+    """
+    This class is used to collect the results of a streamed Ultralytics prediction frame by frame into compact
+    columnar arrays. Every row is one detection, the frame column uses the same 1-based frame numbers as the
+    label files written by Ultralytics ("<video_name>_<frame>.txt").
+    """
+
+    def __init__(self, names=None, capacity=1024):
+        self.names = dict(names) if names is not None else {}
+        self.frame_count = 0
+        self.size = 0
+        self.columns = {}
+        self.capacity = capacity
+
+    def _append(self, name, values):
+        # grow the column by doubling its capacity, this keeps the appends amortized O(1)
+        if name not in self.columns:
+            self.columns[name] = np.empty((self.capacity,) + values.shape[1:], dtype=values.dtype)
+        column = self.columns[name]
+        while self.size + len(values) > len(column):
+            column = np.concatenate([column, np.empty_like(column)])
+        column[self.size:self.size + len(values)] = values
+        self.columns[name] = column
+
+    def add(self, frame, result):
+        """
+        This function is used to add the Ultralytics Results object of one frame to the sink.
+        """
+        self.frame_count = max(self.frame_count, frame)
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return
+        if not self.names:
+            self.names = dict(result.names)
+
+        n = len(boxes)
+        self._append("frames", np.full(n, frame, dtype=np.int32))
+        self._append("boxes", boxes.xyxy.cpu().numpy().astype(np.float32))
+        self._append("classes", boxes.cls.cpu().numpy().astype(np.int16))
+        self._append("confidences", boxes.conf.cpu().numpy().astype(np.float32))
+        if result.keypoints is not None:
+            self._append("keypoints", result.keypoints.data.cpu().numpy().astype(np.float32))
+        self.size += n
+
+    def save(self, path_to_file):
+        """
+        This function is used to save all detections of the video to one compressed .npz file.
+        """
+        os.makedirs(os.path.dirname(path_to_file) or ".", exist_ok=True)
+        arrays = {name: column[:self.size] for name, column in self.columns.items()}
+        np.savez_compressed(path_to_file,
+                            frame_count=np.int64(self.frame_count),
+                            names=np.array(json.dumps({str(key): value for key, value in self.names.items()})),
+                            **arrays)
+        return
+
+
+def stream_to_sink(results, path_to_file=None, first_frame=1, on_result=None):
+    """
+    This function is used to consume a streamed prediction (model(..., stream=True)) one frame at a time, so only
+    the results of the current frame are kept in memory. If path_to_file is given the detections are saved to it.
+    on_result is called with the frame number and the detected class indices of every frame.
+    """
+    sink = DetectionSink()
+    for frame, result in enumerate(results, start=first_frame):
+        sink.add(frame, result)
+        if on_result is not None and result.boxes is not None:
+            on_result(frame, result.boxes.cls.cpu().numpy().astype(int))
+    if path_to_file is not None:
+        sink.save(path_to_file)
+    return sink
+
+
+def load_detections(path_to_file):
+    """
+    Returns a dictionary with the columns of a saved DetectionSink. Columns that were never filled (e.g. keypoints
+    for object detection) are missing, "names" maps the class ids as strings to the class names.
+    """
+    with np.load(path_to_file) as data:
+        detections = {name: data[name] for name in data.files}
+    detections["frame_count"] = int(detections["frame_count"])
+    detections["names"] = json.loads(str(detections["names"]))
+    for name, dtype in [("frames", np.int32), ("boxes", np.float32), ("classes", np.int16), ("confidences", np.float32)]:
+        if name not in detections:
+            detections[name] = np.empty((0, 4) if name == "boxes" else (0,), dtype=dtype)
+    return detections
@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+import numpy as np
+
+# orjson parses the records several times faster than the json module, it is optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FORMAT_VERSION = 1
+ARCHIVE_EXTENSION = ".jsonl"
+INDEX_EXTENSION = ".idx.npy"
+POLL_INTERVAL = 1.0     # seconds between two listings of a directory that is still written
+
+
+def frame_number(file):
+    """
+    Returns the frame number of a per frame output file, e.g. "<video_name>_<frame>.txt" of YOLO, "<video_name>_<frame>.json"
+    of RelTR or "<video_name>_<frame:012d>_keypoints.json" of OpenPose.
+    """
+    stem = file.split(".")[0]
+    if stem.endswith("_keypoints"):
+        stem = stem[:-len("_keypoints")]
+    return int(stem.split("_")[-1])
+
+
+def list_frame_files(directory, extensions=(".json", ".txt")):
+    # returns the per frame files of a directory sorted by their frame number, os.listdir returns them in arbitrary order
+    return sorted((file for file in os.listdir(directory) if file.endswith(extensions)), key=frame_number)
+
+
+def index_path(path_to_archive):
+    return os.path.splitext(path_to_archive)[0] + INDEX_EXTENSION
+
+
+def is_archive(path):
+    return os.path.isfile(path) and path.endswith(ARCHIVE_EXTENSION)
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _dumps(record):
+    return orjson.dumps(record) if orjson is not None else json.dumps(record, separators=(",", ":")).encode("utf-8")
+
+
+def read_frame_file(path_to_file):
+    """
+    Returns the content of a per frame file, the parsed object for json files and the text for all other files.
+    """
+    with open(path_to_file, "rb") as f:
+        data = f.read()
+    return _loads(data) if path_to_file.endswith(".json") else data.decode("utf-8")
+
+
+def pack_directory(directory, path_to_archive, remove=False):
+    """
+    This function is used to stream the per frame files of a tool (OpenPose, YOLO labels, RelTR) into one archive with
+    one json record per line in frame order and an index with the frame number, offset and length of every record.
+    A missing directory (e.g. no detections at all) results in an empty archive. If remove is True the directory is
+    deleted after packing.
+    """
+    files = list_frame_files(directory) if os.path.isdir(directory) else []
+    index = np.zeros((len(files), 3), dtype=np.int64)     # frame, offset, length
+
+    os.makedirs(os.path.dirname(path_to_archive) or ".", exist_ok=True)
+    offset = 0
+    with open(path_to_archive + ".tmp", "wb") as archive:
+        for row, file in enumerate(files):
+            line = _dumps(read_frame_file(os.path.join(directory, file))) + b"\n"
+            archive.write(line)
+            index[row] = frame_number(file), offset, len(line)
+            offset += len(line)
+    with open(index_path(path_to_archive) + ".tmp", "wb") as f:
+        np.save(f, index)
+    os.replace(path_to_archive + ".tmp", path_to_archive)
+    os.replace(index_path(path_to_archive) + ".tmp", index_path(path_to_archive))
+
+    if remove and os.path.isdir(directory):
+        shutil.rmtree(directory)
+    return path_to_archive
+
+
+class FrameArchive:
+    """
+    Read access to an archive written by pack_directory. Iterating over the archive yields (frame, record) in frame
+    order with a single sequential read, read(frame) uses the index to read one record.
+    """
+
+    def __init__(self, path_to_archive):
+        self.path_to_archive = path_to_archive
+        index = np.load(index_path(path_to_archive))
+        self.frames = index[:, 0]
+        self.offsets = index[:, 1]
+        self.lengths = index[:, 2]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        with open(self.path_to_archive, "rb") as f:
+            for frame, line in zip(self.frames.tolist(), f):
+                yield frame, _loads(line)
+
+    def read(self, frame):
+        row = np.searchsorted(self.frames, frame)
+        if row >= len(self.frames) or self.frames[row] != frame:
+            raise KeyError(f"Frame {frame} is not in {self.path_to_archive}")
+        with open(self.path_to_archive, "rb") as f:
+            f.seek(self.offsets[row])
+            return _loads(f.read(self.lengths[row]))
+
+
+def iter_frames(source):
+    """
+    This function is used to read the per frame outputs of a tool from either an archive or a directory of per frame
+    files. Yields (frame, record) in frame order.
+    """
+    if is_archive(source):
+        yield from FrameArchive(source)
+        return
+    for file in list_frame_files(source):
+        yield frame_number(file), read_frame_file(os.path.join(source, file))
+
+
+def follow_frames(directory, finished, poll_interval=POLL_INTERVAL):
+    """
+    This function is used to read the per frame files of a tool while it is still running (e.g. OpenPose), finished
+    is a threading.Event that is set once the tool exited. Yields (frame, record) in frame order. The newest file
+    could still be written, so it is only read once a later file exists or the tool finished.
+    """
+    position = 0
+    while True:
+        # check before listing, so all files of a finished tool are in the listing
+        done = finished.is_set()
+        files = list_frame_files(directory) if os.path.isdir(directory) else []
+        ready = files if done else files[:-1]
+        for file in ready[position:]:
+            yield frame_number(file), read_frame_file(os.path.join(directory, file))
+        position = max(position, len(ready))
+        if done:
+            return
+        finished.wait(poll_interval)
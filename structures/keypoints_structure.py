@@ -1,6 +1,12 @@
 import os
+import json
+import struct
+import zipfile
 import numpy as np
 
+FORMAT_VERSION = 3
+CONFIDENCE_SCALE = 255      # the confidence in [0, 1] is quantized to uint8
+
 
 def save_numpy_keypoints_bbox(keypoints, bbox, path, name):
     # save the keypoints as numpy array
@@ -10,7 +16,74 @@ def save_numpy_keypoints_bbox(keypoints, bbox, path, name):
     np.save(os.path.join(path, name + "_bbox.npy"), bbox)
 
 
+def save_keypoints(keypoints, confidence, bbox, path, name, fps=None, skeleton="BODY_25", source="openpose"):
+    """
+    This function is used to save the keypoints (keypoints, 2, frames), their confidence (keypoints, frames) and the
+    bounding boxes (4, frames) of one person to a single container "<name>.npz". The coordinates are stored
+    frame-major as (frames, keypoints, 2) float32, missing keypoints (zero confidence) and frames without the person
+    are nan. The coordinates are not compressed, so the visualisation tool memory maps them from the container (see
+    load_keypoints_frames). The confidence is quantized to uint8 (frames, keypoints) and compressed together with the
+    presence mask and the bounding boxes.
+    """
+    confidence = np.clip(np.nan_to_num(confidence, nan=0.0), 0, 1).T
+    coords = np.ascontiguousarray(keypoints.transpose(2, 0, 1), dtype=np.float32)
+    coords[confidence == 0] = np.nan
+    meta = {"version": FORMAT_VERSION, "fps": fps, "skeleton": skeleton, "source": source}
+    members = [("coords", coords, zipfile.ZIP_STORED),
+               ("confidence", np.round(confidence * CONFIDENCE_SCALE).astype(np.uint8), zipfile.ZIP_DEFLATED),
+               ("present", ~np.isnan(keypoints).all(axis=(0, 1)), zipfile.ZIP_DEFLATED),
+               ("bbox", np.asarray(bbox, dtype=np.float32), zipfile.ZIP_DEFLATED),
+               ("meta", np.array(json.dumps(meta)), zipfile.ZIP_DEFLATED)]
+
+    # write to a temporary file first, a reader could memory map a partially written container otherwise
+    path_to_file = os.path.join(path, name + ".npz")
+    with zipfile.ZipFile(path_to_file + ".tmp", "w") as archive:
+        for member, array, compress_type in members:
+            info = zipfile.ZipInfo(member + ".npy", date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = compress_type
+            with archive.open(info, "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, array, allow_pickle=False)
+    os.replace(path_to_file + ".tmp", path_to_file)
+    return path_to_file
+
+
+def load_keypoints(path, name, min_confidence=None):
+    """
+    Returns a dictionary with the keypoints (keypoints, 2, frames), the confidence (keypoints, frames) in [0, 1], the
+    bounding boxes (4, frames), the presence mask (frames,) and the metadata of a person saved with save_keypoints.
+    The keypoints and bounding boxes are nan in frames without the person. If min_confidence is given, keypoints
+    with a lower confidence are set to nan as well. Containers of older versions are read as well.
+    """
+    with np.load(os.path.join(path, name + ".npz")) as data:
+        meta = json.loads(str(data["meta"]))
+        present = data["present"]
+        bbox = data["bbox"].astype(np.float32)
+        if meta["version"] == 1:
+            # keypoint-major coordinates
+            keypoints = data["coords"]
+            confidence = data["confidence"].astype(np.float32) / CONFIDENCE_SCALE
+        elif meta["version"] == 2:
+            # frame-major x, y and float32 confidence in one array
+            frames = data["frames"]
+            keypoints = np.ascontiguousarray(frames[:, :, :2].transpose(1, 2, 0))
+            confidence = np.nan_to_num(frames[:, :, 2].T)
+        else:
+            keypoints = np.ascontiguousarray(data["coords"].transpose(1, 2, 0))
+            confidence = data["confidence"].T.astype(np.float32) / CONFIDENCE_SCALE
+
+    keypoints[:, :, ~present] = np.nan
+    bbox[:, ~present] = np.nan
+    if min_confidence is not None:
+        keypoints[np.broadcast_to((confidence < min_confidence)[:, None, :], keypoints.shape)] = np.nan
+    return {"keypoints": keypoints, "confidence": confidence, "bbox": bbox, "present": present, "meta": meta}
+
+
 def load_numpy_keypoints_bbox(path, name):
+    # prefer the container, fall back to the .npy files of older assets
+    if os.path.exists(os.path.join(path, name + ".npz")):
+        data = load_keypoints(path, name)
+        return data["keypoints"], data["bbox"]
+
     # load the keypoints as numpy array
     keypoints = np.load(os.path.join(path, name + ".npy"))
 
@@ -19,4 +92,50 @@ def load_numpy_keypoints_bbox(path, name):
 
     return keypoints, bbox
 
-    
\ No newline at end of file
+
+def memmap_member(path_to_file, member):
+    """
+    Returns a read-only memory map of an array of an uncompressed .npz file. The members of such a file are plain .npy
+    files in a zip archive, the array is mapped at the offset of its data in the archive.
+    """
+    with zipfile.ZipFile(path_to_file) as archive:
+        info = archive.getinfo(member + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"The member {member} of {path_to_file} is compressed and can not be memory mapped.")
+
+    with open(path_to_file, "rb") as f:
+        # the local header of the member is followed by its name and extra field and then by the .npy file
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = struct.unpack("<HH", f.read(4))
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(path_to_file, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+def load_keypoints_frames(path, name):
+    """
+    Returns the frame-major keypoints (frames, keypoints, 2) of a person as a read-only memory map of the container,
+    so only the frames that are accessed are read from the disk. Containers of older versions and the .npy files of
+    older assets are converted to the current container once (utils/migrate_keypoints.py does this for all assets).
+    """
+    path_to_file = os.path.join(path, name + ".npz")
+    if not os.path.exists(path_to_file):
+        keypoints, bbox = load_numpy_keypoints_bbox(path, name)
+        save_keypoints(keypoints, legacy_confidence(keypoints), bbox, path, name, source="openpose (migrated)")
+    else:
+        with np.load(path_to_file) as data:
+            version = json.loads(str(data["meta"]))["version"]
+        if version < FORMAT_VERSION:
+            data = load_keypoints(path, name)
+            save_keypoints(data["keypoints"], data["confidence"], data["bbox"], path, name, **{key: data["meta"][key] for key in ["fps", "skeleton", "source"]})
+    return memmap_member(path_to_file, "coords")
+
+
+def legacy_confidence(keypoints):
+    # the old .npy files have no confidence, missing keypoints were stored as (0, 0)
+    return ((keypoints != 0).any(axis=1) & ~np.isnan(keypoints).any(axis=1)).astype(np.float32)
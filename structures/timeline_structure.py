@@ -1,8 +1,322 @@
 import os
+import json
+import hashlib
+import tempfile
+import contextlib
 import pandas as pd
 import numpy as np
 import time
-import cv2
+
+# pyarrow is optional, without it the timelines are only stored as text files
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# columns of the tables of the timeline, the times are stored as integer frame numbers
+TABLE_COLUMNS = {
+    "Objects": ["Start_Frame", "End_Frame", "Object_Name"],
+    "Object_Interactions": ["Event_Frame", "Event_Description"],
+    "ABCS_Coding": ["Start_Frame", "End_Frame", "ABCS_Variable", "ABCS_Comment"],
+}
+FRAME_COLUMNS = ["Start_Frame", "End_Frame", "Event_Frame"]
+
+# layout of the human readable timeline file
+TITLE_SEP = "=========================================================================\n"
+TABLE_SEP = "-------------------------------------------------------------------------\n"
+SECTION_TABLES = [None, "Objects", "Object_Interactions", "ABCS_Coding"]     # tables of the file in order, the first is the general information
+GENERAL_INFO = ["Video_Name", "Duration", "Frame_Width", "Frame_Height", "Frame_Rate", "Total_Frames", "Date_Recorded", "Author", "Date_Coding"]
+
+SIDECAR_VERSION = 1
+SIDECAR_EXTENSION = ".arrow"        # folder next to the timeline file with one arrow file per table and meta.json
+
+
+def time_to_seconds(time_string):
+    """
+    Returns the seconds of a "HH:MM:SS" or "HH:MM:SS.mmm" time string.
+    """
+    hours, minutes, seconds = time_string.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def times_to_frames(times, frame_rate):
+    """
+    Returns the frame numbers of the times as an int64 array, the times are frame numbers or "HH:MM:SS(.mmm)" strings.
+    """
+    times = list(times)
+    if times and all(isinstance(time_value, str) for time_value in times):
+        buffer = "".join(times).encode("ascii", errors="replace")
+        width = len(buffer) // len(times)
+        if width in (8, 12) and len(buffer) == width * len(times):
+            # all times have the fixed "HH:MM:SS" or "HH:MM:SS.mmm" layout, the digits are read from one buffer
+            characters = np.frombuffer(buffer, dtype=np.uint8).reshape(len(times), width)
+            layout = np.frombuffer(b"00:00:00.000"[:width], dtype=np.uint8)
+            is_digit = layout == ord("0")
+            if (characters[:, ~is_digit] == layout[~is_digit]).all() and (characters[:, is_digit] - ord("0") <= 9).all():
+                digits = characters.astype(np.int64) - ord("0")
+                milliseconds = ((digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60 + digits[:, 6] * 10 + digits[:, 7]) * 1000
+                if width == 12:
+                    milliseconds += digits[:, 9] * 100 + digits[:, 10] * 10 + digits[:, 11]
+                return np.round(milliseconds * frame_rate / 1000).astype(np.int64)
+        seconds = np.array([time_value.split(":") for time_value in times], dtype=np.float64) @ np.array([3600, 60, 1])
+        return np.round(seconds * frame_rate).astype(np.int64)
+    frames = [time_value if not isinstance(time_value, str) else round(time_to_seconds(time_value) * frame_rate) for time_value in times]
+    return np.asarray(frames, dtype=np.float64).round().astype(np.int64)
+
+
+def frames_to_times(frames, frame_rate):
+    """
+    Returns the "HH:MM:SS.mmm" time strings of the frame numbers.
+    """
+    characters = time_characters(frames, frame_rate)
+    if characters is None:
+        milliseconds = np.round(np.asarray(frames, dtype=np.float64) * 1000 / frame_rate).astype(np.int64)
+        seconds, milliseconds = np.divmod(milliseconds, 1000)
+        minutes, seconds = np.divmod(seconds, 60)
+        hours, minutes = np.divmod(minutes, 60)
+        return ["%02d:%02d:%02d.%03d" % time_parts for time_parts in zip(hours.tolist(), minutes.tolist(), seconds.tolist(), milliseconds.tolist())]
+    return [time_value.decode("ascii") for time_value in characters.view("S12").ravel().tolist()]
+
+
+def time_characters(frames, frame_rate):
+    """
+    Returns the "HH:MM:SS.mmm" times of the frame numbers as a (frames, 12) uint8 array of ascii characters, or None
+    if a time does not fit the fixed width layout (negative or 100 hours and more).
+    """
+    milliseconds = np.round(np.asarray(frames, dtype=np.float64) * 1000 / frame_rate).astype(np.int64)
+    seconds, milliseconds = np.divmod(milliseconds, 1000)
+    minutes, seconds = np.divmod(seconds, 60)
+    hours, minutes = np.divmod(minutes, 60)
+    if len(hours) and (hours.min() < 0 or hours.max() > 99):
+        return None
+
+    # the digits of all times are written into one fixed width "HH:MM:SS.mmm" buffer
+    characters = np.empty((len(hours), 12), dtype=np.uint8)
+    characters[:] = np.frombuffer(b"00:00:00.000", dtype=np.uint8)
+    for column, values, unit in [(0, hours, 10), (1, hours, 1), (3, minutes, 10), (4, minutes, 1), (6, seconds, 10), (7, seconds, 1),
+                                 (9, milliseconds, 100), (10, milliseconds, 10), (11, milliseconds, 1)]:
+        characters[:, column] += (values // unit % 10).astype(np.uint8)
+    return characters
+
+
+def format_rows(row_format, *columns):
+    """
+    Returns the rows of the columns formatted with row_format (one "%s" per column) as one string. The columns are
+    lists of strings or (rows, width) uint8 arrays of ascii characters (see time_characters). The text of all rows is
+    assembled in one byte buffer, every column is copied with one scatter instead of formatting the rows one by one.
+    """
+    num_rows = len(columns[0]) if columns else 0
+    if not num_rows:
+        return ""
+    parts = [np.frombuffer(part.encode("utf-8"), dtype=np.uint8) for part in row_format.split("%s")]
+
+    # the bytes of every column and the length of its value in every row
+    values = []
+    for column in columns:
+        if isinstance(column, np.ndarray):
+            values.append((column.ravel(), np.full(num_rows, column.shape[1], dtype=np.int64)))
+            continue
+        buffer = "".join(column).encode("utf-8")
+        lengths = np.fromiter(map(len, column), dtype=np.int64, count=num_rows)
+        if len(buffer) != lengths.sum():
+            # not only ascii characters, the lengths are counted in bytes
+            lengths = np.fromiter((len(value.encode("utf-8")) for value in column), dtype=np.int64, count=num_rows)
+        values.append((np.frombuffer(buffer, dtype=np.uint8), lengths))
+
+    row_lengths = sum(len(part) for part in parts) + sum(lengths for _, lengths in values)
+    text = np.empty(row_lengths.sum(), dtype=np.uint8)
+    position = np.cumsum(row_lengths) - row_lengths      # where the next part of every row starts
+    for index, part in enumerate(parts):
+        text[position[:, None] + np.arange(len(part))] = part
+        position += len(part)
+        if index < len(values):
+            buffer, lengths = values[index]
+            # byte k of the value of a row goes to the position of the row plus k
+            text[np.repeat(position - (np.cumsum(lengths) - lengths), lengths) + np.arange(len(buffer))] = buffer
+            position += lengths
+    return text.tobytes().decode("utf-8")
+
+
+@contextlib.contextmanager
+def atomic_write(path_to_file, mode="w"):
+    """
+    This function is used to write a file atomically. The content is written to a temporary file with a unique name
+    next to the file, which replaces the file once it is on the disk. If the write fails the temporary file is removed
+    and the file is left as it was.
+    """
+    directory, name = os.path.split(path_to_file)
+    fd, path_to_tmp = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, mode) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path_to_tmp, path_to_file)
+    except BaseException:
+        if os.path.exists(path_to_tmp):
+            os.remove(path_to_tmp)
+        raise
+
+
+def sidecar_path(path_to_file):
+    """
+    Returns the path of the binary sidecar of a timeline file, "<name>_timeline.arrow" next to "<name>_timeline.txt".
+    """
+    return os.path.splitext(path_to_file)[0] + SIDECAR_EXTENSION
+
+
+def file_hash(path_to_file):
+    """
+    Returns the sha256 hash of the content of a file.
+    """
+    with open(path_to_file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_sidecar_meta(path_to_file):
+    """
+    Returns the meta data of the sidecar of the timeline file, or None if there is no sidecar that belongs to the
+    current content of the timeline file. The size and modification time are compared first, the content hash is only
+    computed if they changed (e.g. the file was copied).
+    """
+    path_to_meta = os.path.join(sidecar_path(path_to_file), "meta.json")
+    if pyarrow is None or not os.path.exists(path_to_meta):
+        return None
+    with open(path_to_meta, "r") as f:
+        meta = json.load(f)
+    if meta.get("version") != SIDECAR_VERSION:
+        return None
+    if not os.path.exists(path_to_file):
+        # only the sidecar was copied
+        return meta
+    stat = os.stat(path_to_file)
+    if stat.st_size == meta["size"] and stat.st_mtime_ns == meta["mtime_ns"]:
+        return meta
+    return meta if stat.st_size == meta["size"] and file_hash(path_to_file) == meta["content_hash"] else None
+
+
+def write_arrow_table(path_to_table, dataframe, columns):
+    # the frames are stored as int64 and all other columns as strings
+    schema = pyarrow.schema([(column, pyarrow.int64() if column in FRAME_COLUMNS else pyarrow.string()) for column in columns])
+    table = pyarrow.Table.from_pandas(dataframe[columns], schema=schema, preserve_index=False)
+    with atomic_write(path_to_table, "wb") as sink:
+        with pyarrow.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+
+
+def read_arrow_table(path_to_table):
+    """
+    Returns the dataframe of a table of a sidecar, the file is memory mapped instead of read.
+    """
+    with pyarrow.memory_map(path_to_table, "r") as source:
+        dataframe = pyarrow.ipc.open_file(source).read_all().to_pandas()
+    for column in dataframe.columns:
+        if column not in FRAME_COLUMNS:
+            dataframe[column] = dataframe[column].astype(object)
+    return dataframe
+
+
+class IntervalIndex:
+    """
+    This class is used to query the rows of a table by their frames. The intervals are stored in a centered interval
+    tree: every node keeps the intervals that contain its center frame sorted by start and by end, the intervals
+    left and right of the center go to the children, small sets of intervals are kept in leaves. A point query walks
+    down one path of the tree and only looks at the intervals it returns (plus one leaf), so a long interval (e.g. an
+    object that is seen during the whole video) does not slow down the other queries. Point and range queries are
+    O(log n + k).
+    """
+
+    LEAF_SIZE = 32      # max intervals of a leaf, the intervals of a leaf are compared at once
+
+    def __init__(self, starts, ends):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        self.order = np.argsort(starts, kind="stable")
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.last_scanned = 0       # intervals looked at by the last query
+
+        # nodes of the tree: center, left and right child (-1 if none), the rows of the node sorted by start and
+        # their starts, the rows sorted by end and their ends. A leaf has the center None and its rows unsorted.
+        self.nodes = []
+        if len(starts):
+            self._build(starts, ends, np.arange(len(starts)))
+
+    def _build(self, starts, ends, rows):
+        # the nodes are built from a stack, the children are linked once they are created
+        stack = [(rows, None, None)]
+        while stack:
+            rows, parent, side = stack.pop()
+            index = len(self.nodes)
+            if parent is not None:
+                self.nodes[parent][side] = index
+            if len(rows) <= self.LEAF_SIZE:
+                self.nodes.append([None, -1, -1, rows, starts[rows], rows, ends[rows]])
+                continue
+
+            # the median of the midpoints splits the intervals, at least half of them are not left and not right of it
+            center = int(np.median((starts[rows] + ends[rows]) // 2))
+            left = ends[rows] < center
+            right = ~left & (starts[rows] > center)
+            middle = rows[~left & ~right]
+            by_start = middle[np.argsort(starts[middle], kind="stable")]
+            by_end = middle[np.argsort(ends[middle], kind="stable")]
+            self.nodes.append([center, -1, -1, by_start, starts[by_start], by_end, ends[by_end]])
+            if left.any():
+                stack.append((rows[left], index, 1))
+            if right.any():
+                stack.append((rows[right], index, 2))
+
+    def _stab(self, frame):
+        # row positions (unsorted) of the intervals that contain the frame
+        found = []
+        node = 0 if self.nodes else -1
+        while node != -1:
+            center, left, right, by_start, node_starts, by_end, node_ends = self.nodes[node]
+            if center is None:
+                self.last_scanned += len(by_start)
+                found.append(by_start[(node_starts <= frame) & (node_ends >= frame)])
+                break
+            if frame < center:
+                # all intervals of the node end after the frame, the ones that start before it contain it
+                matches = by_start[:np.searchsorted(node_starts, frame, side="right")]
+                node = left
+            elif frame > center:
+                matches = by_end[np.searchsorted(node_ends, frame, side="left"):]
+                node = right
+            else:
+                matches, node = by_start, -1
+            self.last_scanned += len(matches)
+            found.append(matches)
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def overlapping(self, start, end):
+        """
+        Returns the (sorted) row positions of the intervals that overlap [start, end], i.e. the intervals that
+        contain start and the intervals that start in (start, end].
+        """
+        self.last_scanned = 0
+        low = np.searchsorted(self.starts, start, side="right")
+        high = np.searchsorted(self.starts, end, side="right")
+        self.last_scanned += max(high - low, 0)
+        return np.sort(np.concatenate([self._stab(start), self.order[low:high][self.ends[low:high] >= start]]))
+
+    def within(self, start, end):
+        """
+        Returns the (sorted) row positions of the intervals that lie completely in [start, end].
+        """
+        low = np.searchsorted(self.starts, start, side="left")
+        high = np.searchsorted(self.starts, end, side="right")
+        self.last_scanned = max(high - low, 0)
+        return np.sort(self.order[low:high][self.ends[low:high] <= end])
+
+    def at(self, frame):
+        """
+        Returns the (sorted) row positions of the intervals that contain the frame.
+        """
+        self.last_scanned = 0
+        return np.sort(self._stab(frame))
 
 
 class Timeline:
@@ -23,53 +337,135 @@ class Timeline:
         self.Author = str(author)
         self.Date_Coding = str(date_coding)
 
-        # dataframes for the different tables
-        self.Objects = pd.DataFrame(columns=[
-            "Start_Time",
-            "End_Time",
-            "Object_Name",
-        ])
-
-        self.Object_Interactions = pd.DataFrame(columns=[
-            "Event_Time",
-            "Event_Description",
-        ])
-
-        self.ABCS_Coding = pd.DataFrame(columns=[
-            "Start_Time",
-            "End_Time",
-            "ABCS_Variable",
-            "ABCS_Comment",
-        ])
+        # the rows of the tables are buffered in column lists and only turned into dataframes once a table is read,
+        # appending single rows to a dataframe copies the whole table every time
+        self._tables = {name: self._empty_table(name) for name in TABLE_COLUMNS}
+        self._pending = {name: {column: [] for column in columns} for name, columns in TABLE_COLUMNS.items()}
+        self._indexes = {}
+        self._sources = {}      # {table: arrow file of a sidecar}, the table is only loaded once it is read
 
         return
 
-    # setters and getters for dataframes
+    @staticmethod
+    def _empty_table(table):
+        return pd.DataFrame({column: pd.Series(dtype=np.int64 if column in FRAME_COLUMNS else object) for column in TABLE_COLUMNS[table]})
+
+    def _frame_rate(self):
+        try:
+            return float(self.Frame_Rate)
+        except ValueError:
+            raise ValueError("The frame rate of the timeline has to be set to convert times to frames.")
+
+    def _append(self, table, rows):
+        # add the rows (tuples in the order of the columns) to the buffer of the table, the times are frame numbers
+        # or time strings that are converted to frame numbers
+        pending = self._pending[table]
+        for column, values in zip(TABLE_COLUMNS[table], zip(*rows)):
+            if column in FRAME_COLUMNS:
+                frame_rate = self._frame_rate() if any(isinstance(value, str) for value in values) else None
+                pending[column].extend(times_to_frames(values, frame_rate).tolist())
+            else:
+                pending[column].extend(str(value) for value in values)
+
+    def _table(self, table):
+        # load the table from the sidecar and materialize the buffered rows of the table
+        if table in self._sources:
+            self._tables[table] = read_arrow_table(self._sources.pop(table))
+            self._indexes.pop(table, None)
+        pending = self._pending[table]
+        if pending[TABLE_COLUMNS[table][0]]:
+            rows = pd.DataFrame({column: np.asarray(values, dtype=np.int64) if column in FRAME_COLUMNS else pd.Series(values, dtype=object)
+                                 for column, values in pending.items()})
+            self._tables[table] = rows if self._tables[table].empty else pd.concat([self._tables[table], rows], ignore_index=True)
+            self._pending[table] = {column: [] for column in TABLE_COLUMNS[table]}
+            self._indexes.pop(table, None)
+        return self._tables[table]
+
+    def _set_table(self, table, dataframe):
+        self._sources.pop(table, None)
+        self._tables[table] = dataframe
+        self._pending[table] = {column: [] for column in TABLE_COLUMNS[table]}
+        self._indexes.pop(table, None)
+
+    def _index(self, table):
+        # the interval index of a table is built on the first query after the table changed
+        dataframe = self._table(table)
+        if table not in self._indexes:
+            columns = TABLE_COLUMNS[table]
+            starts = dataframe[columns[0]].to_numpy(dtype=np.int64)
+            ends = dataframe["End_Frame"].to_numpy(dtype=np.int64) if "End_Frame" in columns else starts
+            self._indexes[table] = IntervalIndex(starts, ends)
+        return self._indexes[table]
+
+    def _frame(self, time_value):
+        return int(times_to_frames([time_value], self._frame_rate() if isinstance(time_value, str) else None)[0])
+
+    # dataframes for the different tables
+    @property
+    def Objects(self):
+        return self._table("Objects")
+
+    @Objects.setter
+    def Objects(self, objects):
+        self._set_table("Objects", objects)
+
+    @property
+    def Object_Interactions(self):
+        return self._table("Object_Interactions")
+
+    @Object_Interactions.setter
+    def Object_Interactions(self, object_interactions):
+        self._set_table("Object_Interactions", object_interactions)
+
+    @property
+    def ABCS_Coding(self):
+        return self._table("ABCS_Coding")
+
+    @ABCS_Coding.setter
+    def ABCS_Coding(self, abcs_coding):
+        self._set_table("ABCS_Coding", abcs_coding)
+
+    # setters and getters for dataframes, the times are frame numbers or "HH:MM:SS(.mmm)" strings
     def add_object(self, start_time, end_time, object_name):
         """
         This function is used to add an object to the objects table.
         """
-        self.Objects = pd.concat([self.Objects, 
-                                  pd.DataFrame([[str(start_time), str(end_time), str(object_name)]], columns=self.Objects.columns)], 
-                                  ignore_index=True)
+        self._append("Objects", [(start_time, end_time, object_name)])
+        return
+
+    def add_objects(self, objects):
+        """
+        This function is used to add many objects (start_time, end_time, object_name) to the objects table at once.
+        """
+        self._append("Objects", objects)
         return
 
     def add_object_interaction(self, event_time, event_description):
         """
         This function is used to add an object interaction to the object interaction table.
         """
-        self.Object_Interactions = pd.concat([self.Object_Interactions, 
-                                              pd.DataFrame([[str(event_time), str(event_description)]], columns=self.Object_Interactions.columns)],
-                                              ignore_index=True)
+        self._append("Object_Interactions", [(event_time, event_description)])
+        return
+
+    def add_object_interactions(self, object_interactions):
+        """
+        This function is used to add many object interactions (event_time, event_description) to the object interaction table at once.
+        """
+        self._append("Object_Interactions", object_interactions)
         return
 
     def add_abcs_coding(self, start_time, end_time, abcs_variable, abcs_comment=None):
         """
         This function is used to add an abcs coding to the abcs coding table.
         """
-        self.ABCS_Coding = pd.concat([self.ABCS_Coding, 
-                                      pd.DataFrame([[str(start_time), str(end_time), str(abcs_variable), str(abcs_comment)]], columns=self.ABCS_Coding.columns)],
-                                      ignore_index=True)
+        self._append("ABCS_Coding", [(start_time, end_time, abcs_variable, abcs_comment)])
+        return
+
+    def add_abcs_codings(self, abcs_codings):
+        """
+        This function is used to add many abcs codings (start_time, end_time, abcs_variable, abcs_comment) to the abcs coding table at once.
+        """
+        self._append("ABCS_Coding", abcs_codings)
         return
 
     def get_objects(self):
@@ -85,7 +481,13 @@ class Timeline:
         """
         Returns a dataframe with  all the object detections within the given time range.
         """
-        return self.Objects[(self.Objects["Start_Time"] >= start_time) & (self.Objects["End_Time"] <= end_time)]
+        return self.Objects.iloc[self._index("Objects").within(self._frame(start_time), self._frame(end_time))]
+
+    def get_objects_at(self, time_value):
+        """
+        Returns a dataframe with all the objects that are visible at the given time.
+        """
+        return self.Objects.iloc[self._index("Objects").at(self._frame(time_value))]
 
     def get_object_interactions(self):
         return self.Object_Interactions
@@ -100,11 +502,17 @@ class Timeline:
         """
         Returns a dataframe with all the object interactions within the given time range.
         """
-        return self.Object_Interactions[(self.Object_Interactions["Start_Time"] >= start_time) & (self.Object_Interactions["End_Time"] <= end_time)]
+        return self.Object_Interactions.iloc[self._index("Object_Interactions").within(self._frame(start_time), self._frame(end_time))]
 
     def get_abcs_coding(self):
         return self.ABCS_Coding
 
+    def get_abcs_coding_at(self, time_value):
+        """
+        Returns a dataframe with the abcs codings at the given time.
+        """
+        return self.ABCS_Coding.iloc[self._index("ABCS_Coding").at(self._frame(time_value))]
+
     # setters and getters for general information
     def set_video_name(self, video_name):
         self.Video_Name = str(video_name)
@@ -169,26 +577,46 @@ class Timeline:
     def get_date_coding(self):
         return self.Date_Coding
 
-    def import_from_file(self, path_to_file):
+    def import_from_file(self, path_to_file, use_sidecar=True):
         """
-        This function is used to import the data from an existing human readable timeline file.
+        This function is used to import the data from an existing human readable timeline file. If the file has an
+        up to date binary sidecar (see export_sidecar) the tables are loaded from the sidecar once they are read.
+        Otherwise the file is read line by line in one pass, the rows of every section are collected and added to the
+        tables at once, and the sidecar is written for the next import.
         """
-        # Read file
-        with open(path_to_file, 'r') as file:
-            lines = file.readlines()
-
-        table_sep = "-------------------------------------------------------------------------\n"
+        if use_sidecar:
+            meta = load_sidecar_meta(path_to_file)
+            if meta is not None:
+                self.import_from_sidecar(path_to_file, meta)
+                return
 
-        # Parse general information
-        general_info_start = lines.index(table_sep)
-        general_info_end = lines.index(table_sep, general_info_start + 1)
-
-        general_info_lines = lines[general_info_start + 1 :general_info_end]
         general_info = {}
-
-        for line in general_info_lines:
-            key, value = line.split(maxsplit=1)
-            general_info[key.strip()] = value.strip()
+        rows = {table: [] for table in TABLE_COLUMNS}
+        section = 0
+        in_table = False
+        with open(path_to_file, 'r') as file:
+            for line in file:
+                if line == TITLE_SEP:
+                    continue
+                if line == TABLE_SEP:
+                    # the table separators open and close the rows of a section
+                    section += in_table
+                    in_table = not in_table
+                    continue
+                if not in_table or section >= len(SECTION_TABLES):
+                    # section titles, table headers and blank lines
+                    continue
+
+                line = line.rstrip("\n")
+                table = SECTION_TABLES[section]
+                if table is None:
+                    key, value = (line.split(None, 1) + [""])[:2]
+                    general_info[key] = value.strip()
+                    continue
+                # the last column (name, description or comment) can contain spaces, a missing comment is empty
+                num_columns = len(TABLE_COLUMNS[table])
+                fields = line.split(None, num_columns - 1)
+                rows[table].append(fields + [""] * (num_columns - len(fields)))
 
         self.set_video_name(general_info["Video_Name"])
         self.set_duration(general_info["Duration"])
@@ -200,120 +628,123 @@ class Timeline:
         self.set_author(general_info["Author"])
         self.set_date_coding(general_info["Date_Coding"])
 
-        # Parse objects
-        objects_start = lines.index(table_sep, general_info_end + 1)
-        objects_end = lines.index(table_sep, objects_start + 1)
-        objects_lines = lines[objects_start + 1:objects_end]
-        objects = []
-        for line in objects_lines:
-            start_time, end_time, object_name = line.strip().split(maxsplit=2)
-            objects.append((start_time, end_time, object_name))
-
-        # Insert objects into timeline object
-        for obj in objects:
-            self.add_object(obj[0], obj[1], obj[2])
-
-        # Parse object interactions
-        interactions_start = lines.index(table_sep, objects_end + 1)
-        interactions_end = lines.index(table_sep, interactions_start + 1)
-
-        interactions_lines = lines[interactions_start + 1:interactions_end]
-        interactions = []
-        for line in interactions_lines:
-            event_time, event_description = line.strip().split(maxsplit=1)
-            interactions.append((event_time, event_description))
-
-        # Insert object interactions into timeline object
-        for interaction in interactions:
-            self.add_object_interaction(interaction[0], interaction[1])
-
-        # Parse ABCS coding
-        abcs_start = lines.index(table_sep, interactions_end + 1)
-        abcs_end = lines.index(table_sep, abcs_start + 1)
-
-        abcs_lines = lines[abcs_start + 1:abcs_end]
-        abcs_coding = []
-        for line in abcs_lines:
-            start_time, end_time, abcs_variable, abcs_comment = line.strip().split(maxsplit=3)
-            abcs_coding.append((start_time, end_time, abcs_variable, abcs_comment))
-
-        # Insert ABCS coding into timeline object
-        for coding in abcs_coding:
-            self.add_abcs_coding(coding[0], coding[1], coding[2], coding[3])
+        # insert the rows of all tables, the times are converted to frames with the frame rate of the timeline
+        self.add_objects(rows["Objects"])
+        self.add_object_interactions(rows["Object_Interactions"])
+        self.add_abcs_codings(rows["ABCS_Coding"])
+
+        if use_sidecar and pyarrow is not None:
+            try:
+                self.export_sidecar(path_to_file)
+            except OSError:
+                # e.g. a read only assets folder, the text file is parsed again next time
+                pass
         return
-    
-    def export_to_file(self, path_to_file):
-        """
-        This function is used to export the data to a human readable timeline file.
-        """
-        title_sep = "=========================================================================\n"
-        table_sep = "-------------------------------------------------------------------------\n"
-        
-        general_info_title = title_sep + "General Information\n" + title_sep
-        general_info_table_header = "Name" + "\t" * 4 + "Value\n"
-
-        objects_title = title_sep + "Objects\n" + title_sep
-        objects_table_header = "Start_Time" + "\t" * 2 + "End_Time" + "\t" * 2 + "Object_Name\n"
-
-        interactions_title = title_sep + "Object Interactions\n" + title_sep
-        interactions_table_header = "Event_Time" + "\t" * 2 + "Event_Description\n"
-
-        abcs_title = title_sep + "ABCS Coding\n" + title_sep
-        abcs_table_header = "Start_Time" + "\t" * 2 + "End_Time" + "\t" * 2 + "ABCS_Variable" + "\t" * 2 + "ABCS_Comment\n"
-
-        # write to file
-        with open(path_to_file, 'w') as file:
-            # write general information
-            file.write(general_info_title)
-
-            file.write(general_info_table_header)
-            file.write(table_sep)
-            file.write("Video_Name" + "\t" * 3 + self.get_video_name() + "\n")
-            file.write("Duration" + "\t" * 3 + self.get_duration() + "\n")
-            file.write("Frame_Width" + "\t" * 3 + self.get_frame_width() + "\n")
-            file.write("Frame_Height" + "\t" * 2 + self.get_frame_height() + "\n")
-            file.write("Frame_Rate" + "\t" * 3 + self.get_frame_rate() + "\n")
-            file.write("Total_Frames" + "\t" * 2 + self.get_total_frames() + "\n")
-            file.write("Date_Recorded" + "\t" * 2 + self.get_date_recorded() + "\n")
-            file.write("Author" + "\t" * 4 + self.get_author() + "\n")
-            file.write("Date_Coding" + "\t" * 3 + self.get_date_coding() + "\n")
-            file.write(table_sep + "\n\n\n")
-
-            # write objects
-            file.write(objects_title)
-
-            file.write(objects_table_header)
-            file.write(table_sep)
-            for index, row in self.get_objects().iterrows():
-                file.write(row["Start_Time"] + "\t" * 2 + row["End_Time"] + "\t" * 2 + row["Object_Name"] + "\n")
-            file.write(table_sep + "\n\n\n")
-
-            # write object interactions
-            file.write(interactions_title)
-
-            file.write(interactions_table_header)
-            file.write(table_sep)
-            for index, row in self.get_object_interactions().iterrows():
-                file.write(row["Event_Time"] + "\t" * 2 + row["Event_Description"] + "\n")
-            file.write(table_sep + "\n\n\n")
-
-            # write abcs coding
-            file.write(abcs_title)
-
-            file.write(abcs_table_header)
-            file.write(table_sep)
-            for index, row in self.get_abcs_coding().iterrows():
-                file.write(row["Start_Time"] + "\t" * 2 + row["End_Time"] + "\t" * 2 + row["ABCS_Variable"] + "\t" * 5 + row["ABCS_Comment"] + "\n")
-            file.write(table_sep + "\n\n\n")
 
+    def import_from_sidecar(self, path_to_file, meta=None):
+        """
+        This function is used to import the timeline from the binary sidecar of the timeline file. Only the general
+        information is read, the tables are memory mapped when they are first used.
+        """
+        meta = meta or load_sidecar_meta(path_to_file)
+        if meta is None:
+            raise ValueError("The timeline file " + path_to_file + " has no up to date sidecar.")
+        for key in GENERAL_INFO:
+            setattr(self, key, meta["general_info"][key])
+        directory = sidecar_path(path_to_file)
+        for table in TABLE_COLUMNS:
+            self._set_table(table, self._empty_table(table))
+            self._sources[table] = os.path.join(directory, table + ".arrow")
         return
-    
+
+    def export_sidecar(self, path_to_file):
+        """
+        This function is used to write the binary columnar copy of the timeline file path_to_file next to it, one
+        arrow file per table and meta.json with the format version, the general information and the hash of the
+        content of the timeline file it belongs to. Returns the path of the sidecar or None if pyarrow is missing.
+        """
+        if pyarrow is None:
+            return None
+        directory = sidecar_path(path_to_file)
+        path_to_meta = os.path.join(directory, "meta.json")
+        os.makedirs(directory, exist_ok=True)
+
+        # the meta data is removed while the tables are written and written last, a partial sidecar is never used
+        if os.path.exists(path_to_meta):
+            os.remove(path_to_meta)
+        for table, columns in TABLE_COLUMNS.items():
+            write_arrow_table(os.path.join(directory, table + ".arrow"), self._table(table), columns)
+
+        stat = os.stat(path_to_file)
+        meta = {"version": SIDECAR_VERSION, "content_hash": file_hash(path_to_file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "general_info": {key: getattr(self, key) for key in GENERAL_INFO}}
+        with atomic_write(path_to_meta) as f:
+            json.dump(meta, f, indent=4)
+        return directory
+
+    def _times(self, frames):
+        # the frames are only rendered as time strings for the file, as characters if they fit the fixed width layout
+        characters = time_characters(frames, self._frame_rate())
+        return characters if characters is not None else frames_to_times(frames, self._frame_rate())
+
+    def export_to_file(self, path_to_file, sidecar=True):
+        """
+        This function is used to export the data to a human readable timeline file, and to its binary sidecar if
+        sidecar is True and pyarrow is installed. The whole file is formatted in memory and written to a temporary
+        file that replaces the timeline file, an interrupted export keeps the previous timeline file.
+        """
+        # name and tabs to the value of the general information
+        general_info = [("Video_Name", 3), ("Duration", 3), ("Frame_Width", 3), ("Frame_Height", 2), ("Frame_Rate", 3),
+                        ("Total_Frames", 2), ("Date_Recorded", 2), ("Author", 4), ("Date_Coding", 3)]
+
+        objects = self.get_objects()
+        interactions = self.get_object_interactions()
+        abcs_coding = self.get_abcs_coding()
+        text = "".join([
+            self._section("General Information", "Name" + "\t" * 4 + "Value\n",
+                          "".join(key + "\t" * tabs + getattr(self, key) + "\n" for key, tabs in general_info)),
+            self._section("Objects", "Start_Time" + "\t" * 2 + "End_Time" + "\t" * 2 + "Object_Name\n",
+                          format_rows("%s\t\t%s\t\t%s\n", self._times(objects["Start_Frame"]), self._times(objects["End_Frame"]),
+                                     objects["Object_Name"].tolist())),
+            self._section("Object Interactions", "Event_Time" + "\t" * 2 + "Event_Description\n",
+                          format_rows("%s\t\t%s\n", self._times(interactions["Event_Frame"]), interactions["Event_Description"].tolist())),
+            self._section("ABCS Coding", "Start_Time" + "\t" * 2 + "End_Time" + "\t" * 2 + "ABCS_Variable" + "\t" * 2 + "ABCS_Comment\n",
+                          format_rows("%s\t\t%s\t\t%s\t\t\t\t\t%s\n", self._times(abcs_coding["Start_Frame"]), self._times(abcs_coding["End_Frame"]),
+                                     abcs_coding["ABCS_Variable"].tolist(), abcs_coding["ABCS_Comment"].tolist())),
+        ])
+
+        # write to a temporary file first and replace the timeline file once the content is on disk
+        with atomic_write(path_to_file) as file:
+            file.write(text)
+
+        if sidecar:
+            self.export_sidecar(path_to_file)
+        return
+
+    @staticmethod
+    def _section(title, header, rows):
+        # title, table header and the rows of a section of the timeline file
+        return TITLE_SEP + title + "\n" + TITLE_SEP + header + TABLE_SEP + rows + TABLE_SEP + "\n\n\n"
+
+
+
+def insert_events(timeline, objects=None, interactions=None):
+    """
+    This function is used to insert the objects ({name: [[start_frame, end_frame]]}) and object interactions
+    ({start_frame: [predicate, object]}) of the analysis modules into the timeline.
+    """
+    timeline.add_objects((start, end, objname) for objname, list_start_end in (objects or {}).items() for start, end in list_start_end)
+    timeline.add_object_interactions((start, "Is " + event[0] + " " + event[1] + ".") for start, event in (interactions or {}).items())
+    return timeline
 
 
 def auto_init_(video_path):
     """
     This function is used to auto init the timeline structure from a video file.
     """
+    # opencv is only needed to read the video, the timeline files can be used without it
+    import cv2
+
     # init timeline
     cap = cv2.VideoCapture(video_path)
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tests import the packages of the repository like the scripts in the root folder do
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
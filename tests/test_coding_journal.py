@@ -0,0 +1,98 @@
+import os
+import time
+import shutil
+import threading
+import pytest
+
+from structures import coding_journal
+from structures import timeline_structure
+
+EXAMPLE_TIMELINE = os.path.join(os.path.dirname(__file__), "..", "structures", "example_video.txt")
+
+
+def load_timeline(path_to_timeline):
+    timeline = timeline_structure.Timeline()
+    timeline.import_from_file(path_to_timeline, use_sidecar=False)
+    return timeline
+
+
+def wait_for(condition, timeout=5.0):
+    start = time.monotonic()
+    while not condition():
+        if time.monotonic() - start > timeout:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def path_to_timeline(tmp_path):
+    path = str(tmp_path / "example_video_timeline.txt")
+    shutil.copy(EXAMPLE_TIMELINE, path)
+    return path
+
+
+def test_replay_after_restart(path_to_timeline):
+    timeline = load_timeline(path_to_timeline)
+    journal = coding_journal.CodingJournal(timeline, path_to_timeline, compact_idle=3600)
+    for start in range(0, 100, 10):
+        timeline.add_abcs_coding(start, start + 9, "EW", "")
+        journal.record(start, start + 9, "EW", "")
+    expected = timeline.get_abcs_coding()
+    journal.close()
+
+    # the timeline file was not rewritten, the edits come from the journal
+    restarted = load_timeline(path_to_timeline)
+    assert coding_journal.CodingJournal(restarted, path_to_timeline).replay() == 10
+    assert restarted.get_abcs_coding().equals(expected)
+
+
+def test_background_sync_without_further_edits(path_to_timeline, monkeypatch):
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (synced.append(fd), fsync(fd)))
+    journal = coding_journal.CodingJournal(load_timeline(path_to_timeline), path_to_timeline, sync_interval=0.05, compact_idle=3600)
+    journal.record(0, 9, "EW")
+    synced.clear()
+    # the edit is fsynced by the background thread, no second edit is needed
+    assert wait_for(lambda: journal.unsynced == 0)
+    assert synced
+    journal.close()
+    assert journal.thread is None
+
+
+def test_idle_compaction(path_to_timeline):
+    timeline = load_timeline(path_to_timeline)
+    journal = coding_journal.CodingJournal(timeline, path_to_timeline, sync_interval=0.05, compact_idle=0.1)
+    timeline.add_abcs_coding(0, 9, "EW", "")
+    journal.record(0, 9, "EW")
+    assert wait_for(lambda: journal.edits == 0)
+    journal.close()
+
+    # the coding is in the timeline file, the new journal is empty and belongs to it
+    restarted = load_timeline(path_to_timeline)
+    assert restarted.get_abcs_coding().equals(timeline.get_abcs_coding())
+    assert coding_journal.CodingJournal(restarted, path_to_timeline).replay() == 0
+
+
+def test_parallel_codings_do_not_overlap(tmp_path):
+    timeline_components = pytest.importorskip("vis_tool.components.timeline_components")
+    # a video that is not coded yet
+    path_to_timeline = str(tmp_path / "new_video_timeline.txt")
+    timeline = timeline_structure.Timeline(video_name="new_video.mp4", frame_rate=25)
+    timeline.export_to_file(path_to_timeline, sidecar=False)
+    journal = coding_journal.CodingJournal(timeline, path_to_timeline, compact_idle=3600)
+    threads = [threading.Thread(target=timeline_components.update_abcs_coding, args=(timeline, frame, "EW", journal))
+               for frame in range(100, 2100, 100) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    abcs = timeline.get_abcs_coding().sort_values("Start_Frame")
+    assert len(abcs) == 20
+    assert (abcs["Start_Frame"].values[1:] > abcs["End_Frame"].values[:-1]).all()
+    restarted = load_timeline(path_to_timeline)
+    coding_journal.CodingJournal(restarted, path_to_timeline).replay()
+    assert len(restarted.get_abcs_coding()) == len(abcs)
@@ -0,0 +1,187 @@
+import os
+import json
+import numpy as np
+import pytest
+
+from analysis import event_segmentation
+from analysis import extract_objects
+from analysis import extract_interactions
+from structures import frame_archive
+
+# class names of the yolo model used by the tests, the objects of interest and their common mismatches are included
+OBJECTS_DICT = {"0": "person", "1": "cup", "2": "glass", "3": "wine glass", "4": "bottle", "5": "bowl", "6": "toilet",
+                "7": "sink", "8": "teddy bear", "9": "chair"}
+PREDICATES = extract_interactions.object_interactions + ["on", "near", "wearing"]     # the last ones are no interactions
+SEEDS = range(25)
+
+
+def reference_objects(objects_all_frames, fps, life_time_seconds):
+    # the loop of extract_objects before the vectorized segmentation, objects_all_frames is {frame: [names]}
+    active_objects = {}
+    start_end_frame_objects = {}
+    lifetime = life_time_seconds * fps *4
+    for key in sorted(objects_all_frames.keys()):
+        for object in objects_all_frames[key]:
+            if object not in active_objects.keys():
+                start_end_frame_objects[object] = [[key, key + lifetime]]
+                active_objects[object] = key
+            elif key - active_objects[object] <= lifetime:
+                if start_end_frame_objects[object][-1][1] < key:
+                    start_end_frame_objects[object][-1][1] = key
+                active_objects[object] = key
+            else:
+                start_end_frame_objects[object].append([key, key + lifetime])
+                active_objects[object] = key
+    return start_end_frame_objects
+
+
+def reference_interactions(interactions_all_frames, fps, life_time_seconds):
+    # the loop of extract_object_interactions_events before the vectorized segmentation, interactions_all_frames is
+    # {frame: [[subject, predicate, object]]} with the interaction predicates only
+    active_interactions = {}
+    start_frame_interaction = {}
+    lifetime = life_time_seconds * fps
+    for key in sorted(interactions_all_frames.keys()):
+        for interaction in interactions_all_frames[key]:
+            if interaction[1] not in active_interactions.keys():
+                start_frame_interaction[key] = interaction[1:]
+                active_interactions[interaction[1]] = key
+            elif key - active_interactions[interaction[1]] <= lifetime:
+                active_interactions[interaction[1]] = key
+            else:
+                start_frame_interaction[key] = interaction[1:]
+                active_interactions[interaction[1]] = key
+    return start_frame_interaction
+
+
+def reference_segments(frames, labels, gap, min_duration):
+    # one event per run of a label whose observations are at most gap (of the later observation) frames apart
+    events = []
+    for label in sorted(set(labels)):
+        rows = sorted((frame, row) for row, (frame, observation_label) in enumerate(zip(frames, labels)) if observation_label == label)
+        event = None
+        for frame, row in rows:
+            if event is not None and frame - event[2] <= gap[row]:
+                event[2] = frame
+                continue
+            if event is not None:
+                events.append(event)
+            event = [label, frame, frame, row, min_duration[row]]
+        events.append(event)
+    return [(label, start, max(start + duration, end), first) for label, start, end, first, duration in events]
+
+
+def random_stream(rng, num_frames, num_labels, density):
+    # sparse bursts of observations, so the gaps are both shorter and longer than the lifetimes
+    frames = np.flatnonzero(rng.random(num_frames) < density)
+    labels = rng.integers(0, num_labels, len(frames))
+    return frames, labels
+
+
+@pytest.fixture
+def objects_dict(monkeypatch):
+    monkeypatch.setattr(extract_objects, "get_objects_dict", lambda weights=None: OBJECTS_DICT)
+    return OBJECTS_DICT
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_segment_events_per_observation_gap_and_min_duration(seed):
+    rng = np.random.default_rng(seed)
+    frames, labels = random_stream(rng, 5000, 6, 0.02)
+    # unsorted observations with duplicates and per observation gaps and min durations
+    frames = np.concatenate([frames, frames[: len(frames) // 4]])
+    labels = np.concatenate([labels, labels[: len(labels) // 4]])
+    order = rng.permutation(len(frames))
+    frames, labels = frames[order], labels[order]
+    gap = rng.integers(0, 200, len(frames))
+    min_duration = rng.integers(0, 300, len(frames))
+
+    events = event_segmentation.segment_events(frames, labels, gap=gap, min_duration=min_duration)
+    segments = list(zip(events["labels"].tolist(), events["starts"].tolist(), events["ends"].tolist(), events["first"].tolist()))
+    expected = reference_segments(frames.tolist(), labels.tolist(), gap.tolist(), min_duration.tolist())
+    assert segments == expected
+
+
+@pytest.mark.parametrize("gap, min_duration", [(0, 0), (10, 0), (0, 25), (40, 100), (1000, 1000)])
+def test_segment_events_scalar_gap_and_min_duration(gap, min_duration):
+    frames, labels = random_stream(np.random.default_rng(gap + min_duration), 20000, 4, 0.01)
+    events = event_segmentation.segment_events(frames, labels, gap=gap, min_duration=min_duration)
+    segments = list(zip(events["labels"].tolist(), events["starts"].tolist(), events["ends"].tolist(), events["first"].tolist()))
+    expected = reference_segments(frames.tolist(), labels.tolist(), [gap] * len(frames), [min_duration] * len(frames))
+    assert segments == expected
+
+
+def test_segment_events_empty():
+    events = event_segmentation.segment_events([], [], gap=10, min_duration=10)
+    assert all(len(values) == 0 for values in events.values())
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("packed", [False, True])
+def test_extract_objects_matches_loop(tmp_path, objects_dict, seed, packed):
+    rng = np.random.default_rng(seed)
+    fps, life_time_seconds = int(rng.choice([10, 25, 30])), int(rng.choice([1, 3, 10]))
+    frames, classes = random_stream(rng, 30000, len(objects_dict), 0.05)
+
+    # yolo labels, one file per frame with a detection
+    labels_dir = tmp_path / "labels"
+    labels_dir.mkdir()
+    objects_all_frames = {}
+    names = {item: name for name, items in extract_objects.objects_of_interest.items() for item in [name] + items}
+    for frame in np.unique(frames).tolist():
+        frame_classes = classes[frames == frame].tolist()
+        (labels_dir / f"video_{frame}.txt").write_text("".join(f"{cls} 0.5 0.5 0.1 0.1\n" for cls in frame_classes))
+        objects = {names[objects_dict[str(cls)]] for cls in frame_classes if objects_dict[str(cls)] in names}
+        if objects:
+            objects_all_frames[frame] = list(objects)
+
+    source = str(labels_dir)
+    if packed:
+        source = str(tmp_path / "labels.jsonl")
+        frame_archive.pack_directory(str(labels_dir), source)
+    result = extract_objects.extract_objects(source, fps=fps, life_time_seconds=life_time_seconds)
+    assert result == reference_objects(objects_all_frames, fps, life_time_seconds)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("packed", [False, True])
+def test_extract_interactions_matches_loop(tmp_path, seed, packed):
+    rng = np.random.default_rng(seed)
+    fps, life_time_seconds = int(rng.choice([10, 25, 30])), int(rng.choice([1, 3, 10]))
+    frames, _ = random_stream(rng, 20000, 1, 0.05)
+
+    # RelTR triplets, one file per sampled frame (also frames without triplets)
+    reltr_dir = tmp_path / "RelTR"
+    reltr_dir.mkdir()
+    interactions_all_frames = {}
+    for frame in frames.tolist():
+        triplets = [{"subject": {"id": "person"}, "predicate": {"id": str(rng.choice(PREDICATES))},
+                     "object": {"id": str(rng.choice(["cup", "bottle", "ball", "table"]))}} for _ in range(rng.integers(0, 4))]
+        (reltr_dir / f"video_{frame}.json").write_text(json.dumps(triplets))
+        interactions_all_frames[frame] = [[triplet["subject"]["id"], triplet["predicate"]["id"], triplet["object"]["id"]]
+                                          for triplet in triplets if triplet["predicate"]["id"] in extract_interactions.object_interactions]
+
+    source = str(reltr_dir)
+    if packed:
+        source = str(tmp_path / "RelTR.jsonl")
+        frame_archive.pack_directory(str(reltr_dir), source)
+    result = extract_interactions.extract_object_interactions_events(source, fps=fps, life_time_seconds=life_time_seconds)
+    assert result == reference_interactions(interactions_all_frames, fps, life_time_seconds)
+
+
+def test_presence_matrix_is_reused_without_labels(tmp_path, objects_dict):
+    frames, classes = random_stream(np.random.default_rng(0), 3000, len(objects_dict), 0.05)
+    source = str(tmp_path / "labels.jsonl")
+    labels_dir = tmp_path / "labels"
+    labels_dir.mkdir()
+    for frame in np.unique(frames).tolist():
+        (labels_dir / f"video_{frame}.txt").write_text("".join(f"{cls} 0.5 0.5 0.1 0.1\n" for cls in classes[frames == frame].tolist()))
+    frame_archive.pack_directory(str(labels_dir), source)
+    path_to_presence = str(tmp_path / "presence.npz")
+    expected = extract_objects.extract_objects(source, fps=25, life_time_seconds=3, path_to_presence=path_to_presence)
+
+    # the runs folder with the labels is removed at the end of a run, the objects are aggregated from the saved matrix
+    os.remove(source)
+    assert extract_objects.extract_objects(source, fps=25, life_time_seconds=1, path_to_presence=path_to_presence) == \
+        extract_objects.aggregate_objects(extract_objects.build_presence_matrix(str(labels_dir)), fps=25, life_time_seconds=1)
+    assert extract_objects.extract_objects(source, fps=25, life_time_seconds=3, path_to_presence=path_to_presence) == expected
@@ -0,0 +1,80 @@
+import os
+import json
+import threading
+import numpy as np
+import pytest
+
+from structures import frame_archive
+
+
+@pytest.fixture
+def frames_dir(tmp_path):
+    # per frame files of the three tools, written out of order and with gaps in the frame numbers
+    directory = tmp_path / "outputs"
+    directory.mkdir()
+    records = {}
+    for frame in [12, 3, 100, 7, 1000]:
+        records[frame] = {"people": [{"pose_keypoints_2d": [frame, 1.5, 0.5]}], "frame": frame}
+        (directory / f"video_{frame:012d}_keypoints.json").write_text(json.dumps(records[frame]))
+    return directory, records
+
+
+def test_frame_number():
+    assert frame_archive.frame_number("video_12.txt") == 12
+    assert frame_archive.frame_number("my_video_7.json") == 7
+    assert frame_archive.frame_number("video_000000000042_keypoints.json") == 42
+
+
+def test_pack_round_trip(tmp_path, frames_dir):
+    directory, records = frames_dir
+    path_to_archive = str(tmp_path / "openpose.jsonl")
+    frame_archive.pack_directory(str(directory), path_to_archive)
+
+    # the index holds the frame, offset and length of every record in frame order
+    index = np.load(frame_archive.index_path(path_to_archive))
+    assert frame_archive.index_path(path_to_archive).endswith(".idx.npy")
+    assert index[:, 0].tolist() == sorted(records)
+    assert index[0, 1] == 0 and (index[1:, 1] == index[:-1, 1] + index[:-1, 2]).all()
+    assert index[-1, 1] + index[-1, 2] == os.path.getsize(path_to_archive)
+
+    archive = frame_archive.FrameArchive(path_to_archive)
+    assert len(archive) == len(records)
+    assert list(archive) == [(frame, records[frame]) for frame in sorted(records)]
+    assert list(frame_archive.iter_frames(path_to_archive)) == list(frame_archive.iter_frames(str(directory)))
+    for frame in [1000, 3, 12]:
+        assert archive.read(frame) == records[frame]
+    with pytest.raises(KeyError):
+        archive.read(4)
+    with pytest.raises(KeyError):
+        archive.read(2000)
+
+
+def test_pack_text_files_and_remove(tmp_path):
+    directory = tmp_path / "labels"
+    directory.mkdir()
+    (directory / "video_2.txt").write_text("1 0.5 0.5 0.1 0.1\n")
+    (directory / "video_10.txt").write_text("0 0.5 0.5 0.2 0.2\n9 0.1 0.1 0.1 0.1\n")
+    path_to_archive = str(tmp_path / "labels.jsonl")
+    frame_archive.pack_directory(str(directory), path_to_archive, remove=True)
+
+    assert not directory.exists()
+    assert list(frame_archive.iter_frames(path_to_archive)) == [(2, "1 0.5 0.5 0.1 0.1\n"), (10, "0 0.5 0.5 0.2 0.2\n9 0.1 0.1 0.1 0.1\n")]
+    assert frame_archive.is_archive(path_to_archive) and not frame_archive.is_archive(str(directory))
+
+
+def test_pack_missing_directory(tmp_path):
+    path_to_archive = str(tmp_path / "detect" / "labels.jsonl")
+    frame_archive.pack_directory(str(tmp_path / "missing"), path_to_archive)
+    archive = frame_archive.FrameArchive(path_to_archive)
+    assert len(archive) == 0 and list(archive) == []
+    assert sorted(os.listdir(str(tmp_path / "detect"))) == ["labels.idx.npy", "labels.jsonl"]
+
+
+def test_follow_frames(tmp_path, frames_dir):
+    directory, records = frames_dir
+    finished = threading.Event()
+    followed = frame_archive.follow_frames(str(directory), finished, poll_interval=0.01)
+    # the newest file could still be written, it is only read once a later file exists or the tool finished
+    assert [next(followed)[0] for _ in range(len(records) - 1)] == sorted(records)[:-1]
+    finished.set()
+    assert list(followed) == [(1000, records[1000])]
@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+import pytest
+
+IMPORT_BUDGET_SECONDS = 2.0     # max time allowed for "import alva" in a fresh interpreter
+
+HEAVY_MODULES = ["torch", "ultralytics"]    # should only be imported once a model is actually needed
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import alva
+print(time.perf_counter() - start)
+print(" ".join(m for m in %r if m in sys.modules))
+""" % HEAVY_MODULES
+
+
+@pytest.fixture(scope="module")
+def import_alva():
+    # alva.py needs the full environment, the budget is only meaningful if the heavy modules could be imported
+    for module in ["cv2", "torch", "ultralytics"]:
+        pytest.importorskip(module)
+    # a fresh interpreter, otherwise the modules are already cached
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode and "ModuleNotFoundError" in result.stderr:
+        pytest.skip("alva.py can not be imported: " + result.stderr.strip().splitlines()[-1])
+    assert result.returncode == 0, result.stderr
+    output = result.stdout.splitlines()
+    return float(output[-2]), output[-1].split()
+
+
+def test_import_within_budget(import_alva):
+    seconds, _ = import_alva
+    assert seconds <= IMPORT_BUDGET_SECONDS, f"import alva took {seconds:.3f}s (budget {IMPORT_BUDGET_SECONDS:.1f}s)"
+
+
+def test_models_are_imported_lazily(import_alva):
+    _, heavy = import_alva
+    assert not heavy, f"imported eagerly: {' '.join(heavy)}"
@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import socket
+import threading
+import subprocess
+import sys
+import pytest
+
+from modules import inference_backend
+
+
+@pytest.fixture
+def weights(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_backend, "EXPORT_LOCK_POLL_INTERVAL", 0.01)
+    path = str(tmp_path / "yolov8n.pt")
+    open(path, "wb").close()
+    return path
+
+
+def write_lock(weights, pid, age=0.0):
+    with open(weights + ".export.lock", "w") as f:
+        json.dump({"pid": pid, "host": socket.gethostname(), "time": time.time() - age}, f)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_lock_is_exclusive(weights):
+    inside = []
+    def export():
+        with inference_backend.export_lock(weights):
+            inside.append(1)
+            assert len(inside) == 1
+            time.sleep(0.05)
+            inside.pop()
+    threads = [threading.Thread(target=export) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not os.path.exists(weights + ".export.lock")
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the pid of the holder is only checked on posix")
+def test_lock_of_killed_job_is_broken(weights):
+    write_lock(weights, dead_pid())
+    start = time.monotonic()
+    with inference_backend.export_lock(weights):
+        with open(weights + ".export.lock") as f:
+            assert json.load(f)["pid"] == os.getpid()
+    assert time.monotonic() - start < 5
+
+
+def test_old_lock_is_broken(weights):
+    write_lock(weights, os.getpid(), age=inference_backend.EXPORT_LOCK_MAX_AGE + 1)
+    with inference_backend.export_lock(weights):
+        pass
+    assert not os.path.exists(weights + ".export.lock")
+
+
+def test_lock_of_running_job_is_kept(weights):
+    # the holder is this process, which is still running
+    write_lock(weights, os.getpid())
+    acquired = threading.Event()
+    def export():
+        with inference_backend.export_lock(weights):
+            acquired.set()
+    thread = threading.Thread(target=export)
+    thread.start()
+    assert not acquired.wait(0.2)
+    os.remove(weights + ".export.lock")
+    assert acquired.wait(5)
+    thread.join()
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+
+from structures import keypoints_structure
+
+
+def random_person(seed, num_frames=500):
+    rng = np.random.default_rng(seed)
+    keypoints = rng.uniform(0, 1000, (25, 2, num_frames))
+    confidence = rng.uniform(0, 1, (25, num_frames))
+    confidence[rng.random((25, num_frames)) < 0.2] = 0
+    # the person leaves the video for the last frames
+    keypoints[:, :, -100:] = np.nan
+    bbox = np.concatenate([np.nanmin(keypoints[:, :, :-100], axis=0), np.nanmax(keypoints[:, :, :-100], axis=0)])
+    bbox = np.concatenate([bbox, np.full((4, 100), np.nan)], axis=1)
+    return keypoints, confidence, bbox
+
+
+def test_save_load_round_trip(tmp_path):
+    keypoints, confidence, bbox = random_person(0)
+    keypoints_structure.save_keypoints(keypoints, confidence, bbox, str(tmp_path), "child", fps=25)
+    data = keypoints_structure.load_keypoints(str(tmp_path), "child")
+
+    expected = keypoints.astype(np.float32)
+    expected[np.broadcast_to((confidence == 0)[:, None, :], expected.shape)] = np.nan
+    assert np.array_equal(data["keypoints"], expected, equal_nan=True)
+    # the confidence is quantized to uint8
+    assert np.abs(data["confidence"] - confidence).max() <= 0.5 / keypoints_structure.CONFIDENCE_SCALE + 1e-6
+    assert data["present"].tolist() == [True] * 400 + [False] * 100
+    assert np.array_equal(data["bbox"], bbox.astype(np.float32), equal_nan=True)
+    assert data["meta"]["version"] == keypoints_structure.FORMAT_VERSION and data["meta"]["fps"] == 25
+
+
+def test_frames_are_memory_mapped(tmp_path):
+    keypoints, confidence, bbox = random_person(1)
+    keypoints_structure.save_keypoints(keypoints, confidence, bbox, str(tmp_path), "child")
+    frames = keypoints_structure.load_keypoints_frames(str(tmp_path), "child")
+
+    assert isinstance(frames, np.memmap) and frames.shape == (500, 25, 2) and frames.dtype == np.float32
+    expected = keypoints.transpose(2, 0, 1).astype(np.float32)
+    expected[confidence.T == 0] = np.nan
+    assert np.array_equal(frames, expected, equal_nan=True)
+    # the coordinates are the largest part of the container, the other members are compressed
+    assert os.path.getsize(str(tmp_path / "child.npz")) < 500 * (25 * 2 * 4 + 25 + 16) + 4096
+
+
+def test_legacy_files_are_converted(tmp_path):
+    keypoints, _, bbox = random_person(2)
+    keypoints = np.nan_to_num(keypoints)
+    keypoints_structure.save_numpy_keypoints_bbox(keypoints, bbox, str(tmp_path), "therapist")
+    frames = keypoints_structure.load_keypoints_frames(str(tmp_path), "therapist")
+
+    assert np.array_equal(frames[:400], keypoints.transpose(2, 0, 1)[:400].astype(np.float32))
+    loaded, loaded_bbox = keypoints_structure.load_numpy_keypoints_bbox(str(tmp_path), "therapist")
+    assert np.array_equal(loaded[:, :, :400], keypoints[:, :, :400].astype(np.float32))
@@ -0,0 +1,97 @@
+import os
+import pytest
+
+from utils import stage_cache
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"frames of the video")
+    return tmp_path, str(video)
+
+
+def make_stage(tmp_path, calls):
+    # a stage that writes a file and a folder and counts how often it ran
+    outputs = {"labels": str(tmp_path / "runs" / "labels.jsonl"), "frames": str(tmp_path / "runs" / "frames")}
+
+    def run():
+        calls.append(1)
+        os.makedirs(outputs["frames"], exist_ok=True)
+        with open(outputs["labels"], "w") as f:
+            f.write("run %d\n" % len(calls))
+        with open(os.path.join(outputs["frames"], "frame_1.txt"), "w") as f:
+            f.write("frame\n")
+    return outputs, run
+
+
+def run_stage(tmp_path, video, params, calls, cache_dir):
+    outputs, run = make_stage(tmp_path, calls)
+    lineage = {"video": stage_cache.hash_file(video)}
+    return stage_cache.run_cached("detect", lineage, params, outputs, run, cache_dir=cache_dir), outputs
+
+
+def test_miss_then_hit(workspace):
+    tmp_path, video = workspace
+    cache_dir, calls = str(tmp_path / "cache"), []
+    params = {"backend": "onnx", "int8": False, "input": "video"}
+
+    restored, outputs = run_stage(tmp_path, video, params, calls, cache_dir)
+    assert not restored and len(calls) == 1
+    assert len(stage_cache.list_entries(cache_dir)) == 1
+
+    # the outputs of the run are gone (alva.py cleans up the runs folder), they are restored from the cache
+    os.remove(outputs["labels"])
+    os.remove(os.path.join(outputs["frames"], "frame_1.txt"))
+    restored, outputs = run_stage(tmp_path, video, params, calls, cache_dir)
+    assert restored and len(calls) == 1
+    with open(outputs["labels"]) as f:
+        assert f.read() == "run 1\n"
+    assert os.listdir(outputs["frames"]) == ["frame_1.txt"]
+
+
+@pytest.mark.parametrize("change", ["video", "params"])
+def test_changed_inputs_miss(workspace, change):
+    tmp_path, video = workspace
+    cache_dir, calls = str(tmp_path / "cache"), []
+    params = {"backend": "onnx", "int8": False, "input": "video"}
+    run_stage(tmp_path, video, params, calls, cache_dir)
+
+    if change == "video":
+        with open(video, "ab") as f:
+            f.write(b" and one more")
+    else:
+        params = dict(params, int8=True)
+    restored, _ = run_stage(tmp_path, video, params, calls, cache_dir)
+    assert not restored and len(calls) == 2
+    assert len(stage_cache.list_entries(cache_dir)) == 2
+
+
+def test_key_depends_on_lineage_stage_and_params():
+    key = stage_cache.stage_key({"video": "abc"}, "detect", {"backend": "onnx", "int8": False})
+    assert key == stage_cache.stage_key({"video": "abc"}, "detect", {"int8": False, "backend": "onnx"})
+    assert key != stage_cache.stage_key({"video": "abc", "reduce_fps": 10}, "detect", {"backend": "onnx", "int8": False})
+    assert key != stage_cache.stage_key({"video": "abc"}, "RelTR", {"backend": "onnx", "int8": False})
+    assert key != stage_cache.stage_key({"video": "abc"}, "detect", {"backend": "cuda", "int8": False})
+
+
+def test_missing_outputs_are_not_stored(workspace):
+    tmp_path, video = workspace
+    cache_dir = str(tmp_path / "cache")
+    outputs = {"labels": str(tmp_path / "runs" / "labels.jsonl")}
+    key = stage_cache.stage_key({"video": stage_cache.hash_file(video)}, "detect", {})
+    assert not stage_cache.store(key, "detect", outputs, cache_dir=cache_dir)
+    assert stage_cache.lookup(key, cache_dir) is None
+    assert not stage_cache.restore(key, outputs, cache_dir)
+
+
+def test_evict(workspace):
+    tmp_path, video = workspace
+    cache_dir, calls = str(tmp_path / "cache"), []
+    run_stage(tmp_path, video, {"int8": False}, calls, cache_dir)
+    run_stage(tmp_path, video, {"int8": True}, calls, cache_dir)
+    assert stage_cache.evict(cache_dir, stage="RelTR") == 0
+    assert stage_cache.evict(cache_dir, older_than_days=1) == 0
+    assert len(stage_cache.list_entries(cache_dir)) == 2
+    assert stage_cache.evict(cache_dir, stage="detect") > 0
+    assert stage_cache.list_entries(cache_dir) == []
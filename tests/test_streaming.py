@@ -0,0 +1,103 @@
+import os
+import json
+import numpy as np
+import pytest
+
+# the keypoint extraction imports matplotlib for its plots
+pytest.importorskip("matplotlib")
+
+from analysis import streaming
+from analysis import event_segmentation
+from analysis import extract_objects
+from analysis import extract_interactions
+from structures import timeline_structure
+from structures import keypoints_structure
+
+OBJECTS_DICT = {"0": "person", "1": "cup", "2": "glass", "3": "wine glass", "4": "bottle", "5": "bowl", "6": "toilet",
+                "7": "sink", "8": "teddy bear", "9": "chair"}
+PREDICATES = extract_interactions.object_interactions + ["on", "near"]
+
+
+@pytest.fixture
+def objects_dict(monkeypatch):
+    monkeypatch.setattr(extract_objects, "get_objects_dict", lambda weights=None: OBJECTS_DICT)
+    return OBJECTS_DICT
+
+
+def random_detections(seed, num_frames=20000):
+    # bursts of detections, so the gaps are both shorter and longer than the lifetime
+    rng = np.random.default_rng(seed)
+    frames = np.flatnonzero(rng.random(num_frames) < 0.03)
+    return [(frame, rng.integers(0, len(OBJECTS_DICT), rng.integers(1, 4))) for frame in frames.tolist()]
+
+
+def presence_matrix(detections):
+    presence = np.zeros((detections[-1][0] + 1, len(OBJECTS_DICT)), dtype=bool)
+    for frame, classes in detections:
+        presence[frame, classes] = True
+    return presence
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("fps, life_time_seconds", [(25, 1), (30, 3), (10, 10)])
+def test_object_builder_matches_segment_events(objects_dict, seed, fps, life_time_seconds):
+    detections = random_detections(seed)
+    builder = streaming.ObjectEventBuilder(fps, life_time_seconds)
+    for count, (frame, classes) in enumerate(detections, 1):
+        builder.update(frame, classes)
+        # the partial result equals the batch result of the frames so far
+        if count in [1, len(detections) // 2]:
+            assert builder.events() == extract_objects.aggregate_objects(presence_matrix(detections[:count]), fps, life_time_seconds)
+    assert builder.events() == extract_objects.aggregate_objects(presence_matrix(detections), fps, life_time_seconds)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("life_time_seconds", [1, 3])
+def test_interaction_builder_matches_batch(tmp_path, seed, life_time_seconds):
+    rng = np.random.default_rng(seed)
+    reltr_dir = tmp_path / "RelTR"
+    reltr_dir.mkdir()
+    builder = streaming.InteractionEventBuilder(25, life_time_seconds)
+    for frame in np.flatnonzero(rng.random(5000) < 0.05).tolist():
+        triplets = [{"subject": {"id": "person"}, "predicate": {"id": str(rng.choice(PREDICATES))},
+                     "object": {"id": str(rng.choice(["cup", "bottle", "ball"]))}} for _ in range(rng.integers(0, 4))]
+        (reltr_dir / f"video_{frame}.json").write_text(json.dumps(triplets))
+        builder.update(frame, triplets)
+    assert builder.events() == extract_interactions.extract_object_interactions_events(str(reltr_dir), fps=25, life_time_seconds=life_time_seconds)
+
+
+def openpose_frame(people):
+    return {"people": [{"pose_keypoints_2d": np.c_[np.linspace(x, x + 100, 25), np.linspace(0, scale, 25), np.ones(25)].ravel().tolist()}
+                       for x, scale in people]}
+
+
+def test_checkpoint_writes_partial_results(tmp_path, objects_dict):
+    timeline = timeline_structure.Timeline(video_name="video.mp4", frame_rate=25)
+    path_to_assets = str(tmp_path / "video")
+    analysis = streaming.StreamingAnalysis(timeline, path_to_assets, objects=True, interactions=True, keypoints=True,
+                                           checkpoint_seconds=3600)
+    detections = random_detections(0, 2000)
+    for frame, classes in detections:
+        analysis.on_detections(frame, classes)
+    analysis.on_triplets(10, [{"subject": {"id": "person"}, "predicate": {"id": "holding"}, "object": {"id": "cup"}}])
+    for frame in range(50):
+        # a small child and a big therapist
+        analysis.on_keypoints(frame, openpose_frame([(100 + frame, 100), (600, 400)]))
+    analysis.checkpoint()
+
+    exported = timeline_structure.Timeline()
+    exported.import_from_file(analysis.path_to_timeline, use_sidecar=False)
+    expected = timeline_structure.insert_events(
+        timeline_structure.Timeline(video_name="video.mp4", frame_rate=25),
+        objects=extract_objects.aggregate_objects(presence_matrix(detections), 25, streaming.OBJECT_LIFE_TIME_SECONDS),
+        interactions={10: ["holding", "cup"]})
+    for get_table in ["get_objects", "get_object_interactions"]:
+        assert getattr(exported, get_table)().values.tolist() == getattr(expected, get_table)().values.tolist()
+    # the partial timeline does not change the timeline of the run
+    assert timeline.get_objects().empty
+
+    child = keypoints_structure.load_keypoints(analysis.path_to_keypoints, "child")
+    therapist = keypoints_structure.load_keypoints(analysis.path_to_keypoints, "therapist")
+    assert child["keypoints"].shape == (25, 2, 50) and therapist["keypoints"].shape == (25, 2, 50)
+    assert child["keypoints"][0, 0].tolist() == [100 + frame for frame in range(50)]
+    assert (therapist["keypoints"][0, 0] == 600).all()
@@ -0,0 +1,74 @@
+import json
+import numpy as np
+import pytest
+
+from analysis import sweep
+from analysis import extract_objects
+from analysis import extract_interactions
+from structures import frame_archive
+
+OBJECTS_DICT = {"0": "person", "1": "cup", "2": "glass", "3": "bottle", "4": "teddy bear"}
+
+
+@pytest.fixture
+def objects_dict(monkeypatch):
+    monkeypatch.setattr(extract_objects, "get_objects_dict", lambda weights=None: OBJECTS_DICT)
+    return OBJECTS_DICT
+
+
+@pytest.fixture
+def cache(tmp_path, objects_dict):
+    rng = np.random.default_rng(0)
+    labels_dir, reltr_dir = tmp_path / "labels", tmp_path / "RelTR"
+    labels_dir.mkdir()
+    reltr_dir.mkdir()
+    for frame in np.flatnonzero(rng.random(3000) < 0.05).tolist():
+        (labels_dir / f"video_{frame}.txt").write_text("".join(f"{cls} 0.5 0.5 0.1 0.1\n" for cls in rng.integers(0, 5, 2).tolist()))
+        triplets = [{"subject": {"id": "person", "score": 0.9}, "predicate": {"id": str(rng.choice(["holding", "on", "touching"])), "score": 0.8},
+                     "object": {"id": "cup", "score": float(rng.uniform(0.2, 1))}}]
+        (reltr_dir / f"video_{frame}.json").write_text(json.dumps(triplets))
+    path_to_cache = str(tmp_path / "presence.npz")
+    sweep.build_presence_cache(path_to_cache, labels=str(labels_dir), reltr=str(reltr_dir))
+    return path_to_cache, str(labels_dir), str(reltr_dir)
+
+
+def test_sweep_without_settings(cache):
+    path_to_cache, _, _ = cache
+    assert sweep.sweep(path_to_cache, 25, [], []) == []
+    data = sweep.load_presence_cache(path_to_cache)
+    assert sweep.sweep_objects(data, 25, []) == []
+    assert sweep.sweep_interactions(data, 25, []) == []
+
+
+def test_sweep_without_matches(cache):
+    path_to_cache, _, _ = cache
+    data = sweep.load_presence_cache(path_to_cache)
+    # no detection or triplet has a confidence above 1
+    assert sweep.sweep_objects(data, 25, [(3, 1.1), (10, 1.1)]) == [{}, {}]
+    assert sweep.sweep_interactions(data, 25, [(3, 1.1), (10, 1.1)]) == [{}, {}]
+    # a video without detections and triplets
+    assert sweep.sweep_objects({}, 25, [(3, 0.0)]) == [{}]
+    assert sweep.sweep_interactions({"triplet_frames": np.empty(0, dtype=np.int32), "triplet_ids": np.empty((0, 3), dtype=np.int32),
+                                     "triplet_scores": np.empty((0, 3), dtype=np.float32), "triplet_names": []}, 25, [(3, 0.0)]) == [{}]
+
+
+def test_sweep_matches_extraction(cache):
+    path_to_cache, labels_dir, reltr_dir = cache
+    results = sweep.sweep(path_to_cache, 25, [(1, 0.0), (10, 0.0)], [(3, 0.0)])
+    for (setting, objects, interactions) in results:
+        assert objects == extract_objects.extract_objects(labels_dir, fps=25, life_time_seconds=setting["object_life_time_seconds"])
+        assert interactions == extract_interactions.extract_object_interactions_events(reltr_dir, fps=25, life_time_seconds=3)
+
+
+def test_presence_matrix_is_read_from_the_cache(cache, tmp_path):
+    path_to_cache, labels_dir, _ = cache
+    packed = str(tmp_path / "labels.jsonl")
+    frame_archive.pack_directory(labels_dir, packed)
+    sweep.build_presence_cache(path_to_cache, labels=packed, reltr=str(tmp_path / "RelTR"))
+    presence = extract_objects.build_presence_matrix(packed)
+
+    # the objects are aggregated from the cache, also once the labels are removed, and the triplets are kept
+    assert np.array_equal(extract_objects.load_presence_matrix(packed, path_to_cache), presence)
+    (tmp_path / "labels.jsonl").unlink()
+    assert np.array_equal(extract_objects.load_presence_matrix(packed, path_to_cache), presence)
+    assert "triplet_frames" in sweep.load_presence_cache(path_to_cache)
@@ -0,0 +1,170 @@
+import os
+import numpy as np
+import pytest
+
+from structures import timeline_structure
+
+EXAMPLE_TIMELINE = os.path.join(os.path.dirname(__file__), "..", "structures", "example_video.txt")
+
+
+def random_intervals(rng, num_intervals, max_length):
+    starts = rng.integers(0, 5000, num_intervals)
+    return starts, starts + rng.integers(0, max_length, num_intervals)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_interval_index_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    starts, ends = random_intervals(rng, int(rng.integers(0, 500)), int(rng.choice([10, 300, 6000])))
+    index = timeline_structure.IntervalIndex(starts, ends)
+    for _ in range(50):
+        start = int(rng.integers(-100, 5200))
+        end = start + int(rng.integers(0, 400))
+        assert index.overlapping(start, end).tolist() == np.flatnonzero((starts <= end) & (ends >= start)).tolist()
+        assert index.within(start, end).tolist() == np.flatnonzero((starts >= start) & (ends <= end)).tolist()
+        assert index.at(start).tolist() == np.flatnonzero((starts <= start) & (ends >= start)).tolist()
+
+
+def test_interval_index_long_interval_does_not_scan_all_rows():
+    # short intervals over a two hour video and one object that is seen during the whole video
+    rng = np.random.default_rng(0)
+    total_frames = 2 * 3600 * 25
+    starts = np.sort(rng.integers(0, total_frames, 100000))
+    ends = starts + rng.integers(25, 250, len(starts))
+    starts[0], ends[0] = 0, total_frames
+    index = timeline_structure.IntervalIndex(starts, ends)
+
+    for frame in rng.integers(0, total_frames, 200).tolist():
+        rows = index.at(frame)
+        assert 0 in rows.tolist()
+        # only the returned rows and at most one leaf are looked at
+        assert index.last_scanned <= len(rows) + timeline_structure.IntervalIndex.LEAF_SIZE
+        rows = index.overlapping(frame, frame + 250)
+        assert index.last_scanned <= len(rows) + timeline_structure.IntervalIndex.LEAF_SIZE
+
+
+def test_timeline_queries_on_example_file():
+    timeline = timeline_structure.Timeline()
+    timeline.import_from_file(EXAMPLE_TIMELINE, use_sidecar=False)
+    objects = timeline.get_objects()
+    # the chair is seen during the whole video, the other objects only for a while
+    assert ((objects["Start_Frame"] == 0) & (objects["End_Frame"] == objects["End_Frame"].max())).any()
+    for frame in range(0, int(objects["End_Frame"].max()) + 1, 500):
+        expected = objects[(objects["Start_Frame"] <= frame) & (objects["End_Frame"] >= frame)]
+        assert timeline.get_objects_at(frame).equals(expected)
+
+
+def random_timeline(seed, frame_rate):
+    rng = np.random.default_rng(seed)
+    timeline = timeline_structure.Timeline(video_name="video.mp4", duration="01:00:00", frame_width=1280, frame_height=720,
+                                           frame_rate=frame_rate, total_frames=107892, date_recorded="2023-01-01",
+                                           author="ALVA", date_coding="2023-01-02")
+    starts = rng.integers(0, 107892, 300)
+    timeline.add_objects((int(start), int(start + length), name) for start, length, name in
+                         zip(starts, rng.integers(0, 5000, 300), rng.choice(["chair", "cup", "teddy bear"], 300)))
+    timeline.add_object_interactions((int(frame), "Is " + predicate + " cup.") for frame, predicate in
+                                     zip(rng.integers(0, 107892, 200), rng.choice(["holding", "touching"], 200)))
+    # empty comments and comments with spaces
+    timeline.add_abcs_codings((int(start), int(start + 29), variable, comment) for start, variable, comment in
+                              zip(range(0, 3000, 30), rng.choice(["EW", "UN", "RB"], 100), rng.choice(["", "", "looks at the cup"], 100)))
+    return timeline
+
+
+def assert_same_tables(timeline, imported):
+    for get_table in ["get_objects", "get_object_interactions", "get_abcs_coding"]:
+        expected, actual = getattr(timeline, get_table)(), getattr(imported, get_table)()
+        assert list(actual.columns) == list(expected.columns)
+        for column in expected.columns:
+            assert actual[column].tolist() == expected[column].tolist(), (get_table, column)
+
+
+@pytest.mark.parametrize("frame_rate", [25, 29.97])
+def test_export_import_round_trip(tmp_path, frame_rate):
+    timeline = random_timeline(0, frame_rate)
+    path_to_file = str(tmp_path / "video_timeline.txt")
+    timeline.export_to_file(path_to_file, sidecar=False)
+
+    imported = timeline_structure.Timeline()
+    imported.import_from_file(path_to_file, use_sidecar=False)
+    assert_same_tables(timeline, imported)
+    assert imported.get_frame_rate() == str(frame_rate)
+    assert imported.get_video_name() == "video.mp4"
+
+    # the times in the file are the frames at the frame rate of the timeline
+    with open(path_to_file) as file:
+        text = file.read()
+    frame = int(timeline.get_objects()["Start_Frame"].iloc[0])
+    seconds = frame / frame_rate
+    assert "%02d:%02d:%06.3f" % (seconds // 3600, seconds % 3600 // 60, seconds % 60) in text
+    assert "\t\t\t\t\t\n" in text
+
+
+def test_export_import_sidecar(tmp_path):
+    pytest.importorskip("pyarrow")
+    timeline = random_timeline(1, 29.97)
+    path_to_file = str(tmp_path / "video_timeline.txt")
+    timeline.export_to_file(path_to_file)
+    assert timeline_structure.load_sidecar_meta(path_to_file) is not None
+
+    imported = timeline_structure.Timeline()
+    imported.import_from_file(path_to_file)
+    assert imported._sources
+    assert_same_tables(timeline, imported)
+    assert imported.get_frame_rate() == "29.97"
+
+    # a changed timeline file is parsed again instead of using the outdated sidecar
+    timeline.add_abcs_coding(5000, 5029, "OT", "")
+    timeline.export_to_file(path_to_file, sidecar=False)
+    imported = timeline_structure.Timeline()
+    imported.import_from_file(path_to_file)
+    assert not imported._sources
+    assert_same_tables(timeline, imported)
+
+
+@pytest.mark.parametrize("failing", ["fsync", "replace"])
+def test_failed_export_keeps_previous_file(tmp_path, monkeypatch, failing):
+    path_to_file = str(tmp_path / "video_timeline.txt")
+    timeline = random_timeline(2, 25)
+    timeline.export_to_file(path_to_file, sidecar=False)
+    with open(path_to_file, "rb") as file:
+        previous = file.read()
+
+    def fail(*args):
+        raise OSError("No space left on device")
+
+    timeline.add_abcs_coding(5000, 5029, "OT", "")
+    monkeypatch.setattr(os, failing, fail)
+    with pytest.raises(OSError):
+        timeline.export_to_file(path_to_file, sidecar=False)
+    monkeypatch.undo()
+    with open(path_to_file, "rb") as file:
+        assert file.read() == previous
+    # the temporary file is removed
+    assert os.listdir(str(tmp_path)) == ["video_timeline.txt"]
+
+
+def test_exports_use_their_own_temporary_files(tmp_path):
+    path_to_file = str(tmp_path / "video_timeline.txt")
+    with timeline_structure.atomic_write(path_to_file) as first, timeline_structure.atomic_write(path_to_file) as second:
+        assert first.name != second.name
+        first.write("first")
+        second.write("second")
+    # the writer that finished last replaced the file
+    with open(path_to_file) as file:
+        assert file.read() == "first"
+    assert os.listdir(str(tmp_path)) == ["video_timeline.txt"]
+
+
+@pytest.mark.parametrize("frame_rate", [25, 29.97])
+def test_format_rows_matches_row_formatting(frame_rate):
+    rng = np.random.default_rng(3)
+    frames = rng.integers(0, 10 * 3600 * 25, 1000)
+    names = rng.choice(["chair", "teddy bear", "", "Stühle", "50% cup"], 1000).tolist()
+    times = timeline_structure.frames_to_times(frames, frame_rate)
+    expected = "".join("%s\t\t%s\t\t\t%s\n" % row for row in zip(times, names, names))
+    assert timeline_structure.format_rows("%s\t\t%s\t\t\t%s\n", timeline_structure.time_characters(frames, frame_rate), names, names) == expected
+    assert timeline_structure.format_rows("%s\t\t%s\t\t\t%s\n", times, names, names) == expected
+    assert timeline_structure.format_rows("%s\n", []) == ""
+    # times of 100 hours and more do not fit the fixed width layout
+    assert timeline_structure.time_characters([100 * 3600 * 25], 25) is None
+    assert timeline_structure.frames_to_times([100 * 3600 * 25], 25) == ["100:00:00.000"]
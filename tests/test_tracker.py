@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from analysis import tracker
+
+MAX_AGE = 5
+
+
+def box(x_min, x_max, y_min=0, y_max=99):
+    return [x_min, y_min, x_max, y_max]
+
+
+def frame(*bboxes):
+    # keypoints of the people of one frame with the corners of their bounding boxes as the first two keypoints
+    bboxes = np.array(bboxes, dtype=np.float64).reshape(-1, 4)
+    keypoints = np.zeros((len(bboxes), 25, 3))
+    keypoints[:, 0] = np.c_[bboxes[:, :2], np.ones(len(bboxes))]
+    keypoints[:, 1] = np.c_[bboxes[:, 2:], np.ones(len(bboxes))]
+    return keypoints, bboxes
+
+
+def track_of(people_tracker, frame_index, bbox):
+    # the track that holds the person with the bounding box in the frame
+    _, tracks_bbox = people_tracker.result()
+    tracks = [track for track in range(people_tracker.num_tracks) if np.array_equal(tracks_bbox[track, frame_index], bbox)]
+    assert len(tracks) == 1
+    return tracks[0]
+
+
+def test_birth_and_death_at_max_age():
+    people_tracker = tracker.OnlineTracker(num_tracks=2, max_age=MAX_AGE)
+    people_tracker.update(*frame(box(0, 99)))
+    assert people_tracker.alive.tolist() == [True, False]
+
+    # the track is kept alive for max_age frames without the person
+    for _ in range(MAX_AGE):
+        people_tracker.update(*frame())
+    assert people_tracker.alive.tolist() == [True, False]
+    people_tracker.update(*frame())
+    assert people_tracker.alive.tolist() == [False, False]
+
+    # a person far away is born in the free slot
+    people_tracker.update(*frame(box(500, 599)))
+    assert track_of(people_tracker, MAX_AGE + 2, box(500, 599)) == 0
+    keypoints, tracks_bbox = people_tracker.result()
+    assert keypoints.shape == (2, MAX_AGE + 3, 25, 3) and tracks_bbox.shape == (2, MAX_AGE + 3, 4)
+    assert np.isnan(tracks_bbox[:, 1:MAX_AGE + 2]).all()
+
+
+def test_person_of_a_live_track_is_not_born_again():
+    people_tracker = tracker.OnlineTracker(num_tracks=2, max_age=MAX_AGE)
+    people_tracker.update(*frame(box(0, 99)))
+    for _ in range(MAX_AGE):
+        people_tracker.update(*frame())
+    # the person is back close to its last position before the track died
+    people_tracker.update(*frame(box(5, 104)))
+    assert track_of(people_tracker, MAX_AGE + 1, box(5, 104)) == 0
+    assert people_tracker.alive.tolist() == [True, False]
+
+
+def test_optimal_assignment_beats_greedy():
+    people_tracker = tracker.OnlineTracker(num_tracks=2, max_age=MAX_AGE)
+    people_tracker.update(*frame(box(0, 99), box(60, 159)))
+    first, second = track_of(people_tracker, 0, box(0, 99)), track_of(people_tracker, 0, box(60, 159))
+
+    # the first person overlaps the first track the most (iou 0.6), greedy matching would leave the second person
+    # without a track it overlaps. The optimal assignment maximizes the sum of the ious (0.48 + 0.43)
+    previous = np.array([box(0, 99), box(60, 159)], dtype=np.float64)
+    people = np.array([box(25, 124), box(-40, 59)], dtype=np.float64)
+    iou = tracker.iou_matrix(people, previous)
+    assert iou[0, 0] > iou[0, 1] > iou[1, 0] > iou[1, 1] == 0
+    people_tracker.update(*frame(*people))
+    assert track_of(people_tracker, 1, box(25, 124)) == second
+    assert track_of(people_tracker, 1, box(-40, 59)) == first
+
+
+def test_lost_track_is_taken_over_without_free_slot():
+    people_tracker = tracker.OnlineTracker(num_tracks=2, max_age=MAX_AGE)
+    people_tracker.update(*frame(box(0, 99), box(1000, 1099)))
+    therapist = track_of(people_tracker, 0, box(1000, 1099))
+
+    # the second person is missing for some frames and comes back somewhere else, there is no free slot so it takes
+    # over its lost track with the closest bounding box instead of being dropped
+    for frame_index in range(1, 4):
+        people_tracker.update(*frame(box(0, 99)))
+    people_tracker.update(*frame(box(0, 99), box(700, 799)))
+    assert track_of(people_tracker, 4, box(700, 799)) == therapist
+    assert track_of(people_tracker, 4, box(0, 99)) == 1 - therapist
+    assert people_tracker.age.tolist() == [0, 0]
+
+
+def test_track_people_matches_online_tracker():
+    rng = np.random.default_rng(0)
+    # two people walking with noise, sometimes missing
+    num_frames = 300
+    keypoints = np.zeros((num_frames, 3, 25, 3))
+    counts = np.zeros(num_frames, dtype=np.int64)
+    for frame_index in range(num_frames):
+        people = [bbox for bbox, visible in [(box(frame_index, frame_index + 99), rng.random() > 0.1),
+                                             (box(800 - frame_index, 899 - frame_index, 200, 299), rng.random() > 0.3)] if visible]
+        frame_keypoints, _ = frame(*people) if people else (np.zeros((0, 25, 3)), None)
+        keypoints[frame_index, :len(people)] = frame_keypoints
+        counts[frame_index] = len(people)
+
+    tracks, tracks_bbox = tracker.track_people(keypoints, counts, num_tracks=2, max_age=MAX_AGE)
+    people_tracker = tracker.OnlineTracker(num_tracks=2, max_age=MAX_AGE, capacity=1)
+    for frame_index in range(num_frames):
+        people_tracker.update(keypoints[frame_index, :counts[frame_index]])
+    online, online_bbox = people_tracker.result()
+    assert np.array_equal(tracks, online, equal_nan=True) and np.array_equal(tracks_bbox, online_bbox, equal_nan=True)
+    # the people never switch tracks
+    assert np.nanmax(tracks_bbox[0, :, 1]) == 0 and np.nanmin(tracks_bbox[1, :, 1]) == 200
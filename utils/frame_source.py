@@ -0,0 +1,152 @@
+import os
+import threading
+import queue
+import cv2
+import tqdm
+
+from utils.reduce_fps import frames_to_keep
+
+QUEUE_SIZE = 32     # max number of decoded frames buffered for each stage
+
+
+class FrameStage:
+    """
+    Base class for a consumer of a FrameSource. Any object with start, process and close methods can be used as a stage.
+    Every stage runs in its own thread and receives the decoded frames in order. The frames are shared between all
+    stages and must not be modified in place.
+    """
+
+    def start(self, source):
+        """
+        This function is called once before the first frame with the FrameSource that feeds the stage.
+        """
+        return
+
+    def process(self, frame_index, frame):
+        """
+        This function is called for every frame. The frame_index is the index in the (reduced) output stream.
+        """
+        return
+
+    def close(self):
+        """
+        This function is called once after the last frame has been processed.
+        """
+        return
+
+
+class VideoWriterStage(FrameStage):
+    """
+    Writes the frames of the source back to a video file, e.g. the fps reduced copy needed by file based tools like OpenPose.
+    """
+
+    def __init__(self, path_to_video):
+        self.path_to_video = path_to_video
+        self.out = None
+
+    def start(self, source):
+        self.out = cv2.VideoWriter(self.path_to_video, cv2.VideoWriter_fourcc(*'mp4v'), source.fps,
+                                   (source.frame_width, source.frame_height))
+
+    def process(self, frame_index, frame):
+        self.out.write(frame)
+
+    def close(self):
+        if self.out is not None:
+            self.out.release()
+
+
+class FrameSource:
+    """
+    Decodes a video exactly once and fans the frames out to all registered stages through bounded queues. A slow
+    stage blocks the decoder instead of letting decoded frames pile up in memory. If new_fps is given the frames
+    are reduced on the fly with the same schedule as utils/reduce_fps.py, so no intermediate video is needed.
+    """
+
+    def __init__(self, path_to_video, new_fps=None, queue_size=QUEUE_SIZE):
+        self.path_to_video = path_to_video
+        self.video_name = os.path.splitext(os.path.basename(path_to_video))[0]
+        self.queue_size = queue_size
+
+        cap = cv2.VideoCapture(path_to_video)
+        self.source_fps = cap.get(cv2.CAP_PROP_FPS)
+        self.source_frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        # check if the desired fps is smaller than the source fps other wise use source fps
+        self.fps = self.source_fps if new_fps is None or new_fps >= self.source_fps else new_fps
+        self.keep = None if self.fps == self.source_fps else frames_to_keep(self.source_frame_count, self.source_fps, self.fps).tolist()
+        self.frame_count = self.source_frame_count if self.keep is None else len(self.keep)
+
+        self.stages = []
+
+    def add_stage(self, stage):
+        self.stages.append(stage)
+        return stage
+
+    def _run_stage(self, stage, frames, errors):
+        failed = False
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            # keep draining the queue after a failure so the decoder never blocks on this stage
+            if failed:
+                continue
+            try:
+                stage.process(*item)
+            except Exception as e:
+                errors.append((stage, e))
+                failed = True
+        if not failed:
+            try:
+                stage.close()
+            except Exception as e:
+                errors.append((stage, e))
+
+    def run(self):
+        """
+        Decodes the video and feeds every frame to all stages. Raises the first exception raised by a stage.
+        """
+        errors = []
+        workers = []
+        for stage in self.stages:
+            stage.start(self)
+            frames = queue.Queue(maxsize=self.queue_size)
+            worker = threading.Thread(target=self._run_stage, args=(stage, frames, errors), daemon=True)
+            worker.start()
+            workers.append((worker, frames))
+
+        cap = cv2.VideoCapture(self.path_to_video)
+        pbar = tqdm.tqdm(total=self.frame_count, desc="Decoding", unit="frames")
+
+        source_index = 0
+        frame_index = 0
+        while frame_index < self.frame_count:
+            if not cap.grab():
+                # no further frames to read
+                break
+            # dropped frames are only grabbed, only the kept frames are retrieved
+            if self.keep is None or self.keep[frame_index] == source_index:
+                is_read, frame = cap.retrieve()
+                if not is_read:
+                    break
+                for _, frames in workers:
+                    frames.put((frame_index, frame))
+                frame_index += 1
+                pbar.update(1)
+            source_index += 1
+
+        # release the video and tell all stages that there are no more frames
+        cap.release()
+        pbar.close()
+        for worker, frames in workers:
+            frames.put(None)
+        for worker, _ in workers:
+            worker.join()
+
+        if errors:
+            raise errors[0][1]
+        return frame_index
@@ -0,0 +1,80 @@
+import os
+import sys
+
+from structures import keypoints_structure
+
+VIS_TOOL_ASSETS_PATH = os.path.join("vis_tool", "assets", "video_assets")
+
+usage_hint = """
+    Description: Converts the keypoints of all assets of the visualisation tool to the current ".npz" container,
+                 which stores the coordinates frame-major (frames, keypoints, 2) and uncompressed so oc_tool.py
+                 memory maps them.
+                 Older containers, the ".npy" files of older assets (shape (25, 2, frames)) and the separate
+                 "<name>_frames.npy" copies of earlier versions are converted, the "_frames.npy" copies are removed.
+
+    Usage: python -m utils.migrate_keypoints [Options] <path_to_assets>
+
+    Options:
+        -h, --help: Show this help message and exit
+        --remove-legacy: Remove the old ".npy" files after they have been converted
+
+    Arguments:
+        path_to_assets: Path to the video assets, defaults to ./vis_tool/assets/video_assets
+
+    Examples:
+    [1]: Convert all assets of the visualisation tool.
+         $ python -m utils.migrate_keypoints
+    [2]: Convert all assets and remove the old files.
+         $ python -m utils.migrate_keypoints ./vis_tool/assets/video_assets --remove-legacy
+"""
+
+
+def migrate_folder(path, remove_legacy=False):
+    """
+    This function is used to convert the keypoints of all people in one juxtaposition folder. Returns the names of the
+    converted people.
+    """
+    files = os.listdir(path)
+    names = {os.path.splitext(file)[0] for file in files if file.endswith(".npz")}
+    legacy = {file[:-len(".npy")] for file in files
+              if file.endswith(".npy") and not file.endswith("_bbox.npy") and not file.endswith("_frames.npy")}
+
+    for name in sorted(names | legacy):
+        # the old files and containers are converted to the current container, the bounding boxes are kept in there
+        keypoints_structure.load_keypoints_frames(path, name)
+        # the frame-major copy of earlier versions is part of the container now
+        if os.path.exists(os.path.join(path, name + "_frames.npy")):
+            os.remove(os.path.join(path, name + "_frames.npy"))
+
+        if remove_legacy and name in legacy:
+            os.remove(os.path.join(path, name + ".npy"))
+            if os.path.exists(os.path.join(path, name + "_bbox.npy")):
+                os.remove(os.path.join(path, name + "_bbox.npy"))
+    return sorted(names | legacy)
+
+
+def migrate_assets(path_to_assets=VIS_TOOL_ASSETS_PATH, remove_legacy=False):
+    for folder in sorted(os.listdir(path_to_assets)):
+        path = os.path.join(path_to_assets, folder, "juxtaposition")
+        if not os.path.isdir(path):
+            continue
+        names = migrate_folder(path, remove_legacy)
+        print(f"Migrated {folder}: {', '.join(names) if names else 'no keypoints'}")
+
+
+if __name__ == "__main__":
+    try:
+        if "-h" in sys.argv or "--help" in sys.argv:
+            print(usage_hint)
+            exit(0)
+        # read arguments
+        arguments = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        path_to_assets = arguments[0] if arguments else VIS_TOOL_ASSETS_PATH
+        remove_legacy = "--remove-legacy" in sys.argv
+
+    except Exception as e:
+        print(e)
+        print(usage_hint)
+        exit(1)
+
+    migrate_assets(path_to_assets, remove_legacy)
@@ -3,6 +3,7 @@ import cv2
 import numpy as np
 import os
 import sys
+import time
 import tqdm
 
 usage_hint = """
@@ -26,6 +27,22 @@ usage_hint = """
 """
 
 
+def frames_to_keep(frame_count, fps, new_fps):
+    # create a linspace of frame posisiton of the source video and sample it at the new framerate then extrapolate the frame indices to be saved.
+    # the indices are sorted and unique, so the frames can be matched with a single pointer while reading the video
+    return np.unique((np.arange(0, frame_count / fps, 1 / new_fps) * fps).astype(int))
+
+
+def reduced_video_path(input_video, new_fps):
+    # returns the name of the video written by reduce_fps without reducing it
+    cap = cv2.VideoCapture(input_video)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    new_fps = fps if new_fps>=fps else new_fps
+    filename, _ = os.path.splitext(input_video)
+    return filename + "_%d_fps.mp4"%(new_fps)
+
+
 def reduce_fps(input_video, new_fps, callback=False):
 
     cap = cv2.VideoCapture(input_video)
@@ -34,8 +51,7 @@ def reduce_fps(input_video, new_fps, callback=False):
     # check if the desired fps is smaller than the source fps other wise use source fps
     new_fps = fps if new_fps>=fps else new_fps
     
-    # create a linspace of frame posisiton of the source video and sample it at the new framerate then extrapolate the frame indices to be saved.
-    frames_to_save = (np.arange(0, cap.get(cv2.CAP_PROP_FRAME_COUNT)/fps, 1 / new_fps ) * fps).astype(int)
+    frames_to_save = frames_to_keep(cap.get(cv2.CAP_PROP_FRAME_COUNT), fps, new_fps)
 
     # setup progress bar
     pbar = tqdm.tqdm(total=len(frames_to_save), desc="Reducing FPS", unit="frames")
@@ -47,22 +63,35 @@ def reduce_fps(input_video, new_fps, callback=False):
     # save the new_frames into a new video
     out = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*'mp4v'), new_fps, (int(cap.get(3)), int(cap.get(4))))
 
-    # read frames of source video and save the needed frames to a new array
+    # walk through the source video with a pointer into the sorted keep schedule. frames that are dropped are only
+    # grabbed, the expensive retrieve (conversion and copy of the frame) is only done for the frames that are kept
+    frames_to_save = frames_to_save.tolist()
+    next_save = 0
     count = 0
-    while True:
-        count += 1
-        is_read, frame = cap.read()
-        if not is_read:
+    start = time.perf_counter()
+    while next_save < len(frames_to_save):
+        if not cap.grab():
             # no further frames to read
             break
-        if count in frames_to_save:
+        if count == frames_to_save[next_save]:
+            is_read, frame = cap.retrieve()
+            if not is_read:
+                break
             pbar.update(1)
             # save the frames with the correct indices 
-            out.write(frame) 
+            out.write(frame)
+            next_save += 1
+        count += 1
+    elapsed = time.perf_counter() - start
 
     # release input and output video objects
     cap.release()
     out.release()
+    pbar.close()
+
+    # report the achieved throughput
+    print("Read %d frames and wrote %d frames in %.1fs (%.1f frames/s read, %.1f frames/s written)"
+          % (count, next_save, elapsed, count / max(elapsed, 1e-9), next_save / max(elapsed, 1e-9)))
 
     # if this function has been called from a diffrent script then optionaly return the new filename
     if callback:
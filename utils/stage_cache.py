@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+
+CACHE_DIR = os.environ.get("ALVA_STAGE_CACHE", "stage_cache")  # folder of the cached stage outputs, shared by all workspaces
+CHUNK_SIZE = 1 << 20    # bytes read at once while hashing a video
+
+usage_hint = """
+    Description: Lists and evicts the cached outputs of the processing stages of alva.py. Every entry is keyed on the
+                 content hash of the input video, the stage, its parameters and the version of the model it ran with.
+
+    Usage: python -m utils.stage_cache [Options] list
+           python -m utils.stage_cache [Options] evict [--stage <stage>] [--key <key>] [--older-than <days>] [--all]
+
+    Options:
+        -h, --help: Show this help message and exit
+        --cache-dir: Path to the cache folder, defaults to ./stage_cache or $ALVA_STAGE_CACHE
+
+    Examples:
+    [1]: List all cached stage outputs.
+         $ python -m utils.stage_cache list
+    [2]: Remove all cached object detections, e.g. after changing the model.
+         $ python -m utils.stage_cache evict --stage detect
+    [3]: Remove all entries that were not used for 30 days.
+         $ python -m utils.stage_cache evict --older-than 30
+"""
+
+
+def hash_file(path_to_file):
+    """
+    Returns the sha256 hex digest of the content of a file, the file is read in chunks so videos of any size can be hashed.
+    """
+    digest = hashlib.sha256()
+    with open(path_to_file, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(path_to_model):
+    """
+    Returns a version string of a model file or folder from its size and modification time, hashing the weights on
+    every run would be as slow as hashing a video. Returns None if the model does not exist.
+    """
+    if not os.path.exists(path_to_model):
+        return None
+    stat = os.stat(path_to_model)
+    return "%d-%d" % (stat.st_size, stat.st_mtime_ns)
+
+
+def stage_key(lineage, stage, params):
+    """
+    Returns the cache key of a stage. The lineage describes the input of the stage, i.e. the hash of the source video
+    and all preprocessing stages it went through, so intermediate videos never have to be hashed themselves.
+    """
+    payload = json.dumps({"lineage": lineage, "stage": stage, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(src, dst):
+    # hard links make restoring large outputs free, fall back to a copy across file systems
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _put(src, dst):
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=_link_or_copy, dirs_exist_ok=True)
+    else:
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        if os.path.exists(dst):
+            os.remove(dst)
+        _link_or_copy(src, dst)
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files)
+
+
+def lookup(key, cache_dir=CACHE_DIR):
+    """
+    Returns the metadata of a cache entry or None if the key is not cached.
+    """
+    path_to_meta = os.path.join(cache_dir, key, "meta.json")
+    if not os.path.exists(path_to_meta):
+        return None
+    with open(path_to_meta) as f:
+        return json.load(f)
+
+
+def restore(key, outputs, cache_dir=CACHE_DIR):
+    """
+    This function is used to restore the outputs of a cached stage to the given paths (name -> path of a file or folder).
+    Returns False if the key is not cached.
+    """
+    meta = lookup(key, cache_dir)
+    if meta is None or set(meta["outputs"]) != set(outputs):
+        return False
+    for name, path in outputs.items():
+        _put(os.path.join(cache_dir, key, name), path)
+    # touch the entry, so evicting by age removes the entries that were not used for the longest time
+    os.utime(os.path.join(cache_dir, key, "meta.json"))
+    return True
+
+
+def store(key, stage, outputs, lineage=None, params=None, cache_dir=CACHE_DIR):
+    """
+    This function is used to store the outputs of a stage (name -> path of a file or folder) in the cache. Outputs
+    that were not produced (e.g. a tool that failed) are not cached.
+    """
+    if not all(os.path.exists(path) for path in outputs.values()):
+        print(f"Not caching stage {stage}, not all outputs were produced.")
+        return False
+
+    # write the entry to a temporary folder first and move it in place, so parallel runs never see a partial entry
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = os.path.join(cache_dir, ".tmp_%s_%d" % (key, os.getpid()))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.mkdir(tmp_dir)
+    for name, path in outputs.items():
+        _put(path, os.path.join(tmp_dir, name))
+    meta = {
+        "stage": stage,
+        "created": time.time(),
+        "lineage": lineage,
+        "params": params,
+        "outputs": {name: "dir" if os.path.isdir(path) else "file" for name, path in outputs.items()},
+        "size": sum(_size(path) for path in outputs.values()),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4, default=str)
+    try:
+        os.rename(tmp_dir, os.path.join(cache_dir, key))
+    except OSError:
+        # another run stored the same entry in the meantime
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return True
+
+
+def run_cached(stage, lineage, params, outputs, run, cache_dir=CACHE_DIR, enabled=True):
+    """
+    This function is used to run a stage only if its outputs are not cached yet. run is called without arguments and
+    has to write the outputs to the given paths. Returns True if the outputs were restored from the cache.
+    """
+    if not enabled:
+        run()
+        return False
+    key = stage_key(lineage, stage, params)
+    if restore(key, outputs, cache_dir):
+        print(f"Restored stage {stage} from the cache ({key[:12]})")
+        return True
+    run()
+    store(key, stage, outputs, lineage, params, cache_dir)
+    return False
+
+
+def list_entries(cache_dir=CACHE_DIR):
+    """
+    Returns a list of (key, meta) of all entries in the cache, the most recently used first.
+    """
+    if not os.path.exists(cache_dir):
+        return []
+    entries = []
+    for key in os.listdir(cache_dir):
+        if key.startswith("."):
+            continue
+        meta = lookup(key, cache_dir)
+        if meta is not None:
+            meta["used"] = os.path.getmtime(os.path.join(cache_dir, key, "meta.json"))
+            entries.append((key, meta))
+    return sorted(entries, key=lambda entry: entry[1]["used"], reverse=True)
+
+
+def evict(cache_dir=CACHE_DIR, stage=None, key=None, older_than_days=None):
+    """
+    This function is used to remove the entries matching all given filters from the cache. Returns the freed bytes.
+    """
+    freed = 0
+    for entry_key, meta in list_entries(cache_dir):
+        if stage is not None and meta["stage"] != stage:
+            continue
+        if key is not None and not entry_key.startswith(key):
+            continue
+        if older_than_days is not None and time.time() - meta["used"] < older_than_days * 24 * 3600:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, entry_key))
+        freed += meta["size"]
+        print(f"Evicted {meta['stage']} {entry_key[:12]}")
+    return freed
+
+
+def main(args):
+    if args.command == "list":
+        entries = list_entries(args.cache_dir)
+        print(f"{'key':<14}{'stage':<14}{'MB':>10}  {'last used':<20}params")
+        for key, meta in entries:
+            used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(meta["used"]))
+            print(f"{key[:12]:<14}{meta['stage']:<14}{meta['size'] / 1e6:>10.1f}  {used:<20}{json.dumps(meta['params'])}")
+        print(f"{len(entries)} entries, {sum(meta['size'] for _, meta in entries) / 1e6:.1f} MB in {args.cache_dir}")
+    elif args.command == "evict":
+        if args.stage is None and args.key is None and args.older_than is None and not args.all:
+            print("Refusing to evict everything, pass --all to empty the cache.")
+            sys.exit(1)
+        freed = evict(args.cache_dir, stage=args.stage, key=args.key, older_than_days=args.older_than)
+        print(f"Freed {freed / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="stage_cache", description=usage_hint,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-dir", type=str, default=CACHE_DIR, help="path to the cache folder")
+    parser.add_argument("command", choices=["list", "evict"])
+    parser.add_argument("--stage", type=str, default=None, help="only evict entries of this stage")
+    parser.add_argument("--key", type=str, default=None, help="only evict the entry with this key (prefix)")
+    parser.add_argument("--older-than", type=float, default=None, help="only evict entries not used for this many days")
+    parser.add_argument("--all", action="store_true", help="evict all entries")
+    main(parser.parse_args())
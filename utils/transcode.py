@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+
+PRESET = "veryfast"     # libx264 preset used if a video has to be re-encoded
+CRF = 23                # libx264 constant rate factor, lower is better quality and bigger files
+NUM_WORKERS = 2         # number of videos converted at the same time
+
+BROWSER_CONTAINERS = [".mp4", ".m4v", ".mov"]
+BROWSER_VIDEO_CODECS = ["h264"]
+BROWSER_PIXEL_FORMATS = ["yuv420p", "yuvj420p"]
+BROWSER_AUDIO_CODECS = ["aac", "mp3"]
+
+usage_hint = """
+    Description: Converts a video to an mp4 file that can be played by the dash player of the visualisation tool.
+                 If the video already is h264 / yuv420p (with aac audio) it is only remuxed (stream copy), otherwise it
+                 is re-encoded with libx264. The moov atom is always moved to the front (faststart) for streaming.
+
+    Usage: python transcode.py [Options] <path_to_video> <path_to_output>
+
+    Options:
+        -h, --help: Show this help message and exit
+
+    Arguments:
+        path_to_video: Path to the video file to convert
+        path_to_output: Path of the converted mp4 file
+
+    Examples:
+    [1]: Convert the superimposed OpenPose video.
+         $ python transcode.py "C:/Users/username/Desktop/video_openpose.avi" "C:/Users/username/Desktop/video_openpose.mp4"
+"""
+
+
+def probe(path_to_video):
+    """
+    Returns a dictionary with the codec of the first video stream, its pixel format and the codec of the first audio
+    stream (None if the video has no audio) using ffprobe.
+    """
+    output = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "stream=codec_type,codec_name,pix_fmt",
+                             "-of", "json", path_to_video], capture_output=True, text=True, check=True).stdout
+    info = {"video_codec": None, "pix_fmt": None, "audio_codec": None}
+    for stream in json.loads(output).get("streams", []):
+        if stream.get("codec_type") == "video" and info["video_codec"] is None:
+            info["video_codec"] = stream.get("codec_name")
+            info["pix_fmt"] = stream.get("pix_fmt")
+        elif stream.get("codec_type") == "audio" and info["audio_codec"] is None:
+            info["audio_codec"] = stream.get("codec_name")
+    return info
+
+
+def is_browser_compatible(path_to_video, info=None):
+    """
+    Returns True if the streams of the video can be played by the browser and only have to be remuxed into an mp4.
+    """
+    info = probe(path_to_video) if info is None else info
+    return (os.path.splitext(path_to_video)[1].lower() in BROWSER_CONTAINERS
+            and info["video_codec"] in BROWSER_VIDEO_CODECS
+            and info["pix_fmt"] in BROWSER_PIXEL_FORMATS
+            and info["audio_codec"] in BROWSER_AUDIO_CODECS + [None])
+
+
+def transcode(path_to_video, path_to_output, remove_source=False, preset=PRESET, crf=CRF):
+    """
+    This function is used to convert a video to a browser compatible mp4 file, stream copying when possible.
+    Raises a CalledProcessError if ffmpeg fails, in that case the source is never removed.
+    """
+    command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", path_to_video]
+    if is_browser_compatible(path_to_video):
+        command += ["-c", "copy"]
+    else:
+        command += ["-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p", "-c:a", "aac"]
+    command += ["-movflags", "+faststart", path_to_output]
+    subprocess.run(command, check=True)
+
+    if remove_source:
+        os.remove(path_to_video)
+    return path_to_output
+
+
+class TranscodeQueue:
+    """
+    This class is used to convert videos in the background, every video is submitted as soon as it is written, so the
+    conversions overlap with the stages that still run. The caller has to wait for the conversions before it uses
+    the outputs or removes the sources.
+    """
+
+    def __init__(self, max_workers=NUM_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.jobs = []      # [(path_to_video, path_to_output, future)]
+
+    def submit(self, path_to_video, path_to_output):
+        self.jobs.append((path_to_video, path_to_output, self.pool.submit(transcode, path_to_video, path_to_output)))
+
+    def wait(self, remove_sources=False):
+        """
+        This function is used to wait for all conversions, a failed conversion raises here and no source is removed.
+        """
+        try:
+            for _, _, future in self.jobs:
+                future.result()
+        finally:
+            self.pool.shutdown()
+        if remove_sources:
+            for path_to_video, _, _ in self.jobs:
+                os.remove(path_to_video)
+        return [path_to_output for _, path_to_output, _ in self.jobs]
+
+
+if __name__ == "__main__":
+    try:
+        if sys.argv[1] == "-h" or sys.argv[1] == "--help":
+            print(usage_hint)
+            exit(0)
+        # read arguments
+        video_file = sys.argv[1]
+        output_file = sys.argv[2]
+
+    except IndexError:
+        print(usage_hint)
+        exit(1)
+
+    transcode(video_file, output_file)
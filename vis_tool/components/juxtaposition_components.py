@@ -2,6 +2,15 @@ import plotly.graph_objs as go
 import numpy as np
 from vis_tool.config.settings import hf_color
 
+# keypoints of the BODY_25 model highlighted for the right / left hand and foot
+HIGHLIGHTS = {"RH": 4, "LH": 7, "RF": 11, "LF": 14}
+
+# pairs of connected keypoints of the skeleton (the face and toes are left out)
+SKELETON_LINES = [(1, 2), (2, 3), (3, 4), (1, 5), (5, 6), (6, 7), (1, 8), (8, 9), (9, 10), (10, 11), (11, 24), (11, 22),
+                  (8, 12), (12, 13), (13, 14), (14, 21), (14, 19)]
+# keypoint index of every point of the plotted skeleton, -1 separates the lines
+SKELETON_INDEX = np.array([index for start, end in SKELETON_LINES for index in (-1, start, end)][1:])
+
 
 def render_keypoints(keypoints, RH, LH, RF, LF, frame_num, x_max, y_max, scr_height=600):
     fig = go.Figure()
@@ -15,54 +24,26 @@ def render_keypoints(keypoints, RH, LH, RF, LF, frame_num, x_max, y_max, scr_hei
                       height=scr_height
                       )
     
-    fig.add_trace(go.Scatter(x=keypoints[:, 0, frame_num],
-                             y=keypoints[:, 1, frame_num],))
+    # the skeleton is only built for the shown frame, keypoints is the frame-major (frames, keypoints, 2) array
+    skeleton = convert_keypoints_to_skeleton(keypoints[frame_num])
+    fig.add_trace(go.Scatter(x=skeleton[:, 0],
+                             y=skeleton[:, 1],))
 
-    if RH:
-        fig.add_trace(go.Scatter(x=[keypoints[7, 0, frame_num]],
-                                 y=[keypoints[7, 1, frame_num]],
-                                 mode='markers', marker=dict(size=15, color=hf_color['RH']), marker_line_width=2))
-    if LH:
-        fig.add_trace(go.Scatter(x=[keypoints[16, 0, frame_num]],
-                                 y=[keypoints[16, 1, frame_num]],
-                                 mode='markers', marker=dict(size=15, color=hf_color['LH']), marker_line_width=2))
-    if RF:
-        fig.add_trace(go.Scatter(x=[keypoints[28, 0, frame_num]],
-                                 y=[keypoints[28, 1, frame_num]],
-                                 mode='markers', marker=dict(size=15, color=hf_color['RF']), marker_line_width=2))
-    if LF:
-        fig.add_trace(go.Scatter(x=[keypoints[43, 0, frame_num]],
-                                 y=[keypoints[43, 1, frame_num]],
-                                 mode='markers', marker=dict(size=15, color=hf_color['LF']), marker_line_width=2))
+    for key, keypoint in HIGHLIGHTS.items():
+        if {"RH": RH, "LH": LH, "RF": RF, "LF": LF}[key]:
+            fig.add_trace(go.Scatter(x=[float(keypoints[frame_num, keypoint, 0])],
+                                     y=[-float(keypoints[frame_num, keypoint, 1])],
+                                     mode='markers', marker=dict(size=15, color=hf_color[key]), marker_line_width=2))
 
     return fig
 
 
-def convert_keypoints_to_skeleton(keypoints):
-    keypoints_size = keypoints[0, :, :].shape
-    div = np.full(keypoints_size, None)
-    skeleton = np.stack([           #keypoints[0, :, :], keypoints[1, :, :], div,
-                                    keypoints[1, :, :], keypoints[2, :, :],
-                               div, keypoints[2, :, :], keypoints[3, :, :],
-                               div, keypoints[3, :, :], keypoints[4, :, :],
-                               div, keypoints[1, :, :], keypoints[5, :, :],
-                               div, keypoints[5, :, :], keypoints[6, :, :],
-                               div, keypoints[6, :, :], keypoints[7, :, :],
-                               div, keypoints[1, :, :], keypoints[8, :, :],
-                               div, keypoints[8, :, :], keypoints[9, :, :],
-                               div, keypoints[9, :, :], keypoints[10, :, :],
-                               div, keypoints[10, :, :], keypoints[11, :, :],
-                               div, keypoints[11, :, :], keypoints[24, :, :],
-                               div, keypoints[11, :, :], keypoints[22, :, :],
-                               #div, keypoints[22, :, :], keypoints[23, :, :],
-                               div, keypoints[8, :, :], keypoints[12, :, :],
-                               div, keypoints[12, :, :], keypoints[13, :, :],
-                               div, keypoints[13, :, :], keypoints[14, :, :],
-                               div, keypoints[14, :, :], keypoints[21, :, :],
-                               div, keypoints[14, :, :], keypoints[19, :, :]])
-                               #div, keypoints[19, :, :], keypoints[20, :, :]])
-                               #div, keypoints[0, :, :], keypoints[15, :, :],
-                               #div, keypoints[15, :, :], keypoints[17, :, :],
-                               #div, keypoints[0, :, :], keypoints[16, :, :],
-                               #div, keypoints[16, :, :], keypoints[18, :, :]])
+def convert_keypoints_to_skeleton(frame):
+    """
+    Returns the lines of the BODY_25 skeleton of one frame (keypoints, 2) as an array of (x, y) points, the lines are
+    separated by nan and the y axis is flipped for plotting.
+    """
+    skeleton = np.array(frame[np.abs(SKELETON_INDEX), :2], dtype=np.float64)
+    skeleton[SKELETON_INDEX < 0] = np.nan
+    skeleton[:, 1] = -skeleton[:, 1]
     return skeleton
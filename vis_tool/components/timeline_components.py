@@ -1,5 +1,6 @@
 import plotly.graph_objs as go
 import time
+import threading
 import numpy as numpy
 import pandas as pd
 from vis_tool.config.settings import abcs_code_colors as abcs_color_codes
@@ -7,6 +8,8 @@ from vis_tool.config.settings import abcs_code_colors as abcs_color_codes
 DURATION_IN_SECONDS = 60        # timespan of the timeline view in seconds
 NUM_TRACKS = 7                  # number of tracks on the timeline
 
+coding_lock = threading.Lock()  # serializes the codings of timelines without a coding journal
+
 
 def render_timeline(object, interactions, abcs, duration, fps, frame_num):
     fig = go.Figure()
@@ -34,30 +37,30 @@ def render_timeline(object, interactions, abcs, duration, fps, frame_num):
 
     # draw objects
     for index, row in object.iterrows():
-        #if row["End_Time"] < frame_num - DURATION_IN_SECONDS * fps * .5 or row["Start_Time"] > frame_num + DURATION_IN_SECONDS * fps * .5:
+        #if row["End_Frame"] < frame_num - DURATION_IN_SECONDS * fps * .5 or row["Start_Frame"] > frame_num + DURATION_IN_SECONDS * fps * .5:
         #    continue
         y_off = (index) % (NUM_TRACKS - 2)
-        fig.add_shape(type="rect", x0=row["Start_Time"], y0=NUM_TRACKS - y_off - 1, x1=row["End_Time"], y1=NUM_TRACKS - y_off,
+        fig.add_shape(type="rect", x0=row["Start_Frame"], y0=NUM_TRACKS - y_off - 1, x1=row["End_Frame"], y1=NUM_TRACKS - y_off,
                       fillcolor="cornflowerblue")
-        fig.add_annotation(x=row["Start_Time"], xanchor="left", y=NUM_TRACKS - y_off - 0.5,
+        fig.add_annotation(x=row["Start_Frame"], xanchor="left", y=NUM_TRACKS - y_off - 0.5,
                            text=row["Object_Name"], showarrow=False, font=dict(size=15))
         
     # draw interactions
     for index, row in interactions.iterrows():
-        #if row["Event_Time"] < frame_num - DURATION_IN_SECONDS * fps * .5 or row["Event_Time"] > frame_num + DURATION_IN_SECONDS * fps * .5:
+        #if row["Event_Frame"] < frame_num - DURATION_IN_SECONDS * fps * .5 or row["Event_Frame"] > frame_num + DURATION_IN_SECONDS * fps * .5:
         #    continue
-        fig.add_shape(type="rect", x0=row["Event_Time"], y0=1, x1=row["Event_Time"] + 0.5 * fps, y1=2,
+        fig.add_shape(type="rect", x0=row["Event_Frame"], y0=1, x1=row["Event_Frame"] + 0.5 * fps, y1=2,
                       fillcolor="plum", line_color="plum")
-        fig.add_annotation(x=row["Event_Time"], xanchor="left", y=2 - index % 4*0.251,
+        fig.add_annotation(x=row["Event_Frame"], xanchor="left", y=2 - index % 4*0.251,
                            text=row["Event_Description"], showarrow=False, font=dict(size=10))
         
     # draw abcs
     for index, row in abcs.iterrows():
-        #if row["End_Time"] < frame_num - DURATION_IN_SECONDS * fps * .5 or row["Start_Time"] > frame_num + DURATION_IN_SECONDS * fps * .5:
+        #if row["End_Frame"] < frame_num - DURATION_IN_SECONDS * fps * .5 or row["Start_Frame"] > frame_num + DURATION_IN_SECONDS * fps * .5:
         #    continue
-        fig.add_shape(type="rect", x0=row["Start_Time"], y0=0, x1=row["End_Time"], y1=1,
+        fig.add_shape(type="rect", x0=row["Start_Frame"], y0=0, x1=row["End_Frame"], y1=1,
                       line=dict(color="green", width=2), fillcolor=abcs_color_codes[row["ABCS_Variable"]], opacity=0.5,)
-        fig.add_annotation(x=row["Start_Time"], xanchor="left", y=0.5,
+        fig.add_annotation(x=row["Start_Frame"], xanchor="left", y=0.5,
                            text=row["ABCS_Variable"], showarrow=False, font=dict(size=15))
 
     """ # draw current time
@@ -119,13 +122,19 @@ def render_timeline(object, interactions, abcs, duration, fps, frame_num):
                            text=row["Object_Name"], showarrow=False, font=dict(size=10))
     """
 
-def update_abcs_coding(abcs, frame_num, code):
-    for index, row in abcs.iterrows():
-        if row["End_Time"] >= frame_num:
+def update_abcs_coding(timeline, frame_num, code, journal=None):
+    """
+    This function is used to code the abcs variable from the end of the last coding up to frame_num. If a coding
+    journal (structures/coding_journal.py) is given the coding is also appended to it. Returns the abcs coding of the
+    timeline.
+    """
+    # dash runs the callbacks in parallel, two clicks must not both code from the same end of the last coding
+    with (journal.lock if journal is not None else coding_lock):
+        abcs = timeline.get_abcs_coding()
+        if (abcs["End_Frame"] >= frame_num).any():
             return abcs
-    if abcs.empty:
-        abcs.loc[len(abcs)] = [0, frame_num, code, ""]
-    else:
-        abcs.loc[len(abcs)] = [abcs.iloc[-1]["End_Time"] + 1, frame_num, code, ""]
-    return abcs
-
+        start_frame = 0 if abcs.empty else int(abcs.iloc[-1]["End_Frame"]) + 1
+        timeline.add_abcs_coding(start_frame, frame_num, code, "")
+        if journal is not None:
+            journal.record(start_frame, frame_num, code, "")
+        return timeline.get_abcs_coding()